@@ -0,0 +1,33 @@
+"""Add indexes for searching and counting to the audit table.
+
+Revision ID: 07bbf43a0e22
+Revises: 58e4f7ebb705
+Create Date: 2017-02-20 10:12:31.245129
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '07bbf43a0e22'
+down_revision = '58e4f7ebb705'
+
+from alembic import op
+
+INDEXES = [('ix_pidea_audit_date', ['date']),
+           ('ix_pidea_audit_user_realm_date', ['user', 'realm', 'date']),
+           ('ix_pidea_audit_serial_date', ['serial', 'date']),
+           ('ix_pidea_audit_action_date', ['action', 'date'])]
+
+
+def upgrade():
+    for name, columns in INDEXES:
+        try:
+            op.create_index(name, 'pidea_audit', columns, unique=False)
+        except Exception as exx:
+            print ("Could not create index {0!s} on table "
+                   "'pidea_audit'".format(name))
+            print (exx)
+
+
+def downgrade():
+    for name, _columns in INDEXES:
+        op.drop_index(name, table_name='pidea_audit')
@@ -0,0 +1,50 @@
+"""Add the table pidea_audit_stats for the hourly audit statistics.
+
+Revision ID: 696be8a83ace
+Revises: 07bbf43a0e22
+Create Date: 2017-02-24 11:38:02.517364
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '696be8a83ace'
+down_revision = '07bbf43a0e22'
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError, ProgrammingError, InternalError
+
+
+def upgrade():
+    try:
+        op.create_table('pidea_audit_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hour', sa.DateTime(), nullable=True),
+        sa.Column('action', sa.String(length=50), nullable=True),
+        sa.Column('success', sa.Integer(), nullable=True),
+        sa.Column('user', sa.String(length=20), nullable=True),
+        sa.Column('realm', sa.String(length=20), nullable=True),
+        sa.Column('serial', sa.String(length=20), nullable=True),
+        sa.Column('count', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('hour', 'action', 'success', 'user', 'realm',
+                            'serial', name='asix_1')
+        )
+        op.create_index(op.f('ix_pidea_audit_stats_hour'),
+                        'pidea_audit_stats', ['hour'], unique=False)
+    except (OperationalError, ProgrammingError, InternalError) as exx:
+        # sqlite and MySQL: "table ... already exists",
+        # PostgreSQL: "relation ... already exists"
+        if "already exists" in str(exx.orig).lower():
+            print("Good. Table pidea_audit_stats already exists.")
+        else:
+            print(exx)
+    except Exception as exx:
+        print ("Could not add table 'pidea_audit_stats'")
+        print (exx)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_pidea_audit_stats_hour'),
+                  table_name='pidea_audit_stats')
+    op.drop_table('pidea_audit_stats')
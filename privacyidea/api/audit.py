@@ -32,7 +32,7 @@ It only provides the method
 from flask import (Blueprint,
                    request, current_app, Response,
                    stream_with_context)
-from lib.utils import (send_result, getParam)
+from lib.utils import (send_result, getParam, gzip_generator)
 from ..api.lib.prepolicy import prepolicy, check_base_action, auditlog_age
 from ..api.auth import admin_required
 from ..lib.policy import ACTION
@@ -59,6 +59,19 @@ def search_audit():
 
     :httpparam timelimit: A timelimit, that limits the recent audit entries.
         This param gets overwritten by a policy auditlog_age. Can be 1d, 1m, 1h.
+    :httpparam page: The number of the page to return
+    :httpparam page_size: The number of entries per page
+    :httpparam cursor: Instead of the page number, the number of the last
+        audit entry of the previous page can be passed. An empty cursor
+        returns the first page. Then "next" in the response contains the
+        cursor for the next page. Deep pages are returned much faster this
+        way.
+    :httpparam max_count: Do not count more than max_count entries. If there
+        are more entries, the "count" is returned like "10000+". 0 counts
+        all entries.
+    :httpparam verify_chain: If set to "1", "missing_line" also checks,
+        that the previous audit entry of the same process still exists.
+        This needs additional database queries.
 
     **Example request**:
 
@@ -106,6 +119,9 @@ def download_csv(csvfile=None):
 
     Params can be passed as key-value-pairs.
 
+    The CSV file is streamed. If the client accepts the gzip encoding, the
+    data is compressed.
+
     **Example request**:
 
     .. sourcecode:: http
@@ -144,11 +160,16 @@ def download_csv(csvfile=None):
         del param["timelimit"]
     else:
         timelimit = None
-    return Response(stream_with_context(audit.csv_generator(param=param,
-                                                            timelimit=timelimit)),
+    generator = audit.csv_generator(param=param, timelimit=timelimit)
+    headers = {"Content-Disposition": ("attachment; "
+                                       "filename=%s" % csvfile),
+               "Vary": "Accept-Encoding"}
+    if request.accept_encodings["gzip"]:
+        generator = gzip_generator(generator)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(generator),
                     mimetype='text/csv',
-                    headers={"Content-Disposition": ("attachment; "
-                                                     "filename=%s" % csvfile)})
+                    headers=headers)
 
 
 @audit_blueprint.route('/statistics', methods=['GET'])
@@ -57,12 +57,13 @@ from privacyidea.lib.audit import getAudit
 from privacyidea.lib.auth import check_webui_user, ROLE
 from privacyidea.lib.user import User
 from privacyidea.lib.user import split_user
-from privacyidea.lib.policy import PolicyClass
+from privacyidea.lib.policy import get_policy_object
 from privacyidea.lib.realm import get_default_realm
 from privacyidea.api.lib.postpolicy import postpolicy, get_webui_settings
 from privacyidea.api.lib.prepolicy import is_remote_user_allowed
 from privacyidea.lib.utils import get_client_ip
-from privacyidea.lib.config import get_from_config, SYSCONF, ConfigClass
+from privacyidea.lib.config import (get_from_config, SYSCONF,
+                                    get_config_object, unpin_request_objects)
 import logging
 
 log = logging.getLogger(__name__)
@@ -76,11 +77,14 @@ def before_request():
     """
     This is executed before the request
     """
-    g.config_object = ConfigClass()
+    # The config and the policies are only checked for changes once per
+    # request and pinned to the request.
+    unpin_request_objects()
+    g.config_object = get_config_object()
     request.all_data = get_all_params(request.values, request.data)
     privacyidea_server = current_app.config.get("PI_AUDIT_SERVERNAME") or \
                          request.host
-    g.policy_object = PolicyClass()
+    g.policy_object = get_policy_object()
     g.audit_object = getAudit(current_app.config)
     # access_route contains the ip adresses of all clients, hops and proxies.
     g.client_ip = get_client_ip(request,
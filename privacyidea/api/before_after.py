@@ -32,10 +32,11 @@ from lib.utils import getParam
 from flask import request, g
 from privacyidea.lib.audit import getAudit
 from flask import current_app
-from privacyidea.lib.policy import PolicyClass
+from privacyidea.lib.policy import get_policy_object
 from privacyidea.lib.event import EventConfiguration
 from privacyidea.api.auth import (user_required, admin_required)
-from privacyidea.lib.config import get_from_config, SYSCONF, ConfigClass
+from privacyidea.lib.config import (get_from_config, SYSCONF,
+                                    get_config_object, unpin_request_objects)
 from privacyidea.lib.token import get_token_type
 from .resolver import resolver_blueprint
 from .policy import policy_blueprint
@@ -104,7 +105,10 @@ def before_request():
     """
     # remove session from param and gather all parameters, either
     # from the Form data or from JSON in the request body.
-    g.config_object = ConfigClass()
+    # The config and the policies are only checked for changes once per
+    # request and pinned to the request.
+    unpin_request_objects()
+    g.config_object = get_config_object()
     request.all_data = get_all_params(request.values, request.data)
     try:
         request.User = get_user_from_param(request.all_data)
@@ -113,7 +117,7 @@ def before_request():
         # takes a list as the userobject
         request.User = None
 
-    g.policy_object = PolicyClass()
+    g.policy_object = get_policy_object()
     g.audit_object = getAudit(current_app.config)
     g.event_config = EventConfiguration()
     # access_route contains the ip adresses of all clients, hops and proxies.
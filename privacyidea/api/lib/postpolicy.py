@@ -40,10 +40,12 @@ Wrapping the functions in a decorator class enables easy modular testing.
 The functions of this module are tested in tests/test_api_lib_policy.py
 """
 import datetime
+import hashlib
+import hmac
 import logging
 log = logging.getLogger(__name__)
 from privacyidea.lib.error import PolicyError
-from flask import g, current_app
+from flask import g, current_app, stream_with_context
 from privacyidea.lib.policy import SCOPE, ACTION, AUTOASSIGNVALUE
 from privacyidea.lib.user import get_user_from_param
 from privacyidea.lib.token import get_tokens, assign_token, get_realms_of_token
@@ -54,7 +56,7 @@ import json
 import re
 import netaddr
 from privacyidea.lib.crypto import Sign
-from privacyidea.api.lib.utils import get_all_params
+from privacyidea.api.lib.utils import get_all_params, get_response_content
 from privacyidea.lib.auth import ROLE
 from privacyidea.lib.user import (split_user, User)
 from privacyidea.lib.realm import get_default_realm
@@ -67,6 +69,7 @@ DEFAULT_PAGE_SIZE = 15
 DEFAULT_TOKENTYPE = "hotp"
 DEFAULT_POLICY_TEMPLATE_URL = "https://raw.githubusercontent.com/privacyidea/" \
                               "policy-templates/master/templates/"
+DEFAULT_SIGN_ALGORITHM = "rsa"
 
 
 class postpolicy(object):
@@ -126,11 +129,95 @@ class postrequest(object):
         return policy_wrapper
 
 
+def canonical_json(content):
+    """
+    Serialize the content with sorted keys and the default separators of
+    json.dumps, so that the signed data can be reproduced.
+
+    :param content: The JSON content
+    :type content: dict
+    :return: JSON string
+    """
+    return json.dumps(content, sort_keys=True,
+                      cls=current_app.json_encoder)
+
+
+def sign_data(data):
+    """
+    Sign the response data with the configured algorithm.
+
+    PI_RESPONSE_SIGN_ALGORITHM can be "rsa", which signs with the private
+    audit key, or "hmac", which calculates a HMAC-SHA256 with the secret
+    PI_RESPONSE_SIGN_HMAC_KEY.
+
+    :param data: The serialized response
+    :type data: str
+    :return: The signature
+    :rtype: str
+    """
+    algorithm = current_app.config.get("PI_RESPONSE_SIGN_ALGORITHM",
+                                       DEFAULT_SIGN_ALGORITHM).lower()
+    if algorithm == "hmac":
+        hmac_key = current_app.config.get("PI_RESPONSE_SIGN_HMAC_KEY")
+        if hmac_key:
+            return hmac.new(hmac_key, data, hashlib.sha256).hexdigest()
+        log.error("PI_RESPONSE_SIGN_HMAC_KEY is missing. Signing the "
+                  "response with RSA.")
+    elif algorithm != "rsa":
+        log.error("Unknown PI_RESPONSE_SIGN_ALGORITHM {0!s}. Signing the "
+                  "response with RSA.".format(algorithm))
+    # The parsed keys are cached by the Sign object
+    sign_object = Sign(current_app.config.get("PI_AUDIT_KEY_PRIVATE"),
+                       current_app.config.get("PI_AUDIT_KEY_PUBLIC"))
+    return sign_object.sign(data)
+
+
+def sign_stream(stream, nonce=None):
+    """
+    Sign a streamed JSON object. The chunks are passed on as they are
+    generated. Only the closing brace of the object is held back. The
+    streamed data are signed and the signature is appended as last entry
+    "signature" like in sign_response.
+
+    :param stream: The chunks of the serialized JSON object
+    :param nonce: The nonce of the request, that is added as first entry
+    :return: A generator, that yields the signed chunks
+    """
+    data = []
+    last_chunk = None
+    for chunk in stream:
+        if not chunk:
+            continue
+        if last_chunk is None:
+            if nonce:
+                chunk = "{{\"nonce\": {0!s}, {1!s}".format(
+                    json.dumps(nonce), chunk.lstrip()[1:])
+        else:
+            data.append(last_chunk)
+            yield last_chunk
+        last_chunk = chunk
+    if last_chunk is None:
+        return
+    last_chunk = last_chunk.rstrip()
+    data.append(last_chunk)
+    signature = sign_data("".join(data))
+    yield "{0!s}, \"signature\": {1!s}}}".format(last_chunk[:-1],
+                                                json.dumps(signature))
+
+
 def sign_response(request, response):
     """
     This decorator is used to sign the response. It adds the nonce from the
     request, if it exist and adds the nonce and the signature to the response.
 
+    The response is serialized once with sorted keys. These data are signed
+    and the signature is appended as last entry "signature". To verify the
+    signature, the client needs to remove the ``, "signature": "..."`` at the
+    end of the response data.
+
+    Streamed JSON responses are signed by sign_stream. The streamed data are
+    signed as they are sent, without sorting the keys.
+
     .. note:: This only works for JSON responses. So if we fail to decode the
        JSON, we just pass on.
 
@@ -146,10 +233,8 @@ def sign_response(request, response):
     if current_app.config.get("PI_NO_RESPONSE_SIGN"):
         return response
 
-    priv_file = current_app.config.get("PI_AUDIT_KEY_PRIVATE")
-    pub_file = current_app.config.get("PI_AUDIT_KEY_PUBLIC")
-    sign_object = Sign(priv_file, pub_file)
-    request.all_data = get_all_params(request.values, request.data)
+    if getattr(request, "all_data", None) is None:
+        request.all_data = get_all_params(request.values, request.data)
     # response can be either a Response object or a Tuple (Response, ErrorID)
     response_value = 200
     response_is_tuple = False
@@ -159,14 +244,32 @@ def sign_response(request, response):
         response_object = response[0]
     else:
         response_object = response
+    if response_object.is_streamed:
+        if response_object.mimetype == "application/json":
+            response_object.response = stream_with_context(sign_stream(
+                response_object.response, request.all_data.get("nonce")))
+        else:
+            # Streamed responses like the CSV export are no JSON. Reading
+            # them would load the whole stream into memory.
+            log.info("We do not sign streamed responses.")
+        return response
     try:
-        content = json.loads(response_object.data)
+        content = get_response_content(response_object)
+        if not isinstance(content, dict):
+            raise ValueError("The response is no JSON object.")
         nonce = request.all_data.get("nonce")
         if nonce:
             content["nonce"] = nonce
 
-        content["signature"] = sign_object.sign(json.dumps(content))
-        response_object.data = json.dumps(content)
+        data = canonical_json(content)
+        signature = sign_data(data)
+        # splice the signature into the serialized object
+        if data == "{}":
+            data = "{{\"signature\": {0!s}}}".format(json.dumps(signature))
+        else:
+            data = "{0!s}, \"signature\": {1!s}}}".format(
+                data[:-1], json.dumps(signature))
+        response_object.data = data
     except ValueError:
         # The response.data is no JSON (but CSV or policy export)
         # We do no signing in this case.
@@ -57,7 +57,7 @@ import logging
 log = logging.getLogger(__name__)
 from privacyidea.lib.error import PolicyError, RegistrationError
 from flask import g, current_app
-from privacyidea.lib.policy import SCOPE, ACTION, PolicyClass
+from privacyidea.lib.policy import SCOPE, ACTION, get_policy_object
 from privacyidea.lib.user import (get_user_from_param, get_default_realm,
                                   split_user)
 from privacyidea.lib.token import (get_tokens, get_realms_of_token)
@@ -983,7 +983,7 @@ def is_remote_user_allowed(req):
             g.client_ip = get_client_ip(req,
                                         get_from_config(SYSCONF.OVERRIDECLIENT))
         if "policy_object" not in g:
-            g.policy_object = PolicyClass()
+            g.policy_object = get_policy_object()
         ruser_active = g.policy_object.get_action_values(ACTION.REMOTE_USER,
                                                          scope=SCOPE.WEBUI,
                                                          user=loginname,
@@ -32,9 +32,11 @@ import pkg_resources
 import logging
 import json
 import jwt
+import zlib
 from flask import (jsonify,
                    current_app,
-                   Response)
+                   Response,
+                   stream_with_context)
 
 log = logging.getLogger(__name__)
 ENCODING = "utf-8"
@@ -121,7 +123,44 @@ def send_result(obj, rid=1, details=None):
         details["threadid"] = threading.current_thread().ident
         res["detail"] = details
 
-    return jsonify(res)
+    return json_response(res)
+
+
+def send_stream_result(generator, rid=1, details=None):
+    """
+    Return a json result document like send_result, whose value is a list,
+    that is streamed as a chunked JSON array. Each entry is sent as soon as
+    the generator yields it.
+
+    The details are written after the list. Thus the generator can add
+    information to the details dictionary while it is consumed.
+
+    :param generator: A generator, that yields the JSON serializable entries
+        of the list
+    :param rid: id value, for future versions
+    :type rid: int
+    :param details: optional dictionary, which allows to provide more detail
+    :type details: None or dict
+    :return: streamed Response object
+    """
+    def stream():
+        yield ('{{"jsonrpc": "2.0", "id": {0!s}, "version": {1!s}, '
+               '"versionnumber": {2!s}, "result": {{"status": true, '
+               '"value": ['.format(json.dumps(rid),
+                                   json.dumps(get_version()),
+                                   json.dumps(get_version_number())))
+        separator = ""
+        for entry in generator:
+            yield separator + json.dumps(entry)
+            separator = ", "
+        yield "]}"
+        if details is not None and len(details) > 0:
+            details["threadid"] = threading.current_thread().ident
+            yield ', "detail": {0!s}'.format(json.dumps(details))
+        yield ', "time": {0!s}}}'.format(json.dumps(time.time()))
+
+    return Response(stream_with_context(stream()),
+                    mimetype="application/json")
 
 
 def send_error(errstring, rid=1, context=None, error_code=-311, details=None):
@@ -164,10 +203,61 @@ def send_error(errstring, rid=1, context=None, error_code=-311, details=None):
            "time": time.time()
            }
 
-    ret = jsonify(res)
+    ret = json_response(res)
     return ret
 
 
+def json_response(res):
+    """
+    Return the JSON response of the result dictionary. The dictionary is kept
+    in the response object, so that it does not need to be parsed again,
+    e.g. to sign the response.
+
+    :param res: The result
+    :type res: dict
+    :return: Response object
+    """
+    response = jsonify(res)
+    response.pi_content = (res, response.get_data())
+    return response
+
+
+def get_response_content(response):
+    """
+    Return the result dictionary of a JSON response. If the data of the
+    response was not changed since json_response, the original dictionary is
+    returned. Otherwise the data is parsed.
+
+    :param response: The response object
+    :return: The result
+    :rtype: dict
+    :raises ValueError: if the response data is no JSON
+    """
+    data = response.get_data()
+    content = getattr(response, "pi_content", None)
+    if content is not None and content[1] == data:
+        return content[0]
+    return json.loads(data)
+
+
+def gzip_generator(generator, compresslevel=6):
+    """
+    Compress the strings of a generator to a gzip stream, e.g. to send a
+    streamed response with the Content-Encoding gzip.
+
+    :param generator: A generator, that yields strings
+    :param compresslevel: The zlib compression level
+    :return: A generator, that yields the compressed data
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED,
+                                  16 + zlib.MAX_WBITS)
+    for data in generator:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
 def send_csv_result(obj, data_key="tokens",
                     filename="privacyidea-tokendata.csv"):
     """
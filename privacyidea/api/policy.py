@@ -46,7 +46,7 @@ from ..lib.policy import (set_policy,
                           PolicyClass, ACTION,
                           export_policies, import_policies,
                           delete_policy, get_static_policy_definitions,
-                          enable_policy)
+                          enable_policy, get_policy_cache_statistics)
 from ..lib.token import get_dynamic_policy_definitions
 from ..lib.error import (ParameterError)
 from ..api.lib.prepolicy import prepolicy, check_base_action
@@ -500,6 +500,39 @@ def check_policy_api():
     return send_result(res)
 
 
+@policy_blueprint.route('/statistics', methods=['GET'])
+@log_with(log)
+def get_policy_statistics():
+    """
+    This function returns the number of hits and misses of the request
+    cache of the policies in this process. This way the effect of the cache
+    can be checked in production.
+
+    :return: a json result with the counters
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+       HTTP/1.1 200 OK
+       Content-Type: application/json
+
+        {
+          "id": 1,
+          "jsonrpc": "2.0",
+          "result": {
+            "status": true,
+            "value": {"hits": 1250,
+                      "misses": 310}
+          },
+          "version": "privacyIDEA unknown"
+        }
+    """
+    res = get_policy_cache_statistics()
+    g.audit_object.log({"success": True})
+    return send_result(res)
+
+
 @policy_blueprint.route('/defs', methods=['GET'])
 @policy_blueprint.route('/defs/<scope>', methods=['GET'])
 @log_with(log)
@@ -42,7 +42,9 @@ from lib.utils import (getParam,
 from ..lib.log import log_with
 from ..lib.resolver import (get_resolver_list,
                             save_resolver,
-                            delete_resolver, pretestresolver)
+                            delete_resolver, pretestresolver,
+                            get_resolver_object)
+from ..lib.error import ParameterError
 from flask import g
 import logging
 from ..api.lib.prepolicy import prepolicy, check_base_action
@@ -175,6 +177,53 @@ def get_resolver(resolver=None):
 
     return send_result(res)
 
+
+@resolver_blueprint.route('/<resolver>/metrics', methods=['GET'])
+@log_with(log)
+def get_resolver_metrics(resolver=None):
+    """
+    This function returns the counters of the resolver object in this
+    process like the state of the LDAP connection pools.
+
+    :param resolver: the name of the resolver
+    :return: a json result with the counters
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+       HTTP/1.1 200 OK
+       Content-Type: application/json
+
+        {
+          "id": 1,
+          "jsonrpc": "2.0",
+          "result": {
+            "status": true,
+            "value": {"pool": {"created": 2,
+                               "reused": 130,
+                               "closed": 1,
+                               "failed": 0,
+                               "idle": 1,
+                               "open": 1,
+                               "in_use": 0},
+                      "user_pool": {...}}
+          },
+          "version": "privacyIDEA unknown"
+        }
+    """
+    reso = get_resolver_object(resolver)
+    if reso is None:
+        raise ParameterError("The resolver {0!s} does not "
+                             "exist.".format(resolver))
+    res = reso.get_metrics()
+
+    g.audit_object.log({"success": True,
+                        "info": resolver})
+
+    return send_result(res)
+
+
 @resolver_blueprint.route('/test', methods=["POST"])
 @log_with(log)
 def test_resolver():
@@ -66,7 +66,7 @@ import re
 import socket
 from privacyidea.lib.resolver import get_resolver_list
 from privacyidea.lib.realm import get_realms
-from privacyidea.lib.policy import PolicyClass, ACTION
+from privacyidea.lib.policy import get_policy_object, ACTION
 from privacyidea.lib.auth import get_db_admins
 from privacyidea.lib.error import HSMException
 from privacyidea.lib.crypto import geturandom
@@ -88,7 +88,7 @@ def get_config_documentation():
     returns an restructured text document, that describes the complete
     configuration.
     """
-    P = PolicyClass()
+    P = get_policy_object()
 
     config = get_from_config()
     resolvers = get_resolver_list()
@@ -330,7 +330,7 @@ def list_api():
                                  tokentype=tokentype,
                                  resolver=resolver,
                                  description=description,
-                                 userid=userid)
+                                 userid=userid, eager=True)
     g.audit_object.log({"success": True})
     if output_format == "csv":
         return send_csv_result(tokens)
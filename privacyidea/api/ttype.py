@@ -41,10 +41,11 @@ from ..lib.log import log_with
 from flask import g, jsonify, current_app, Response
 import logging
 from privacyidea.api.lib.utils import get_all_params
-from privacyidea.lib.policy import PolicyClass
+from privacyidea.lib.policy import get_policy_object
 from privacyidea.lib.audit import getAudit
 from privacyidea.lib.config import (get_token_class, get_from_config,
-                                    SYSCONF, ConfigClass)
+                                    SYSCONF, get_config_object,
+                                    unpin_request_objects)
 from privacyidea.lib.user import get_user_from_param
 from privacyidea.api.lib.postpolicy import postrequest, sign_response
 from privacyidea.lib.utils import get_client_ip
@@ -60,7 +61,10 @@ def before_request():
     """
     This is executed before the request
     """
-    g.config_object = ConfigClass()
+    # The config and the policies are only checked for changes once per
+    # request and pinned to the request.
+    unpin_request_objects()
+    g.config_object = get_config_object()
     request.all_data = get_all_params(request.values, request.data)
     privacyidea_server = current_app.config.get("PI_AUDIT_SERVERNAME") or \
                          request.host
@@ -68,7 +72,7 @@ def before_request():
     # and contains the complete policy definition during the request.
     # This audit_object can be used in the postpolicy and prepolicy and it
     # can be passed to the innerpolicies.
-    g.policy_object = PolicyClass()
+    g.policy_object = get_policy_object()
     g.audit_object = getAudit(current_app.config)
     # access_route contains the ip adresses of all clients, hops and proxies.
     g.client_ip = get_client_ip(request,
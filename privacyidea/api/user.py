@@ -26,14 +26,15 @@
 from flask import (Blueprint,
                    request)
 from lib.utils import (getParam,
-                       send_result)
+                       send_result,
+                       send_stream_result)
 from ..api.lib.prepolicy import prepolicy, check_base_action, realmadmin
 from ..lib.policy import ACTION
 from privacyidea.api.auth import admin_required, user_required
 from privacyidea.lib.user import create_user, get_user_from_param, User
 
-from flask import (g)
-from ..lib.user import get_user_list
+from flask import (g, current_app)
+from ..lib.user import get_user_generator, DEFAULT_SEARCH_TIMEOUT
 import logging
 
 
@@ -61,6 +62,11 @@ def get_users():
     
     :return: json result with "result": true and the userlist in "value".
 
+    The resolvers are searched at the same time and the userlist is streamed
+    as soon as the resolvers return their users. Resolvers, that fail or do
+    not answer within ``PI_USER_SEARCH_TIMEOUT`` seconds, are listed in
+    "detail" in "failed_resolvers".
+
     **Example request**:
 
     .. sourcecode:: http
@@ -99,12 +105,25 @@ def get_users():
         }
     """
     realm = getParam(request.all_data, "realm")
-    users = get_user_list(request.all_data)
+    timeout = current_app.config.get("PI_USER_SEARCH_TIMEOUT",
+                                     DEFAULT_SEARCH_TIMEOUT)
+    failed_resolvers = {}
+    # The searches are started before the response is sent, so invalid
+    # parameters still return an error response.
+    users = get_user_generator(request.all_data, timeout=timeout,
+                               failed_resolvers=failed_resolvers)
+    details = {}
+
+    def user_generator():
+        for user in users:
+            yield user
+        if failed_resolvers:
+            details["failed_resolvers"] = failed_resolvers
 
     g.audit_object.log({'success': True,
                         'info': "realm: {0!s}".format(realm)})
     
-    return send_result(users)
+    return send_stream_result(user_generator(), details=details)
 
 
 @user_blueprint.route('/<resolvername>/<username>', methods=['DELETE'])
@@ -84,8 +84,8 @@ from privacyidea.api.lib.postpolicy import (postpolicy,
                                             no_detail_on_success, autoassign,
                                             offline_info,
                                             add_user_detail_to_response)
-from privacyidea.lib.policy import PolicyClass
-from privacyidea.lib.config import ConfigClass
+from privacyidea.lib.policy import get_policy_object
+from privacyidea.lib.config import get_config_object, unpin_request_objects
 from privacyidea.lib.event import EventConfiguration
 import logging
 from privacyidea.api.lib.postpolicy import postrequest, sign_response
@@ -112,7 +112,10 @@ def before_request():
     """
     This is executed before the request
     """
-    g.config_object = ConfigClass()
+    # The config and the policies are only checked for changes once per
+    # request and pinned to the request.
+    unpin_request_objects()
+    g.config_object = get_config_object()
     request.all_data = get_all_params(request.values, request.data)
     request.User = get_user_from_param(request.all_data)
     privacyidea_server = current_app.config.get("PI_AUDIT_SERVERNAME") or \
@@ -122,7 +125,7 @@ def before_request():
     # This audit_object can be used in the postpolicy and prepolicy and it
     # can be passed to the innerpolicies.
 
-    g.policy_object = PolicyClass()
+    g.policy_object = get_policy_object()
 
     g.audit_object = getAudit(current_app.config)
     g.event_config = EventConfiguration()
@@ -436,7 +439,7 @@ def trigger_challenge():
     details = {"messages": [],
                "transaction_ids": []}
 
-    token_objs = get_tokens(serial=serial, user=user)
+    token_objs = get_tokens(serial=serial, user=user, eager=True)
     for token_obj in token_objs:
         if "challenge" in token_obj.mode:
             # If this is a challenge response token, we create a challenge
@@ -53,6 +53,7 @@ from privacyidea.api.smsgateway import smsgateway_blueprint
 from privacyidea.api.clienttype import client_blueprint
 from privacyidea.api.subscriptions import subscriptions_blueprint
 from privacyidea.lib.log import DEFAULT_LOGGING_CONFIG
+from privacyidea.lib.config import build_token_class_registry
 from privacyidea.config import config
 from privacyidea.models import db
 from flask.ext.migrate import Migrate
@@ -163,6 +164,8 @@ def create_app(config_name="development",
     app.register_blueprint(subscriptions_blueprint, url_prefix='/subscriptions')
     db.init_app(app)
     migrate = Migrate(app, db)
+    # The token classes are only looked up once at the start of the app
+    app.config["pi_token_registry"] = build_token_class_registry()
 
 
     try:
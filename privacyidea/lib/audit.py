@@ -53,7 +53,7 @@ storage.
 import logging
 log = logging.getLogger(__name__)
 from privacyidea.lib.log import log_with
-from privacyidea.lib.utils import parse_timedelta
+from privacyidea.lib.utils import parse_timedelta, is_true
 
 
 @log_with(log)
@@ -104,6 +104,13 @@ def search(config, param=None, user=None):
     """
     Returns a list of audit entries, supports pagination
 
+    If the parameter "cursor" is given, the entries after the audit entry
+    with the id "cursor" are returned and "next" contains the cursor for the
+    next page. Otherwise the parameter "page" is used.
+    The parameter "max_count" limits the counting of the entries.
+    If the parameter "verify_chain" is true, the signature chain of the
+    entries is checked, too.
+
     :param config: The config entries from the file config
     :return: Audit dictionary with information about the previous and next
     pages.
@@ -113,6 +120,9 @@ def search(config, param=None, user=None):
     page_size = 15
     page = 1
     timelimit = None
+    cursor = None
+    max_count = None
+    verify_chain = False
     # The filtering dictionary
     param = param or {}
     # special treatment for:
@@ -129,9 +139,20 @@ def search(config, param=None, user=None):
     if "timelimit" in param:
         timelimit = parse_timedelta(param["timelimit"])
         del param["timelimit"]
+    if "cursor" in param:
+        cursor = param["cursor"]
+        del param["cursor"]
+    if "max_count" in param:
+        max_count = param["max_count"]
+        del param["max_count"]
+    if "verify_chain" in param:
+        verify_chain = is_true(param["verify_chain"])
+        del param["verify_chain"]
 
     pagination = audit.search(param, sortorder=sortorder, page=page,
-                              page_size=page_size, timelimit=timelimit)
+                              page_size=page_size, timelimit=timelimit,
+                              cursor=cursor, max_count=max_count,
+                              verify_chain=verify_chain)
 
     ret = {"auditdata": pagination.auditdata,
            "prev": pagination.prev,
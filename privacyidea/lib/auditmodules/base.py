@@ -203,7 +203,8 @@ class Audit(object):  # pragma: no cover
 #        """
 #        pass
 
-    def search(self, param, display_error=True, rp_dict=None, timelimit=None):
+    def search(self, param, display_error=True, rp_dict=None, timelimit=None,
+               cursor=None, max_count=None, verify_chain=False):
         """
         This function is used to search audit events.
 
@@ -226,7 +227,8 @@ class Audit(object):  # pragma: no cover
         """
         return 0
 
-    def csv_generator(self, param=None, user=None, timelimit=None):
+    def csv_generator(self, param=None, user=None, timelimit=None,
+                      chunk_size=1000):
         """
         A generator that can be used to stream the audit log
 
@@ -241,7 +243,7 @@ class Audit(object):  # pragma: no cover
         """
         return None
 
-    def audit_entry_to_dict(self, audit_entry):
+    def audit_entry_to_dict(self, audit_entry, verify_chain=False):
         """
         If the search_query returns an iterator with elements that are not a
         dictionary, the audit module needs
@@ -249,6 +251,24 @@ class Audit(object):  # pragma: no cover
         """
         return {}
 
+    def rollup(self, start_time=None, first_start_time=None):
+        """
+        Update the hourly counts of the audit entries, which are used for the
+        statistics.
+
+        :return: The number of counted audit entries
+        """
+        return 0
+
+    def get_rollup_counts(self, keys, start_time=None, end_time=None,
+                          actions=None, success=None):
+        """
+        Return the number of audit entries grouped by the given keys.
+
+        :return: dict with the tuple of the values of the keys and the number
+        """
+        return {}
+
     def get_dataframe(self, start_time=datetime.now()-timedelta(days=7),
                       end_time=datetime.now()):
         """
@@ -33,21 +33,53 @@ The SQL Audit Module is configured like this:
     Optional:
     PI_AUDIT_SQL_URI = "sqlite://"
     PI_AUDIT_SQL_TRUNCATE = True | False
+    PI_AUDIT_ASYNC = True | False
+    PI_AUDIT_ASYNC_QUEUE_SIZE = 1000
+    PI_AUDIT_ASYNC_BATCH_SIZE = 100
+    PI_AUDIT_ASYNC_FLUSH_INTERVAL = 1.0
+    PI_AUDIT_SEARCH_MAX_COUNT = 10000
 
 If the PI_AUDIT_SQL_URI is omitted the Audit data is written to the
 token database.
+
+If PI_AUDIT_ASYNC is set, the audit entries are not written within the
+request, but by a background thread in batches.
+
+If PI_AUDIT_SEARCH_MAX_COUNT is set, a search does not count more than this
+number of entries and returns the count like "10000+". A search with a cursor
+counts at most 10000 entries, if PI_AUDIT_SEARCH_MAX_COUNT is not set.
+
+The audit entries are signed before they are written. The signature does not
+contain the database id of the entry but an id of the process, a sequence
+number within the process and a hash of the previous entry of the process.
+Entries with the old signature, which contains the database id, can still be
+verified.
 """
 
 import logging
 from privacyidea.lib.auditmodules.base import (Audit as AuditBase, Paginate)
 from privacyidea.lib.crypto import Sign
+from privacyidea.lib.error import ParameterError
 from sqlalchemy import Table, MetaData, Column
-from sqlalchemy import Integer, String, DateTime, asc, desc, and_
+from sqlalchemy import (Integer, String, DateTime, asc, desc, and_, or_,
+                        func)
 from sqlalchemy.orm import mapper
 from alembic.migration import MigrationContext
 from alembic.operations import Operations
+import atexit
+import binascii
+import csv
 import datetime
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
 import traceback
+import Queue
+from collections import Counter
+from StringIO import StringIO
 from sqlalchemy.exc import OperationalError
 
 log = logging.getLogger(__name__)
@@ -68,37 +100,59 @@ metadata = MetaData()
 from privacyidea.models import audit_column_length as column_length
 from privacyidea.models import AUDIT_TABLE_NAME as TABLE_NAME
 from privacyidea.models import Audit as LogEntry
+from privacyidea.models import AuditStats
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 
+# The engines and keys are shared by all audit objects of the process.
+AUDIT_RESOURCES = {}
+AUDIT_RESOURCES_LOCK = threading.Lock()
+# The prefix of signatures, which do not contain the database id
+SIGNATURE_VERSION = "v2"
+# The columns of the CSV export
+CSV_COLUMNS = ["number", "date", "sig_check", "missing_line", "action",
+               "success", "serial", "token_type", "user", "realm",
+               "resolver", "administrator", "action_detail", "info",
+               "privacyidea_server", "client", "log_level", "clearance_level"]
+# The maximum count of a search with a cursor, if no maximum is configured
+CURSOR_MAX_COUNT = 10000
 
-class Audit(AuditBase):
+
+def _int_parameter(name, value):
     """
-    This is the SQLAudit module, which writes the audit entries
-    to an SQL database table.
-    It requires the configuration parameters.
-    PI_AUDIT_SQL_URI
+    Convert the search parameter to an integer
+
+    :raises ParameterError: if the value is not a number
     """
-    
-    def __init__(self, config=None):
-        self.name = "sqlaudit"
-        self.config = config or {}
-        self.audit_data = {}
-        self.sign_object = None
-        self.read_keys(self.config.get("PI_AUDIT_KEY_PUBLIC"),
-                       self.config.get("PI_AUDIT_KEY_PRIVATE"))
-        
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        raise ParameterError("The parameter {0!s} must be a number, "
+                             "not {1!r}".format(name, value))
+
+
+class AuditResources(object):
+    """
+    The process wide resources of the SQL audit: The engine with its
+    connection pool, the session factory and the signer.
+    """
+
+    def __init__(self, config):
+        self.private_key_file = config.get("PI_AUDIT_KEY_PRIVATE")
+        self.public_key_file = config.get("PI_AUDIT_KEY_PUBLIC")
+        # Read the keys once, so that missing keys fail early
+        self.get_sign_object()
         # an Engine, which the Session will use for connection
         # resources
-        connect_string = self.config.get("PI_AUDIT_SQL_URI", self.config.get(
+        connect_string = config.get("PI_AUDIT_SQL_URI", config.get(
             "SQLALCHEMY_DATABASE_URI"))
         log.debug("using the connect string {0!s}".format(connect_string))
         try:
-            pool_size = self.config.get("PI_AUDIT_POOL_SIZE", 20)
+            pool_size = config.get("PI_AUDIT_POOL_SIZE", 20)
             self.engine = create_engine(
                 connect_string,
                 pool_size=pool_size,
-                pool_recycle=self.config.get("PI_AUDIT_POOL_RECYCLE", 600))
+                pool_recycle=config.get("PI_AUDIT_POOL_RECYCLE", 600))
             log.debug("Using SQL pool_size of {0!s}".format(pool_size))
         except TypeError:
             # SQLite does not support pool_size
@@ -106,11 +160,485 @@ class Audit(AuditBase):
             log.debug("Using no SQL pool_size.")
 
         # create a configured "Session" class
-        Session = sessionmaker(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.signer = AuditSigner(self.get_sign_object)
+
+        self.writer = None
+        if config.get("PI_AUDIT_ASYNC"):
+            self.writer = AuditWriter(
+                self,
+                queue_size=int(config.get("PI_AUDIT_ASYNC_QUEUE_SIZE",
+                                          1000)),
+                batch_size=int(config.get("PI_AUDIT_ASYNC_BATCH_SIZE", 100)),
+                flush_interval=float(config.get(
+                    "PI_AUDIT_ASYNC_FLUSH_INTERVAL", 1.0)))
+            self.writer.start()
+
+    def get_sign_object(self):
+        """
+        Return a Sign object with the current keys. The keys are read with
+        read_rsa_key, which only parses a key file again, if it was
+        modified. This way rotated audit keys are used without a restart.
+
+        :return: Sign object
+        """
+        return Sign(self.private_key_file, self.public_key_file)
+
+
+def _create_log_entry(audit_data):
+    """
+    Create the database object from the audit data.
+
+    :param audit_data: The audit data of a request. The key "date" contains
+        the time of the request.
+    :type audit_data: dict
+    :return: LogEntry
+    """
+    le = LogEntry(action=audit_data.get("action"),
+                  success=int(audit_data.get("success", 0)),
+                  serial=audit_data.get("serial"),
+                  token_type=audit_data.get("token_type"),
+                  user=audit_data.get("user"),
+                  realm=audit_data.get("realm"),
+                  resolver=audit_data.get("resolver"),
+                  administrator=audit_data.get("administrator"),
+                  action_detail=audit_data.get("action_detail"),
+                  info=audit_data.get("info"),
+                  privacyidea_server=audit_data.get("privacyidea_server"),
+                  client=audit_data.get("client", ""),
+                  loglevel=audit_data.get("log_level"),
+                  clearance_level=audit_data.get("clearance_level"))
+    if audit_data.get("date"):
+        # The entry may be created later by the AuditWriter
+        le.date = audit_data.get("date")
+    return le
+
+
+class AuditSigner(object):
+    """
+    The AuditSigner signs audit entries before they are written to the
+    database, so that each entry only needs one INSERT.
+
+    Instead of the database id the signature contains a random id of the
+    process, a sequence number, that is increased for each entry of the
+    process, and the hash of the previous entry of the process. These values
+    are stored in front of the hex encoded signature in the signature column
+    like ``v2:<process>:<sequence>:<chain>:<signature>``.
+    """
+
+    def __init__(self, get_sign_object):
+        """
+        :param get_sign_object: A function, that returns the Sign object
+            with the current keys
+        """
+        self.get_sign_object = get_sign_object
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.process_id = binascii.hexlify(os.urandom(4))
+        self.sequence = 0
+        self.chain = ""
+
+    def sign(self, le):
+        """
+        Sign the log entry and set its signature.
+
+        :param le: The log entry, which is not written, yet
+        :type le: LogEntry
+        :return: The signature
+        """
+        with self._lock:
+            if os.getpid() != self.pid:
+                # A forked process must not continue the sequence of the
+                # parent process.
+                self._reset()
+            self.sequence += 1
+            # The signature only contains the seconds. Some databases like
+            # MySQL round the microseconds, which could change the second.
+            le.date = le.date.replace(microsecond=0)
+            prefix = "{0!s}:{1!s}:{2:d}:{3!s}".format(SIGNATURE_VERSION,
+                                                      self.process_id,
+                                                      self.sequence,
+                                                      self.chain)
+            s = Audit._log_to_string(le, prefix=prefix)
+            self.chain = hashlib.sha256(s).hexdigest()[:32]
+        signature = self.get_sign_object().sign(s)
+        le.signature = "{0!s}:{1:x}".format(prefix, long(signature))
+        return le.signature
+
+
+class AuditWriter(object):
+    """
+    The AuditWriter writes the audit entries in a background thread.
+
+    The finalized audit data is put into a bounded queue. The thread takes
+    up to batch_size entries from the queue and writes them in one
+    transaction. If no entries arrive, it waits for flush_interval
+    seconds. If the queue is full or the writer is stopped, put returns
+    False and the caller needs to write the entry itself. When the process
+    exits, the remaining entries are written.
+
+    If a batch can not be written, the entries are written one by one.
+    Entries, that still fail, are counted in dropped.
+    """
+
+    def __init__(self, resources, queue_size=1000, batch_size=100,
+                 flush_interval=1.0):
+        """
+        :param resources: The AuditResources with the engine and keys
+        :param queue_size: The maximum number of waiting entries
+        :param batch_size: The maximum number of entries per transaction
+        :param flush_interval: The seconds to wait for new entries
+        """
+        self.resources = resources
+        self.queue = Queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._stopped = threading.Event()
+        # No entry is queued, while the writer is stopped
+        self._put_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Start the background thread.
+        """
+        self._thread = threading.Thread(target=self._run,
+                                        name="AuditWriter")
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def put(self, audit_data):
+        """
+        Put the audit data into the queue.
+
+        :param audit_data: The audit data of a request
+        :type audit_data: dict
+        :return: False, if the queue is full or the writer is stopped
+        """
+        with self._put_lock:
+            if self._stopped.is_set():
+                return False
+            try:
+                self.queue.put_nowait(audit_data)
+            except Queue.Full:
+                return False
+        return True
+
+    def flush(self):
+        """
+        Wait until all entries in the queue are written.
+        """
+        self.queue.join()
+
+    def stop(self):
+        """
+        Stop the background thread and write the remaining entries.
+        """
+        with self._put_lock:
+            self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        batch = self._get_batch(block=False)
+        while batch:
+            self.write(batch)
+            batch = self._get_batch(block=False)
+
+    def _get_batch(self, block=True):
+        batch = []
+        try:
+            if block:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+        except Queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._get_batch()
+            if batch:
+                self.write(batch)
+
+    def write(self, batch):
+        """
+        Write a list of audit data with one multi-row INSERT.
+
+        :param batch: list of audit data dictionaries
+        """
+        session = self.resources.Session()
+        signer = self.resources.signer
+        table = LogEntry.__table__
+        columns = [c.name for c in table.columns if c.name != "id"]
+        rows = []
+        try:
+            for audit_data in batch:
+                le = _create_log_entry(audit_data)
+                signer.sign(le)
+                rows.append(dict((c, getattr(le, c)) for c in columns))
+            session.execute(table.insert(), rows)
+            session.commit()
+            self.written += len(rows)
+        except Exception as exx:
+            log.warning("Could not write the batch of {0:d} audit entries: "
+                        "{1!r}. Writing them one by one.".format(len(rows),
+                                                                 exx))
+            log.debug("{0!s}".format(traceback.format_exc()))
+            session.rollback()
+            # The signed entries are written separately, so that only the
+            # broken entries are lost.
+            for row in rows:
+                try:
+                    session.execute(table.insert(), row)
+                    session.commit()
+                    self.written += 1
+                except Exception as exx:
+                    log.error("exception {0!r}".format(exx))
+                    log.error("DATA: {0!s}".format(row))
+                    log.debug("{0!s}".format(traceback.format_exc()))
+                    session.rollback()
+                    self.dropped += 1
+            # Entries, that could not be signed, are lost as well
+            self.dropped += len(batch) - len(rows)
+        finally:
+            session.close()
+            for _audit_data in batch:
+                self.queue.task_done()
+
+
+def get_audit_resources(config):
+    """
+    Return the AuditResources for the given configuration. They are only
+    created once per process for each database and key files.
+
+    :param config: The config entries from the file config
+    :return: AuditResources
+    """
+    key = (config.get("PI_AUDIT_SQL_URI",
+                      config.get("SQLALCHEMY_DATABASE_URI")),
+           config.get("PI_AUDIT_POOL_SIZE"),
+           config.get("PI_AUDIT_POOL_RECYCLE"),
+           config.get("PI_AUDIT_KEY_PRIVATE"),
+           config.get("PI_AUDIT_KEY_PUBLIC"),
+           config.get("PI_AUDIT_ASYNC"),
+           config.get("PI_AUDIT_ASYNC_QUEUE_SIZE"),
+           config.get("PI_AUDIT_ASYNC_BATCH_SIZE"),
+           config.get("PI_AUDIT_ASYNC_FLUSH_INTERVAL"))
+    resources = AUDIT_RESOURCES.get(key)
+    if resources is None:
+        with AUDIT_RESOURCES_LOCK:
+            resources = AUDIT_RESOURCES.get(key)
+            if resources is None:
+                resources = AuditResources(config)
+                AUDIT_RESOURCES[key] = resources
+    return resources
+
+
+class AuditArchive(object):
+    """
+    The AuditArchive writes audit entries to a JSONL or CSV file before they
+    are deleted. If the file name ends with ".gz", the file is compressed.
+    """
+
+    def __init__(self, filename, archive_format=None):
+        """
+        :param filename: The name of the archive file
+        :param archive_format: "jsonl" or "csv". If it is not given, it is
+            determined by the file name.
+        """
+        self.filename = filename
+        if archive_format is None:
+            archive_format = "csv" if ".csv" in filename else "jsonl"
+        if archive_format not in ["jsonl", "csv"]:
+            raise ValueError("Unknown archive format {0!s}".format(
+                archive_format))
+        self.archive_format = archive_format
+        self.columns = LogEntry.__table__.columns.keys()
+        if filename.endswith(".gz"):
+            self.file = gzip.open(filename, "wb")
+        else:
+            self.file = open(filename, "wb")
+        self.csv_writer = None
+        if archive_format == "csv":
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(self.columns)
+        self.written = 0
+
+    def write(self, entries):
+        """
+        Write the audit entries to the archive.
+
+        :param entries: list of LogEntry objects
+        """
+        for le in entries:
+            values = [getattr(le, column) for column in self.columns]
+            if self.csv_writer:
+                self.csv_writer.writerow([Audit._csv_value(v)
+                                          for v in values])
+            else:
+                self.file.write(json.dumps(dict(zip(self.columns, values)),
+                                           default=unicode) + "\n")
+        # The entries need to be in the file, before they are deleted
+        self.file.flush()
+        self.written += len(entries)
+
+    def close(self):
+        self.file.close()
+
+
+def rotate_audit_entries(session, cut_id=None, cut_date=None,
+                         batch_size=1000, sleep=0.0, archive=None,
+                         progress=None):
+    """
+    Delete old audit entries in batches, so that the audit table is not
+    locked for a long time. Between the batches we sleep for some time, so
+    that the requests can write their audit entries.
+
+    An entry is deleted, if its id is smaller than cut_id or if it is older
+    than cut_date.
+
+    :param session: The session of the audit database
+    :param cut_id: Delete the entries with an id smaller than this
+    :type cut_id: int
+    :param cut_date: Delete the entries, that are older than this
+    :type cut_date: datetime
+    :param batch_size: The number of entries, that are deleted in one
+        transaction
+    :param sleep: The seconds to sleep between two batches
+    :param archive: An AuditArchive, to which the entries are written before
+        they are deleted
+    :param progress: A function, that is called after each batch with the
+        number of deleted entries and the seconds since the start
+    :return: The number of deleted entries
+    """
+    conditions = []
+    if cut_id is not None:
+        conditions.append(LogEntry.id < cut_id)
+    if cut_date is not None:
+        conditions.append(LogEntry.date < cut_date)
+    if not conditions:
+        return 0
+    condition = or_(*conditions)
+    deleted = 0
+    start = time.time()
+    while True:
+        if archive:
+            entries = session.query(LogEntry).filter(condition)\
+                .order_by(asc(LogEntry.id)).limit(batch_size).all()
+            ids = [le.id for le in entries]
+        else:
+            ids = [row[0] for row in session.query(LogEntry.id)
+                   .filter(condition).order_by(asc(LogEntry.id))
+                   .limit(batch_size)]
+        if not ids:
+            break
+        if archive:
+            archive.write(entries)
+        # The batch contains all matching entries up to the last id.
+        session.query(LogEntry).filter(condition, LogEntry.id <= ids[-1])\
+            .delete(synchronize_session=False)
+        session.commit()
+        deleted += len(ids)
+        if progress:
+            progress(deleted, time.time() - start)
+        if len(ids) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+    return deleted
+
+
+def _hour(date):
+    return date.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_audit_stats(session, start_time=None, chunk_size=1000,
+                       first_start_time=None):
+    """
+    Update the hourly counts of the audit entries in the table
+    pidea_audit_stats.
+
+    The counts of all hours from start_time on are calculated again from the
+    audit entries. If start_time is not given, we start one hour before the
+    last hour, that is already counted, since audit entries can be written
+    late. If nothing is counted, yet, all audit entries starting at
+    first_start_time are counted. Calculating the hours again makes it safe
+    to run this function at any time.
+
+    :param session: The session of the audit database
+    :param start_time: Count the audit entries starting at this time
+    :type start_time: datetime
+    :param chunk_size: The number of audit entries, that are read at once
+    :param first_start_time: Count the audit entries starting at this time,
+        if nothing is counted, yet. If it is not given, all audit entries
+        are counted.
+    :type first_start_time: datetime
+    :return: The number of counted audit entries
+    """
+    if start_time is None:
+        last_hour = session.query(func.max(AuditStats.hour)).scalar()
+        if last_hour is not None:
+            start_time = last_hour - datetime.timedelta(hours=1)
+        else:
+            start_time = first_start_time
+    query = session.query(LogEntry.date, LogEntry.action, LogEntry.success,
+                          LogEntry.user, LogEntry.realm, LogEntry.serial)
+    stats_query = session.query(AuditStats)
+    if start_time is not None:
+        start_time = _hour(start_time)
+        query = query.filter(LogEntry.date >= start_time)
+        stats_query = stats_query.filter(AuditStats.hour >= start_time)
+
+    counts = Counter()
+    for date, action, success, user, realm, serial in query.yield_per(
+            chunk_size):
+        if date is not None:
+            counts[(_hour(date), action or u"", int(success or 0),
+                    user or u"", realm or u"", serial or u"")] += 1
+    try:
+        stats_query.delete(synchronize_session=False)
+        session.add_all([AuditStats(*key, count=count)
+                         for key, count in counts.items()])
+        session.commit()
+    except Exception:
+        # Probably the same hours were counted at the same time
+        session.rollback()
+        raise
+    return sum(counts.values())
+
+
+class Audit(AuditBase):
+    """
+    This is the SQLAudit module, which writes the audit entries
+    to an SQL database table.
+    It requires the configuration parameters.
+    PI_AUDIT_SQL_URI
+    """
+    
+    def __init__(self, config=None):
+        self.name = "sqlaudit"
+        self.config = config or {}
+        self.audit_data = {}
+        # The engine and the keys are shared within the process. Each
+        # audit object only gets its own session.
+        resources = get_audit_resources(self.config)
+        self.sign_object = resources.get_sign_object()
+        self.signer = resources.signer
+        self.engine = resources.engine
+        self.writer = resources.writer
 
         # create a Session
-        self.session = Session()
+        self.session = resources.Session()
         self.session._model_changes = {}
+        # The sequence and hash of the last checked entry of each process
+        self._chain_hashes = {}
 
     def _truncate_data(self):
         """
@@ -159,20 +687,41 @@ class Audit(AuditBase):
         filter_condition = and_(*conditions)
         return filter_condition
 
-    def get_total(self, param, AND=True, display_error=True, timelimit=None):
+    def get_total(self, param, AND=True, display_error=True, timelimit=None,
+                  max_count=None):
         """
         This method returns the total number of audit entries
         in the audit store
+
+        :param max_count: Do not count more than max_count entries. If there
+            are more entries, the count is returned as a string like "10000+".
+            0 counts all entries.
+        :type max_count: int
         """
         count = 0
+        if max_count not in [None, ""]:
+            max_count = _int_parameter("max_count", max_count)
+            if max_count < 0:
+                raise ParameterError("The parameter max_count must not be "
+                                     "negative.")
         # if param contains search filters, we build the search filter
         # to only return the number of those entries
         filter_condition = self._create_filter(param, timelimit=timelimit)
         
         try:
-            count = self.session.query(LogEntry.id)\
-                .filter(filter_condition)\
-                .count()
+            if max_count:
+                # Only count up to max_count + 1 entries, the database can
+                # stop scanning then.
+                ids = self.session.query(LogEntry.id)\
+                    .filter(filter_condition)\
+                    .limit(max_count + 1).subquery()
+                count = self.session.query(func.count(ids.c.id)).scalar()
+                if count > max_count:
+                    count = "{0:d}+".format(max_count)
+            else:
+                count = self.session.query(LogEntry.id)\
+                    .filter(filter_condition)\
+                    .count()
         finally:
             self.session.close()
         return count
@@ -205,30 +754,23 @@ class Audit(AuditBase):
         try:
             if self.config.get("PI_AUDIT_SQL_TRUNCATE"):
                 self._truncate_data()
-            le = LogEntry(action=self.audit_data.get("action"),
-                          success=int(self.audit_data.get("success", 0)),
-                          serial=self.audit_data.get("serial"),
-                          token_type=self.audit_data.get("token_type"),
-                          user=self.audit_data.get("user"),
-                          realm=self.audit_data.get("realm"),
-                          resolver=self.audit_data.get("resolver"),
-                          administrator=self.audit_data.get("administrator"),
-                          action_detail=self.audit_data.get("action_detail"),
-                          info=self.audit_data.get("info"),
-                          privacyidea_server=self.audit_data.get("privacyidea_server"),
-                          client=self.audit_data.get("client", ""),
-                          loglevel=self.audit_data.get("log_level"),
-                          clearance_level=self.audit_data.get("clearance_level")
-                          )
+            # The entry is dated at the end of the request, even if it is
+            # written later by the AuditWriter.
+            self.audit_data["date"] = datetime.datetime.now()
+            if self.writer:
+                # The entry is written by the background thread. If the
+                # queue is full, we write it ourselves.
+                if self.writer.put(self.audit_data):
+                    return
+                log.warning("The audit queue is full or stopped. Writing "
+                            "the audit entry synchronously.")
+            le = _create_log_entry(self.audit_data)
+            # The signature does not depend on the id, so we can sign
+            # the entry before it is written.
+            if self.sign_object:
+                self.signer.sign(le)
             self.session.add(le)
             self.session.commit()
-            # Add the signature
-            if self.sign_object:
-                s = self._log_to_string(le)
-                sign = self.sign_object.sign(s)
-                le.signature = sign
-                self.session.merge(le)
-                self.session.commit()
         except Exception as exx:  # pragma: no cover
             log.error("exception {0!r}".format(exx))
             log.error("DATA: {0!s}".format(self.audit_data))
@@ -255,6 +797,7 @@ class Audit(AuditBase):
         :return: None
         """
         self.sign_object = Sign(priv, pub)
+        self.signer = AuditSigner(lambda: self.sign_object)
 
     def _check_missing(self, audit_id):
         """
@@ -290,17 +833,28 @@ class Audit(AuditBase):
         return res
 
     @staticmethod
-    def _log_to_string(le):
+    def _log_to_string(le, prefix=None):
         """
         This function creates a string from the logentry so
         that this string can be signed.
         
         Note: Not all elements of the LogEntry are used to generate the
         string (the Signature is not!), otherwise we could have used pickle
+
+        :param prefix: The process, sequence and chain of the signature.
+            If it is given, the string does not contain the id of the entry
+            and the date only contains seconds, since not all databases
+            store microseconds.
         """
-        s = "id=%s,date=%s,action=%s,succ=%s,serial=%s,t=%s,u=%s,r=%s,adm=%s,"\
-            "ad=%s,i=%s,ps=%s,c=%s,l=%s,cl=%s" % (le.id,
-                                                  le.date,
+        if prefix is None:
+            ident = "id=%s" % le.id
+            date = le.date
+        else:
+            ident = prefix
+            date = le.date.strftime("%Y-%m-%d %H:%M:%S")
+        s = "%s,date=%s,action=%s,succ=%s,serial=%s,t=%s,u=%s,r=%s,adm=%s,"\
+            "ad=%s,i=%s,ps=%s,c=%s,l=%s,cl=%s" % (ident,
+                                                  date,
                                                   le.action,
                                                   le.success,
                                                   le.serial,
@@ -314,8 +868,71 @@ class Audit(AuditBase):
                                                   le.client,
                                                   le.loglevel,
                                                   le.clearance_level)
+        if prefix is not None and isinstance(s, unicode):
+            s = s.encode("utf8")
         return s
 
+    def _check_chain(self, le):
+        """
+        Check, that the previous entry of the same process exists and that
+        its hash is contained in the signature of the entry. This way
+        deleted or replaced entries are detected, even if the ids of the
+        entries were changed. Entries, that are signed with the database
+        id, are not chained.
+
+        The hash of each checked entry is kept, so that a list of entries
+        in ascending order does not need to read the previous entries again.
+
+        :return: True or False
+        """
+        parts = (le.signature or "").split(":")
+        if parts[0] != SIGNATURE_VERSION:
+            return True
+        try:
+            process = parts[1]
+            sequence = int(parts[2])
+            chain = parts[3]
+        except (IndexError, ValueError):
+            return False
+        previous = self._chain_hashes.get(process)
+        s = self._log_to_string(le, prefix=":".join(parts[:4]))
+        self._chain_hashes[process] = (sequence,
+                                       hashlib.sha256(s).hexdigest()[:32])
+        if sequence == 1:
+            # The first entry of a process
+            return chain == ""
+        if previous is not None and previous[0] == sequence - 1:
+            return previous[1] == chain
+
+        prev_le = self.session.query(LogEntry).filter(
+            LogEntry.signature.like("{0!s}:{1!s}:{2:d}:%".format(
+                SIGNATURE_VERSION, process, sequence - 1))).first()
+        if prev_le is None:
+            return False
+        prev_prefix = prev_le.signature.rpartition(":")[0]
+        s = self._log_to_string(prev_le, prefix=prev_prefix)
+        return hashlib.sha256(s).hexdigest()[:32] == chain
+
+    def _verify_signature(self, le):
+        """
+        Verify the signature of the log entry. This works for signatures,
+        which contain the database id, and for signatures, which contain the
+        process and the sequence.
+
+        :return: True or False
+        """
+        signature = le.signature or ""
+        if signature.startswith(SIGNATURE_VERSION + ":"):
+            prefix, _sep, hex_signature = signature.rpartition(":")
+            try:
+                signature = "{0:d}".format(long(hex_signature, 16))
+            except ValueError:
+                return False
+            s = self._log_to_string(le, prefix=prefix)
+        else:
+            s = self._log_to_string(le)
+        return self.sign_object.verify(s, signature)
+
     @staticmethod
     def _get_logentry_attribute(key):
         """
@@ -338,25 +955,65 @@ class Audit(AuditBase):
                     'clearance_level': LogEntry.clearance_level}
         return sortname.get(key)
 
-    def csv_generator(self, param=None, user=None, timelimit=None):
+    def csv_generator(self, param=None, user=None, timelimit=None,
+                      chunk_size=1000):
         """
         Returns the audit log as csv file.
+
+        The entries are read from the database in chunks of chunk_size
+        entries. Each chunk is returned as one CSV string, so that the
+        memory usage does not depend on the number of entries.
+
         :param config: The current flask app configuration
         :type config: dict
         :param param: The request parameters
         :type param: dict
         :param user: The user, who issued the request
+        :param chunk_size: The number of entries per chunk
+        :type chunk_size: int
         :return: None. It yields results as a generator
         """
         filter_condition = self._create_filter(param,
                                                timelimit=timelimit)
-        logentries = self.session.query(LogEntry).filter(filter_condition).all()
+        # The entries are streamed with an own connection, since some
+        # database drivers can not run the queries of audit_entry_to_dict
+        # while the result is read.
+        stream_session = Session(bind=self.engine)
+        try:
+            logentries = stream_session.query(LogEntry)\
+                .filter(filter_condition)\
+                .order_by(asc(LogEntry.id))\
+                .execution_options(stream_results=True)\
+                .yield_per(chunk_size)
+            output = StringIO()
+            writer = csv.writer(output)
+            writer.writerow(CSV_COLUMNS)
+            rows = 0
+            for le in logentries:
+                audit_dict = self.audit_entry_to_dict(le)
+                writer.writerow([self._csv_value(audit_dict.get(column))
+                                 for column in CSV_COLUMNS])
+                rows += 1
+                if rows % chunk_size == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+            if output.tell():
+                yield output.getvalue()
+        finally:
+            stream_session.close()
+            self.session.close()
 
-        for le in logentries:
-            audit_dict = self.audit_entry_to_dict(le)
-            audit_list = audit_dict.values()
-            string_list = ["'{0!s}'".format(x) for x in audit_list]
-            yield ",".join(string_list)+"\n"
+    @staticmethod
+    def _csv_value(value):
+        """
+        The csv module of Python 2 can not write unicode.
+        """
+        if value is None:
+            return ""
+        if isinstance(value, unicode):
+            return value.encode("utf8")
+        return value
 
     def get_count(self, search_dict, timedelta=None, success=None):
         # create filter condition
@@ -375,46 +1032,87 @@ class Audit(AuditBase):
         return log_count
 
     def search(self, search_dict, page_size=15, page=1, sortorder="asc",
-               timelimit=None):
+               timelimit=None, cursor=None, max_count=None,
+               verify_chain=False):
         """
         This function returns the audit log as a Pagination object.
 
+        The entries can either be paged by the page number or by a cursor.
+        The cursor is the id of the last entry of the previous page. In this
+        case the next page is read directly from the index of the id. The
+        attribute "next" of the pagination object then contains the cursor
+        for the next page.
+
         :param timelimit: Only audit entries newer than this timedelta will
             be searched
         :type timelimit: timedelta
+        :param cursor: The id of the last entry of the previous page or an
+            empty string to get the first page.
+        :param max_count: Only count up to this number of entries. In the
+            cursor mode at most CURSOR_MAX_COUNT entries are counted by
+            default. 0 counts all entries.
+        :type max_count: int
+        :param verify_chain: Also check, that the previous entry of the
+            process of each entry exists. This reads the previous entries
+            from the database.
+        :type verify_chain: bool
         """
-        page = int(page)
         page_size = int(page_size)
+        if max_count is None:
+            max_count = self.config.get("PI_AUDIT_SEARCH_MAX_COUNT")
+        cursor_mode = cursor is not None
+        if cursor_mode:
+            cursor = _int_parameter("cursor", cursor) if cursor != "" else None
+            if max_count is None:
+                max_count = CURSOR_MAX_COUNT
         paging_object = Paginate()
-        paging_object.page = page
-        paging_object.total = self.get_total(search_dict, timelimit=timelimit)
-        if page > 1:
-            paging_object.prev = page - 1
-        if paging_object.total > (page_size * page):
-            paging_object.next = page + 1
-
-        auditIter = self.search_query(search_dict, page_size=page_size,
-                                      page=page, sortorder=sortorder,
-                                      timelimit=timelimit)
-        try:
-            le = auditIter.next()
-            while le:
-                # Fill the list
-                paging_object.auditdata.append(self.audit_entry_to_dict(le))
-                le = auditIter.next()
-        except StopIteration:
-            log.debug("Interation stopped.")
+        paging_object.total = self.get_total(search_dict, timelimit=timelimit,
+                                             max_count=max_count)
+        if cursor_mode:
+            paging_object.page = cursor
+            # Read one more entry to know, if there is a next page
+            auditIter = self.search_query(search_dict,
+                                          page_size=page_size + 1,
+                                          sortorder=sortorder,
+                                          timelimit=timelimit,
+                                          cursor=cursor)
+            entries = list(auditIter)
+            if len(entries) > page_size:
+                entries = entries[:page_size]
+                paging_object.next = entries[-1].id
+        else:
+            page = int(page)
+            paging_object.page = page
+            if page > 1:
+                paging_object.prev = page - 1
+            total = paging_object.total
+            if isinstance(total, basestring):
+                # The count is capped, so there are more entries
+                total = int(total.rstrip("+")) + 1
+            if total > (page_size * page):
+                paging_object.next = page + 1
+            entries = self.search_query(search_dict, page_size=page_size,
+                                        page=page, sortorder=sortorder,
+                                        timelimit=timelimit)
+
+        for le in entries:
+            # Fill the list
+            paging_object.auditdata.append(
+                self.audit_entry_to_dict(le, verify_chain=verify_chain))
 
         return paging_object
         
     def search_query(self, search_dict, page_size=15, page=1, sortorder="asc",
-                     sortname="number", timelimit=None):
+                     sortname="number", timelimit=None, cursor=None):
         """
         This function returns the audit log as an iterator on the result
 
         :param timelimit: Only audit entries newer than this timedelta will
             be searched
         :type timelimit: timedelta
+        :param cursor: Only return the entries after the entry with this id
+            in the sort order. In this case the page is ignored.
+        :type cursor: int
         """
         logentries = None
         try:
@@ -424,6 +1122,14 @@ class Audit(AuditBase):
             # create filter condition
             filter_condition = self._create_filter(search_dict,
                                                    timelimit=timelimit)
+            if cursor is not None:
+                offset = 0
+                if sortorder == "desc":
+                    filter_condition = and_(filter_condition,
+                                            LogEntry.id < int(cursor))
+                else:
+                    filter_condition = and_(filter_condition,
+                                            LogEntry.id > int(cursor))
 
             if sortorder == "desc":
                 logentries = self.session.query(LogEntry).filter(
@@ -479,6 +1185,56 @@ class Audit(AuditBase):
         df = DataFrame(rows)
         return df
 
+    def rollup(self, start_time=None, first_start_time=None):
+        """
+        Update the hourly counts of the audit entries, which are used for the
+        statistics.
+
+        :param start_time: Count the audit entries starting at this time
+        :param first_start_time: Count the audit entries starting at this
+            time, if nothing is counted, yet.
+        :return: The number of counted audit entries
+        """
+        try:
+            return rollup_audit_stats(self.session, start_time=start_time,
+                                      first_start_time=first_start_time)
+        finally:
+            self.session.close()
+
+    def get_rollup_counts(self, keys, start_time=None, end_time=None,
+                          actions=None, success=None):
+        """
+        Return the number of audit entries grouped by the given keys. The
+        numbers are read from the hourly counts.
+
+        :param keys: The columns like ["user", "success"]
+        :type keys: list
+        :param start_time: Only count the entries after this time
+        :param end_time: Only count the entries before this time
+        :param actions: Only count the entries of these actions
+        :type actions: list
+        :param success: Only count successful (1) or failed (0) entries
+        :return: dict with the tuple of the values of the keys and the number
+        """
+        columns = [getattr(AuditStats, key) for key in keys]
+        conditions = []
+        if start_time is not None:
+            conditions.append(AuditStats.hour >= _hour(start_time))
+        if end_time is not None:
+            conditions.append(AuditStats.hour <= end_time)
+        if actions is not None:
+            conditions.append(AuditStats.action.in_(actions))
+        if success is not None:
+            conditions.append(AuditStats.success == success)
+        try:
+            query = self.session.query(func.sum(AuditStats.count), *columns)\
+                .filter(and_(*conditions))\
+                .group_by(*columns)
+            counts = dict((tuple(row[1:]), int(row[0])) for row in query)
+        finally:
+            self.session.close()
+        return counts
+
     def clear(self):
         """
         Deletes all entries in the database table.
@@ -486,12 +1242,14 @@ class Audit(AuditBase):
         :return:
         """
         self.session.query(LogEntry).delete()
+        self.session.query(AuditStats).delete()
         self.session.commit()
     
-    def audit_entry_to_dict(self, audit_entry):
-        sig = self.sign_object.verify(self._log_to_string(audit_entry),
-                                      audit_entry.signature)
+    def audit_entry_to_dict(self, audit_entry, verify_chain=False):
+        sig = self._verify_signature(audit_entry)
         is_not_missing = self._check_missing(int(audit_entry.id))
+        if verify_chain:
+            is_not_missing = is_not_missing and self._check_chain(audit_entry)
         # is_not_missing = True
         audit_dict = {'number': audit_entry.id,
                       'date': audit_entry.date.isoformat(),
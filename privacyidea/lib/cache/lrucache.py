@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+#
+#  This code is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU AFFERO GENERAL PUBLIC LICENSE
+#  License as published by the Free Software Foundation; either
+#  version 3 of the License, or any later version.
+#
+#  This code is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU AFFERO GENERAL PUBLIC LICENSE for more details.
+#
+#  You should have received a copy of the GNU Affero General Public
+#  License along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+__doc__ = """A bounded cache with a least recently used eviction and a timeout
+per entry. The entries can additionally be stored in a shared backend like
+Redis, so that the worker processes of a server share the cached values.
+
+The cache is used by the LDAP resolver to cache the user lookups.
+
+The file is tested in tests/test_lib_cache.py
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from privacyidea.lib.utils import to_utf8
+
+log = logging.getLogger(__name__)
+
+# The default maximum number of entries in the process
+DEFAULT_CACHE_SIZE = 1000
+
+
+class NotFound(object):
+    """
+    The type of the value NOT_FOUND, that is returned for keys, that are not
+    contained in the cache.
+    """
+    def __repr__(self):
+        return "NOT_FOUND"
+
+NOT_FOUND = NotFound()
+
+
+class RedisBackend(object):
+    """
+    A shared backend, that stores the entries in a Redis server. Any other
+    object, that provides the methods get(key), setex(key, value, timeout)
+    and delete(key) can be used as a backend, too.
+    """
+
+    def __init__(self, server):
+        """
+        :param server: The Redis server like "localhost" or "localhost:6379"
+        """
+        import redis
+        host, _sep, port = server.partition(":")
+        if port:
+            self.redis = redis.Redis(host, int(port))
+        else:
+            self.redis = redis.Redis(host)
+
+    def get(self, key):
+        return self.redis.get(key)
+
+    def setex(self, key, value, timeout):
+        return self.redis.setex(key, value, timeout)
+
+    def delete(self, key):
+        return self.redis.delete(key)
+
+
+class LRUCache(object):
+    """
+    A thread safe cache, that holds at most size entries. If the cache is
+    full, the least recently used entry is removed.
+
+    Each entry has its own timeout. This way empty results can be cached as
+    negative entries with a shorter timeout than the found values.
+
+    If a shared backend is given, the entries are also written to the
+    backend as JSON and entries, that are not contained in the local cache,
+    are read from the backend. Errors of the backend are logged and the
+    cache continues to work locally.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE, shared=None, namespace=""):
+        """
+        :param size: The maximum number of entries in the local cache
+        :param shared: The shared backend like a RedisBackend
+        :param namespace: The prefix of the keys in the shared backend
+        """
+        self.size = size
+        self.shared = shared
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        # The values are tuples of the expiration time and the value
+        self._entries = OrderedDict()
+        self.counters = {"hits": 0,
+                         "negative_hits": 0,
+                         "shared_hits": 0,
+                         "misses": 0,
+                         "evictions": 0,
+                         "expired": 0,
+                         "shared_errors": 0}
+
+    def _shared_key(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        parts = [self.namespace] + list(key)
+        return b":".join([to_utf8(p) if isinstance(p, basestring) else
+                          str(p) for p in parts])
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def get(self, key):
+        """
+        Return the value of the key or NOT_FOUND, if the key is not
+        contained in the cache or if the entry has timed out.
+
+        :param key: A hashable key
+        :return: The value or NOT_FOUND
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                if entry[0] > now:
+                    # The entry is the most recently used one
+                    self._entries[key] = entry
+                    self.counters["hits"] += 1
+                    if not entry[1]:
+                        self.counters["negative_hits"] += 1
+                    return entry[1]
+                self.counters["expired"] += 1
+
+        if self.shared is not None:
+            try:
+                data = self.shared.get(self._shared_key(key))
+                if data is not None:
+                    value, expires = json.loads(data)
+                    if expires > now:
+                        self._store(key, value, expires)
+                        self._count("shared_hits")
+                        return value
+            except Exception as exx:
+                log.warning("Could not read from the shared "
+                            "cache: {0!r}".format(exx))
+                self._count("shared_errors")
+
+        self._count("misses")
+        return NOT_FOUND
+
+    def _store(self, key, value, expires):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def set(self, key, value, timeout):
+        """
+        Add the value to the cache.
+
+        :param key: A hashable key
+        :param value: The value, that needs to be JSON serializable to be
+            stored in the shared backend
+        :param timeout: The number of seconds the entry is valid
+        """
+        expires = time.time() + timeout
+        self._store(key, value, expires)
+        if self.shared is not None:
+            try:
+                self.shared.setex(self._shared_key(key),
+                                  json.dumps([value, expires]),
+                                  int(timeout) or 1)
+            except Exception as exx:
+                log.warning("Could not write to the shared "
+                            "cache: {0!r}".format(exx))
+                self._count("shared_errors")
+
+    def delete(self, key):
+        """
+        Remove the key from the cache.
+
+        :param key: A hashable key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            try:
+                self.shared.delete(self._shared_key(key))
+            except Exception as exx:
+                log.warning("Could not delete from the shared "
+                            "cache: {0!r}".format(exx))
+                self._count("shared_errors")
+
+    def clear(self):
+        """
+        Remove all entries from the local cache
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get_metrics(self):
+        """
+        :return: dict with the counters, the number of entries and the hit
+            rate of the cache
+        """
+        with self._lock:
+            metrics = dict(self.counters)
+            metrics["size"] = len(self._entries)
+        hits = metrics["hits"] + metrics["shared_hits"]
+        requests = hits + metrics["misses"]
+        metrics["hit_rate"] = float(hits) / requests if requests else 0.0
+        return metrics
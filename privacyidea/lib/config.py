@@ -35,7 +35,8 @@ The code is tested in tests/test_lib_config
 
 import logging
 import inspect
-from flask import current_app, g
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
 
 from .log import log_with
 from ..models import (Config, db, Resolver, Realm, PRIVACYIDEA_TIMESTAMP,
@@ -53,6 +54,8 @@ import datetime
 log = logging.getLogger(__name__)
 
 ENCODING = 'utf-8'
+# The entry point group of token classes in other python packages
+TOKEN_ENTRY_POINT = "privacyidea.tokens"
 
 
 class Singleton(type):
@@ -76,6 +79,72 @@ class Singleton(type):
         return cls._instances[cls]
 
 
+def get_request_object(name, cls):
+    """
+    Return the caching object like the ConfigClass or the PolicyClass, that
+    is pinned to the current request in flask.g under the given name.
+
+    The Singleton checks the timestamp in the database each time the object
+    is created. Thus the object is only created when it is requested for the
+    first time in a request or if the configuration was changed during the
+    request. In all other cases the pinned object is returned.
+
+    :param name: The attribute name in flask.g like "config_object"
+    :param cls: The class of the caching object
+    :return: The caching object
+    """
+    pinned_objects = g.get("pinned_objects")
+    if pinned_objects is None:
+        pinned_objects = g.pinned_objects = set()
+    obj = g.get(name)
+    if obj is None or name not in pinned_objects:
+        obj = cls()
+        setattr(g, name, obj)
+        pinned_objects.add(name)
+    return obj
+
+
+def unpin_request_objects():
+    """
+    Release the caching objects, that are pinned to the request and clear
+    the request caches. The next call of get_request_object will check the
+    timestamp in the database again. This is called at the beginning of
+    each request.
+    """
+    if has_app_context():
+        g.pinned_objects = set()
+        g.request_caches = {}
+
+
+@event.listens_for(Config.Value, "set")
+def _config_timestamp_written(target, value, oldvalue, initiator):
+    """
+    The config timestamp is written by save_config_timestamp, whenever the
+    configuration is changed. Then the config and policy objects, that are
+    pinned to the request, need to be checked again.
+    """
+    if target.Key == PRIVACYIDEA_TIMESTAMP:
+        unpin_request_objects()
+
+
+def get_request_cache(name):
+    """
+    Return a dictionary, that can be used to cache values for the duration
+    of the current request. The caches are cleared at the beginning of each
+    request. Outside of an application context an empty dictionary is
+    returned, so that nothing is cached.
+
+    :param name: The name of the cache like "policies"
+    :return: dict
+    """
+    if not has_app_context():
+        return {}
+    caches = g.get("request_caches")
+    if caches is None:
+        caches = g.request_caches = {}
+    return caches.setdefault(name, {})
+
+
 class ConfigClass(object):
     """
     The Config_Object will contain all database configuration of system
@@ -94,7 +163,10 @@ class ConfigClass(object):
         self.resolver = {}
         self.realm = {}
         self.default_realm = None
+        self.snapshots = {}
         self.timestamp = None
+        # The config timestamp from the database of the data we hold
+        self.config_timestamp = None
         self.reload_from_db()
 
     def reload_from_db(self):
@@ -108,12 +180,14 @@ class ConfigClass(object):
                 "PI_CHECK_RELOAD_CONFIG", 0)) < datetime.datetime.now():
             db_ts = Config.query.filter_by(Key=PRIVACYIDEA_TIMESTAMP).first()
             if reload_db(self.timestamp, db_ts):
-                self.config = {}
-                self.resolver = {}
-                self.realm = {}
-                self.default_realm = None
+                # The new data is collected first and then set at once, so
+                # that readers of the object never see a partial config.
+                config = {}
+                resolvers = {}
+                realms = {}
+                default_realm = None
                 for sysconf in Config.query.all():
-                    self.config[sysconf.Key] = {
+                    config[sysconf.Key] = {
                         "Value": sysconf.Value,
                         "Type": sysconf.Type,
                         "Description": sysconf.Description}
@@ -128,11 +202,11 @@ class ConfigClass(object):
                             value = rconf.Value
                         data[rconf.Key] = value
                     resolverdef["data"] = data
-                    self.resolver[resolver.name] = resolverdef
+                    resolvers[resolver.name] = resolverdef
 
                 for realm in Realm.query.all():
                     if realm.default:
-                        self.default_realm = realm.name
+                        default_realm = realm.name
                     realmdef = {"option": realm.option,
                                 "default": realm.default,
                                 "resolver": []}
@@ -140,7 +214,17 @@ class ConfigClass(object):
                         realmdef["resolver"].append({"priority": x.priority,
                                                      "name": x.resolver.name,
                                                      "type": x.resolver.rtype})
-                    self.realm[realm.name] = realmdef
+                    realms[realm.name] = realmdef
+
+                self.snapshots = {
+                    "admin": ConfigSnapshot(config, role="admin"),
+                    "public": ConfigSnapshot(config, role="public")}
+                self.config = config
+                self.resolver = resolvers
+                self.realm = realms
+                self.default_realm = default_realm
+                if db_ts:
+                    self.config_timestamp = db_ts.Value
 
             self.timestamp = datetime.datetime.now()
 
@@ -159,45 +243,123 @@ class ConfigClass(object):
         :return: If key is None, then a dictionary is returned. If a certain key
             is given a string/bool is returned.
         """
-        default_true_keys = [SYSCONF.PREPENDPIN, SYSCONF.SPLITATSIGN,
-                             SYSCONF.INCFAILCOUNTER, SYSCONF.RETURNSAML]
+        snapshot = self.snapshots.get(role)
+        if snapshot is None:
+            # unknown roles only see the public values
+            snapshot = self.snapshots["public"]
+        if key:
+            # We only return a single key
+            return snapshot.get(key, default, return_bool=return_bool)
 
-        r_config = {}
+        r_config = snapshot.as_dict()
+        if return_bool:
+            r_config = _to_bool(r_config)
+        return r_config
 
-        # reduce the dictionary to only public keys!
-        reduced_config = {}
-        for ckey, cvalue in self.config.iteritems():
-            if role == "admin" or cvalue.get("Type") == "public":
-                reduced_config[ckey] = self.config[ckey]
-        if not reduced_config and role=="admin":
-            reduced_config = self.config
 
-        for ckey, cvalue in reduced_config.iteritems():
-            if cvalue.get("Type") == "password":
-                # decrypt the password
-                r_config[ckey] = decryptPassword(cvalue.get("Value"))
-            else:
-                r_config[ckey] = cvalue.get("Value")
+def _to_bool(value):
+    """
+    Convert a config value to a boolean. Returns True if the value is
+    "True", "true", 1, "1", True...
+    Values, that are neither strings nor integers are returned unchanged.
+
+    :param value: The config value
+    :return: bool
+    """
+    if isinstance(value, int):
+        # This also covers bool
+        value = value > 0
+    elif isinstance(value, basestring):
+        value = value.lower() in ["true", "1"]
+    return value
+
+
+class ConfigSnapshot(object):
+    """
+    A read only view of the system config for one role, that is built once
+    when the config is read from the database.
 
+    Plain values and their boolean interpretation are precomputed, so that
+    reading a single key is a simple dictionary lookup. Values of type
+    "password" are only decrypted, when they are accessed for the first time.
+    """
+
+    def __init__(self, config, role="admin"):
+        """
+        :param config: The config dictionary as read from the database
+            like {key: {"Value": ..., "Type": ..., "Description": ...}}
+        :param role: "admin" or "public"
+        """
+        default_true_keys = [SYSCONF.PREPENDPIN, SYSCONF.SPLITATSIGN,
+                             SYSCONF.INCFAILCOUNTER, SYSCONF.RETURNSAML]
+        self.role = role
+        self._values = {}
+        self._encrypted = {}
+        self._decrypted = {}
+        self._bools = {}
+        for ckey, cvalue in config.iteritems():
+            if role == "admin" or cvalue.get("Type") == "public":
+                if cvalue.get("Type") == "password":
+                    self._encrypted[ckey] = cvalue.get("Value")
+                else:
+                    self._values[ckey] = cvalue.get("Value")
+                    self._bools[ckey] = _to_bool(cvalue.get("Value"))
         for t_key in default_true_keys:
-            if t_key not in r_config:
-                r_config[t_key] = "True"
+            if t_key not in self._values and t_key not in self._encrypted:
+                self._values[t_key] = "True"
+                self._bools[t_key] = True
 
-        if key:
-            # We only return a single key
-            r_config = r_config.get(key, default)
+    def __contains__(self, key):
+        return key in self._values or key in self._encrypted
 
+    def _decrypt(self, key):
+        if key not in self._decrypted:
+            self._decrypted[key] = decryptPassword(self._encrypted[key])
+        return self._decrypted[key]
+
+    def get(self, key, default=None, return_bool=False):
+        """
+        Return the value of a single config key.
+
+        :param key: The config key
+        :param default: Returned, if the key does not exist
+        :param return_bool: If the value should be interpreted as boolean
+        :return: string or bool
+        """
+        if return_bool and key in self._bools:
+            return self._bools[key]
+        if key in self._values:
+            value = self._values[key]
+        elif key in self._encrypted:
+            value = self._decrypt(key)
+        else:
+            value = default
         if return_bool:
-            if isinstance(r_config, bool):
-                pass
-            if isinstance(r_config, int):
-                r_config = r_config > 0
-            if isinstance(r_config, basestring):
-                r_config = r_config.lower() in ["true", "1"]
+            value = _to_bool(value)
+        return value
 
+    def as_dict(self):
+        """
+        Return the complete config of this role as a new dictionary with
+        all passwords decrypted.
+
+        :return: dict
+        """
+        r_config = dict(self._values)
+        for ckey in self._encrypted:
+            r_config[ckey] = self._decrypt(ckey)
         return r_config
 
 
+def get_config_object():
+    """
+    Return the ConfigClass object, that is pinned to the current request.
+
+    :return: ConfigClass object
+    """
+    return get_request_object("config_object", ConfigClass)
+
+
 class SYSCONF(object):
     __doc__ = """This is a list of system config attributes"""
     OVERRIDECLIENT = "OverrideAuthorizationClient"
@@ -229,8 +391,7 @@ def get_from_config(key=None, default=None, role="admin", return_bool=False):
     :return: If key is None, then a dictionary is returned. If a certain key
         is given a string/bool is returned.
     """
-    g.config_object = ConfigClass()
-    return g.config_object.get_config(key=key, default=default, role=role,
+    return get_config_object().get_config(key=key, default=default, role=role,
                                       return_bool=return_bool)
 
 
@@ -321,6 +482,100 @@ def get_token_class_dict():
     return tokenclass_dict, tokentype_dict
 
 
+class TokenClassRegistry(object):
+    """
+    An immutable registry of the available token classes, that maps the
+    token types to the token classes. It is built once with
+    build_token_class_registry and stored in the app config.
+    """
+
+    def __init__(self, token_classes):
+        """
+        :param token_classes: list of token classes
+        """
+        self._classes = {}
+        self._types = []
+        for token_class in token_classes:
+            tokentype = token_class.get_class_type()
+            if tokentype.lower() in self._classes:
+                log.warning("The token type {0!s} of {1!r} is already "
+                            "registered.".format(tokentype, token_class))
+                continue
+            self._classes[tokentype.lower()] = token_class
+            self._types.append(tokentype)
+
+    def __contains__(self, tokentype):
+        return self.get(tokentype) is not None
+
+    def get(self, tokentype):
+        """
+        Return the token class for the given token type like "hotp".
+
+        :param tokentype: The token type. Upper and lower case are ignored.
+        :return: The token class or None
+        """
+        tokentype = tokentype.lower()
+        if tokentype == "hmac":
+            tokentype = "hotp"
+        return self._classes.get(tokentype)
+
+    def types(self):
+        """
+        :return: list of the token types like 'hotp', 'totp'...
+        """
+        return list(self._types)
+
+    def classes(self):
+        """
+        :return: list of the token classes
+        """
+        return [self._classes[t.lower()] for t in self._types]
+
+
+def build_token_class_registry():
+    """
+    Build the TokenClassRegistry from the token modules of privacyIDEA and
+    from the token classes, that other python packages provide in the entry
+    point group "privacyidea.tokens".
+
+    :return: TokenClassRegistry
+    """
+    from .tokenclass import TokenClass
+    (t_classes, _t_types) = get_token_class_dict()
+    token_classes = [tclass for _name, tclass in sorted(t_classes.items())]
+    try:
+        import pkg_resources
+        for entry_point in pkg_resources.iter_entry_points(
+                TOKEN_ENTRY_POINT):
+            try:
+                tclass = entry_point.load()
+                if inspect.isclass(tclass) and issubclass(tclass, TokenClass):
+                    token_classes.append(tclass)
+                else:
+                    log.warning("The entry point {0!s} is no token "
+                                "class.".format(entry_point))
+            except Exception as exx:  # pragma: no cover
+                log.warning("unable to load token class {0!s}: "
+                            "{1!r}".format(entry_point, exx))
+    except ImportError:  # pragma: no cover
+        log.debug("pkg_resources is not available. No token plugins are "
+                  "loaded.")
+    return TokenClassRegistry(token_classes)
+
+
+def get_token_class_registry():
+    """
+    Return the TokenClassRegistry of the app. It is built only once.
+
+    :return: TokenClassRegistry
+    """
+    registry = current_app.config.get("pi_token_registry")
+    if registry is None:
+        registry = build_token_class_registry()
+        current_app.config["pi_token_registry"] = registry
+    return registry
+
+
 #@cache.cached(key_prefix="classes")
 def get_token_class(tokentype):
     """
@@ -329,19 +584,7 @@ def get_token_class(tokentype):
     :return: The tokenclass for the given type
     :rtype: tokenclass
     """
-    if tokentype.lower() == "hmac":
-        tokentype = "hotp"
-    class_dict, type_dict = get_token_class_dict()
-    tokenmodule = ""
-    tokenclass = None
-    for module, ttype in type_dict.items():
-        if ttype.lower() == tokentype.lower():
-            tokenmodule = module
-            break
-    if tokenmodule:
-        tokenclass = class_dict.get(tokenmodule)
-
-    return tokenclass
+    return get_token_class_registry().get(tokentype)
 
 
 #@cache.cached(key_prefix="types")
@@ -355,8 +598,7 @@ def get_token_types():
     if "pi_token_types" in current_app.config:
         tokentypes = current_app.config["pi_token_types"]
     else:
-        (_t_classes, t_types) = get_token_class_dict()
-        tokentypes = t_types.values()
+        tokentypes = get_token_class_registry().types()
         current_app.config["pi_token_types"] = tokentypes
 
     return tokentypes
@@ -400,8 +642,7 @@ def get_token_classes():
     if "pi_token_classes" in current_app.config:
         token_classes = current_app.config["pi_token_classes"]
     else:
-        (t_classes, _t_types) = get_token_class_dict()
-        token_classes = t_classes.values()
+        token_classes = get_token_class_registry().classes()
         current_app.config["pi_token_classes"] = token_classes
 
     return token_classes
@@ -54,7 +54,9 @@ except ImportError:
     # Bummer the version of PyCrypto has no PKCS1_15
     SIGN_WITH_RSA = True
 import passlib.hash
+import os
 import sys
+import threading
 import traceback
 
 
@@ -125,6 +127,20 @@ class SecretObj(object):
         self._clearKey_(preserve=self.preserve)
         return h
 
+    def hmac_object(self, hash_algo):
+        """
+        Return an HMAC object, that is initialized with the secret key.
+        The object can be copied to calculate the HMAC of many messages
+        without setting up the key again.
+
+        :param hash_algo: The hash function like hashlib.sha1
+        :return: hmac object
+        """
+        self._setupKey_()
+        h = hmac.new(self.bkey, digestmod=hash_algo)
+        self._clearKey_(preserve=self.preserve)
+        return h
+
     def aes_decrypt(self, data_input):
         '''
         support inplace aes decryption for the yubikey
@@ -612,6 +628,46 @@ def zerome(bufferObject):
     return
 
 
+# The keys of the Sign objects are read and parsed once per process.
+# The cache is keyed by the file name and the modification time of the file.
+RSA_KEY_CACHE = {}
+RSA_KEY_CACHE_LOCK = threading.Lock()
+
+
+def read_rsa_key(filename):
+    """
+    Read the key file and parse the RSA key. The result is cached until the
+    file is modified.
+
+    :param filename: The PEM file with the private or public key
+    :return: tuple of the file content and the RSA key object. The key
+        object is None, if the file does not contain a valid key.
+    """
+    try:
+        mtime = os.stat(filename).st_mtime
+    except OSError:
+        # open will raise the IOError
+        mtime = None
+    cache_key = (filename, mtime)
+    entry = RSA_KEY_CACHE.get(cache_key)
+    if entry is None:
+        with open(filename, "r") as f:
+            content = f.read()
+        try:
+            key = RSA.importKey(content)
+        except (ValueError, IndexError, TypeError) as exx:
+            log.warning("Could not parse RSA key {0!s}: "
+                        "{1!r}".format(filename, exx))
+            key = None
+        entry = (content, key)
+        with RSA_KEY_CACHE_LOCK:
+            # Remove the entries of the old versions of the file
+            for k in [k for k in RSA_KEY_CACHE if k[0] == filename]:
+                del RSA_KEY_CACHE[k]
+            RSA_KEY_CACHE[cache_key] = entry
+    return entry
+
+
 class Sign(object):
     """
     Signing class that is used to sign Audit Entries and to sign API responses.
@@ -626,18 +682,16 @@ class Sign(object):
         """
         self.private = ""
         self.public = ""
+        self.private_key = None
+        self.public_key = None
         try:
-            f = open(private_file, "r")
-            self.private = f.read()
-            f.close()
+            self.private, self.private_key = read_rsa_key(private_file)
         except Exception as e:
             log.error("Error reading private key {0!s}: ({1!r})".format(private_file, e))
             raise e
 
         try:
-            f = open(public_file, "r")
-            self.public = f.read()
-            f.close()
+            self.public, self.public_key = read_rsa_key(public_file)
         except Exception as e:
             log.error("Error reading public key {0!s}: ({1!r})".format(public_file, e))
             raise e
@@ -649,7 +703,7 @@ class Sign(object):
         :return: The signature of the string
         :rtype: long
         """
-        RSAkey = RSA.importKey(self.private)
+        RSAkey = self.private_key or RSA.importKey(self.private)
         if SIGN_WITH_RSA:
             hashvalue = HashFunc.new(s).digest()
             signature = RSAkey.sign(hashvalue, 1)
@@ -665,7 +719,7 @@ class Sign(object):
         """
         r = False
         try:
-            RSAkey = RSA.importKey(self.public)
+            RSAkey = self.public_key or RSA.importKey(self.public)
             signature = long(signature)
             if SIGN_WITH_RSA:
                 hashvalue = HashFunc.new(s).digest()
@@ -26,7 +26,7 @@ from privacyidea.lib.smtpserver import send_email_identifier
 from privacyidea.lib.utils import generate_password
 from privacyidea.lib.config import get_from_config
 from privacyidea.lib.resolver import get_resolver_list
-from privacyidea.lib.policy import PolicyClass, ACTION, SCOPE
+from privacyidea.lib.policy import get_policy_object, ACTION, SCOPE
 from sqlalchemy import and_
 from datetime import datetime
 
@@ -141,7 +141,7 @@ def is_password_reset():
     """
     rlist = get_resolver_list(editable=True)
     log.debug("Number of editable resolvers: {0!s}".format(len(rlist)))
-    Policy = PolicyClass()
+    Policy = get_policy_object()
     policy_at_all = Policy.get_policies(scope=SCOPE.USER, active=True)
     log.debug("Policy at all: {0!s}".format(policy_at_all))
     policy_reset_pw = Policy.get_policies(scope=SCOPE.USER,
@@ -148,31 +148,37 @@ Sat, Sun.
 from .log import log_with
 from configobj import ConfigObj
 
-from netaddr import IPAddress
 from netaddr import IPNetwork
 import logging
 from ..models import (Policy, Config, PRIVACYIDEA_TIMESTAMP, db,
                       save_config_timestamp)
-from flask import current_app
+from flask import current_app, request, has_request_context
 from privacyidea.lib.config import (get_token_classes, get_token_types,
-                                    Singleton)
+                                    Singleton, get_request_object,
+                                    get_request_cache)
 from privacyidea.lib.error import ParameterError, PolicyError
 from privacyidea.lib.realm import get_realms
 from privacyidea.lib.resolver import get_resolver_list
 from privacyidea.lib.smtpserver import get_smtpservers
 from privacyidea.lib.radiusserver import get_radiusservers
-from privacyidea.lib.utils import check_time_in_range, reload_db
+from privacyidea.lib.utils import (parse_time_range, check_time_in_bitset,
+                                   reload_db, IPPrefixTree)
 from privacyidea.lib.user import User
 from privacyidea.lib import _
 import datetime
 import re
 import ast
+import threading
 
 log = logging.getLogger(__name__)
 
 optional = True
 required = False
 
+# Hits and misses of the request cache of get_policies and get_action_values
+POLICY_CACHE_STATISTICS = {"hits": 0, "misses": 0}
+POLICY_CACHE_STATISTICS_LOCK = threading.Lock()
+
 
 class SCOPE(object):
     __doc__ = """This is the list of the allowed scopes that can be used in
@@ -346,6 +352,179 @@ class AUTOASSIGNVALUE(object):
     NONE = "any_pin"
 
 
+class PolicyValueMatcher(object):
+    """
+    A precompiled matcher for a policy attribute like "user", "realm",
+    "resolver", "adminrealm" or the action names of a policy.
+    It returns the same results as PolicyClass._search_value, but the
+    regular expressions are only compiled once, when the policies are read.
+    """
+
+    def __init__(self, policy_attributes):
+        """
+        :param policy_attributes: The list of values of the policy attribute
+        :type policy_attributes: list
+        """
+        self.values = list(policy_attributes or [])
+        self.empty = not policy_attributes
+        self.literals = set(self.values)
+        self.wildcard = "*" in self.literals
+        self.excluded = set([value[1:] for value in self.values
+                             if value and value[0] in ["!", "-"]])
+        self.regexes = []
+        for value in self.values:
+            if value == "*":
+                continue
+            try:
+                self.regexes.append(re.compile("^{0!s}$".format(value)))
+            except re.error as exx:
+                log.warning("The policy value {0!r} is no valid regular "
+                            "expression: {1!s}".format(value, exx))
+
+    def search(self, searchvalue):
+        """
+        Search the given value in the policy attribute.
+
+        :param searchvalue: The value to search or a list of values
+        :return: tuple of value_found and value_excluded
+        """
+        if type(searchvalue) == list:
+            value_found = self.wildcard or \
+                bool(self.literals.intersection(searchvalue))
+            return value_found, False
+        value_excluded = searchvalue in self.excluded
+        value_found = self.wildcard or searchvalue in self.literals
+        if not value_found:
+            for regex in self.regexes:
+                if regex.search(searchvalue):
+                    value_found = True
+                    break
+        return value_found, value_excluded
+
+
+class CompiledPolicy(object):
+    """
+    A policy definition with precompiled matchers for the attributes and
+    preparsed client networks.
+    """
+
+    def __init__(self, policy, position):
+        """
+        :param policy: The policy dictionary as returned by Policy.get()
+        :param position: The position of the policy in the policy list
+        """
+        self.policy = policy
+        self.position = position
+        self.name = policy.get("name")
+        self.scope = policy.get("scope")
+        self.active = policy.get("active")
+        self.time = policy.get("time")
+        self.time_bitset = None
+        if self.time:
+            self.time_bitset = parse_time_range(self.time)
+        self.check_all_resolvers = policy.get("check_all_resolvers")
+        self.matchers = {}
+        for key in ["action", "user", "realm", "adminrealm", "resolver"]:
+            self.matchers[key] = PolicyValueMatcher(policy.get(key))
+        self.client_networks = []
+        self.client_excludes = []
+        for polclient in policy.get("client") or []:
+            try:
+                if polclient[0] in ['-', '!']:
+                    self.client_excludes.append(IPNetwork(polclient[1:]))
+                else:
+                    self.client_networks.append(IPNetwork(polclient))
+            except Exception as exx:
+                log.warning("Invalid client {0!r} in policy {1!s}: "
+                            "{2!s}".format(polclient, self.name, exx))
+        self.has_client = bool(policy.get("client"))
+
+
+class PolicyIndex(object):
+    """
+    The index of the compiled policies. The policies are grouped by scope
+    and within a scope by the action names, so that get_policies only needs
+    to look at policies, that can match the requested scope and action.
+    """
+
+    def __init__(self, policies):
+        """
+        :param policies: list of policy dictionaries
+        """
+        self.policies = [CompiledPolicy(policy, position)
+                         for position, policy in enumerate(policies)]
+        # The client networks of all policies. The value is a tuple of the
+        # position of the policy and whether the network is excluded.
+        self.client_tree = IPPrefixTree()
+        self.by_scope = {}
+        # scope -> action -> policies, that contain this very action name
+        self.by_action = {}
+        # scope -> policies, that need to be checked for each action
+        self.any_action = {}
+        for cpol in self.policies:
+            self.by_scope.setdefault(cpol.scope, []).append(cpol)
+            for network in cpol.client_networks:
+                self.client_tree.insert(network, (cpol.position, False))
+            for network in cpol.client_excludes:
+                self.client_tree.insert(network, (cpol.position, True))
+            matcher = cpol.matchers["action"]
+            if matcher.empty or \
+                    not all([self._is_literal(a) for a in matcher.values]):
+                # action names with wildcards or regular expressions
+                self.any_action.setdefault(cpol.scope, []).append(cpol)
+            else:
+                actions = self.by_action.setdefault(cpol.scope, {})
+                for action_name in matcher.literals:
+                    actions.setdefault(action_name, []).append(cpol)
+
+    @staticmethod
+    def _is_literal(value):
+        """
+        An action name, that only consists of letters, digits and "_" can
+        only match exactly.
+        """
+        return value.replace("_", "").isalnum()
+
+    def match_client(self, client):
+        """
+        Return the positions of the policies, whose client definition
+        contains the client IP and does not exclude it.
+
+        :param client: The IP address of the client
+        :return: set of the positions of the policies
+        """
+        included = set()
+        excluded = set()
+        for position, exclude in self.client_tree.lookup(client):
+            if exclude:
+                excluded.add(position)
+            else:
+                included.add(position)
+        if excluded:
+            log.debug("the client {0!s} is excluded in the policies "
+                      "{1!s}".format(client, [self.policies[pos].name
+                                              for pos in excluded]))
+        return included - excluded
+
+    def candidates(self, scope=None, action=None):
+        """
+        Return the compiled policies, that can match the given scope and
+        action in the original order of the policies.
+
+        :param scope: The scope or None
+        :param action: The action or None
+        :return: list of CompiledPolicy
+        """
+        if scope is None:
+            return self.policies
+        if action is None or type(action) == list:
+            return self.by_scope.get(scope, [])
+        candidates = self.by_action.get(scope, {}).get(action, []) + \
+            self.any_action.get(scope, [])
+        candidates.sort(key=lambda cpol: cpol.position)
+        return candidates
+
+
 class PolicyClass(object):
 
     """
@@ -362,6 +541,7 @@ class PolicyClass(object):
 
         """
         self.policies = []
+        self.index = PolicyIndex([])
         self.timestamp = None
         # read the policies from the database and store it in the object
         self.reload_from_db()
@@ -377,11 +557,10 @@ class PolicyClass(object):
                     "PI_CHECK_RELOAD_CONFIG", 0)) < datetime.datetime.now():
             db_ts = Config.query.filter_by(Key=PRIVACYIDEA_TIMESTAMP).first()
             if reload_db(self.timestamp, db_ts):
-                self.policies = []
-                policies = Policy.query.all()
-                for pol in policies:
-                    # read each policy
-                    self.policies.append(pol.get())
+                # read each policy and set the complete list at once
+                policies = [pol.get() for pol in Policy.query.all()]
+                self.index = PolicyIndex(policies)
+                self.policies = policies
             self.timestamp = datetime.datetime.now()
 
     @classmethod
@@ -428,6 +607,9 @@ class PolicyClass(object):
         """
         Return the policies of the given filter values
 
+        The result is cached for the duration of the request. The cache is
+        dropped, if the policies are read again from the database.
+
         :param name: The name of the policy
         :param scope: The scope of the policy
         :param realm: The realm in the policy
@@ -448,27 +630,69 @@ class PolicyClass(object):
         :return: list of policies
         :rtype: list of dicts
         """
-        reduced_policies = self.policies
+        if not all_times:
+            # The time ranges of the policies have a resolution of minutes.
+            time = (time or get_policy_time()).replace(second=0,
+                                                       microsecond=0)
+        key = ("get_policies", name, scope, _freeze(realm), active,
+               _freeze(resolver), _freeze(user), client, _freeze(action),
+               adminrealm, time, all_times)
+        cache = self._get_request_cache()
+        if key in cache:
+            _count_policy_cache("hits")
+        else:
+            _count_policy_cache("misses")
+            cache[key] = self._search_policies(
+                name=name, scope=scope, realm=realm, active=active,
+                resolver=resolver, user=user, client=client, action=action,
+                adminrealm=adminrealm, time=time, all_times=all_times)
+        return list(cache[key])
+
+    def _get_request_cache(self):
+        """
+        Return the request cache for the current policy index. If the
+        policies were read again, the old entries are dropped.
+
+        :return: dict
+        """
+        cache = get_request_cache("policies")
+        if cache.get("index") is not self.index:
+            cache.clear()
+            cache["index"] = self.index
+        return cache
+
+    def _search_policies(self, name=None, scope=None, realm=None,
+                         active=None, resolver=None, user=None, client=None,
+                         action=None, adminrealm=None, time=None,
+                         all_times=False):
+        """
+        Search the policies in the policy index. The parameters are the same
+        as in get_policies.
+
+        :return: list of policies
+        :rtype: list of dicts
+        """
+        index = self.index
+        reduced_policies = index.candidates(scope=scope, action=action)
 
         # filter policy for time. If no time is set or is a time is set and
         # it matches the time_range, then we add this policy
         if not all_times:
-            reduced_policies = [policy for policy in reduced_policies if
-                                (policy.get("time") and
-                                 check_time_in_range(policy.get("time"), time))
-                                or not policy.get("time")]
+            reduced_policies = [cpol for cpol in reduced_policies if
+                                not cpol.time or
+                                check_time_in_bitset(cpol.time_bitset, time)]
         log.debug("Policies after matching time: {0!s}".format(
-            reduced_policies))
+            [cpol.name for cpol in reduced_policies]))
 
         # Do exact matches for "name", "active" and "scope", as these fields
         # can only contain one entry
         p = [("name", name), ("active", active), ("scope", scope)]
         for searchkey, searchvalue in p:
             if searchvalue is not None:
-                reduced_policies = [policy for policy in reduced_policies if
-                                    policy.get(searchkey) == searchvalue]
+                reduced_policies = [cpol for cpol in reduced_policies if
+                                    getattr(cpol, searchkey) == searchvalue]
                 log.debug("Policies after matching {1!s}: {0!s}".format(
-                    reduced_policies, searchkey))
+                    [cpol.name for cpol in reduced_policies], searchkey))
 
         p = [("action", action), ("user", user), ("realm", realm)]
         # If this is an admin-policy, we also do check the adminrealm
@@ -480,19 +704,20 @@ class PolicyClass(object):
                 # first we find policies, that really match!
                 # Either with the real value or with a "*"
                 # values can be excluded by a leading "!" or "-"
-                for policy in reduced_policies:
-                    if not policy.get(searchkey):
+                for cpol in reduced_policies:
+                    matcher = cpol.matchers[searchkey]
+                    if matcher.empty:
                         # We also find the policies with no distinct information
                         # about the request value
-                        new_policies.append(policy)
+                        new_policies.append(cpol)
                     else:
-                        value_found, value_excluded = self._search_value(
-                            policy.get(searchkey), searchvalue)
+                        value_found, value_excluded = matcher.search(
+                            searchvalue)
                         if value_found and not value_excluded:
-                            new_policies.append(policy)
+                            new_policies.append(cpol)
                 reduced_policies = new_policies
                 log.debug("Policies after matching {1!s}: {0!s}".format(
-                    reduced_policies, searchkey))
+                    [cpol.name for cpol in reduced_policies], searchkey))
 
         # We need to act individually on the resolver key word
         # We either match the resolver exactly or we match another resolver (
@@ -501,8 +726,9 @@ class PolicyClass(object):
         if resolver is not None:
             new_policies = []
             user_resolvers = []
-            for policy in reduced_policies:
-                if policy.get("check_all_resolvers"):
+            for cpol in reduced_policies:
+                matcher = cpol.matchers["resolver"]
+                if cpol.check_all_resolvers:
                     if realm and user:
                         # We have a realm and a user and can get all resolvers
                         # of this user in the realm
@@ -510,24 +736,22 @@ class PolicyClass(object):
                             user_resolvers = User(user,
                                                   realm=realm).get_ordererd_resolvers()
                         for reso in user_resolvers:
-                            value_found, _v_ex = self._search_value(
-                                policy.get("resolver"), reso)
+                            value_found, _v_ex = matcher.search(reso)
                             if value_found:
-                                new_policies.append(policy)
+                                new_policies.append(cpol)
                                 break
-                elif not policy.get("resolver"):
+                elif matcher.empty:
                     # We also find the policies with no distinct information
                     # about the request value
-                    new_policies.append(policy)
+                    new_policies.append(cpol)
                 else:
-                    value_found, _v_ex = self._search_value(
-                        policy.get("resolver"), resolver)
+                    value_found, _v_ex = matcher.search(resolver)
                     if value_found:
-                        new_policies.append(policy)
+                        new_policies.append(cpol)
 
             reduced_policies = new_policies
             log.debug("Policies after matching resolver: {0!s}".format(
-                reduced_policies))
+                [cpol.name for cpol in reduced_policies]))
 
         # Match the client IP.
         # Client IPs may be direct match, may be located in subnets or may
@@ -540,33 +764,21 @@ class PolicyClass(object):
         # An empty client definition in the policy matches all clients.
         if client is not None:
             new_policies = []
-            for policy in reduced_policies:
-                client_found = False
-                client_excluded = False
-                for polclient in policy.get("client"):
-                    if polclient[0] in ['-', '!']:
-                        # exclude the client?
-                        if IPAddress(client) in IPNetwork(polclient[1:]):
-                            log.debug("the client %s is excluded by %s in "
-                                      "policy %s" % (client, polclient, policy))
-                            client_excluded = True
-                    elif IPAddress(client) in IPNetwork(polclient):
-                        client_found = True
-                if client_found and not client_excluded:
-                    # The client was contained in the defined subnets and was
-                    #  not excluded
-                    new_policies.append(policy)
-
+            client_policies = [cpol for cpol in reduced_policies
+                               if cpol.has_client]
+            if client_policies:
+                matching = index.match_client(client)
+                new_policies = [cpol for cpol in client_policies
+                                if cpol.position in matching]
             # If there is a policy without any client, we also add it to the
             # accepted list.
-            for policy in reduced_policies:
-                if not policy.get("client"):
-                    new_policies.append(policy)
+            new_policies.extend([cpol for cpol in reduced_policies
+                                 if not cpol.has_client])
             reduced_policies = new_policies
-            log.debug("Policies after matching client".format(
-                reduced_policies))
+            log.debug("Policies after matching client: {0!s}".format(
+                [cpol.name for cpol in reduced_policies]))
 
-        return reduced_policies
+        return [cpol.policy for cpol in reduced_policies]
 
     @log_with(log)
     def get_action_values(self, action, scope=SCOPE.AUTHZ, realm=None,
@@ -592,6 +804,39 @@ class PolicyClass(object):
         :return: A list of the allowed tokentypes
         :rtype: list
         """
+        key = ("get_action_values", action, scope, _freeze(realm),
+               _freeze(resolver), _freeze(user), client,
+               allow_white_space_in_action, adminrealm,
+               get_policy_time().replace(second=0, microsecond=0))
+        cache = self._get_request_cache()
+        if key in cache:
+            _count_policy_cache("hits")
+            action_values = list(cache[key])
+        else:
+            _count_policy_cache("misses")
+            action_values = self._search_action_values(
+                action, scope=scope, realm=realm, resolver=resolver,
+                user=user, client=client,
+                allow_white_space_in_action=allow_white_space_in_action,
+                adminrealm=adminrealm)
+            cache[key] = list(action_values)
+        if unique:
+            if len(action_values) > 1:
+                raise PolicyError("There are conflicting %s"
+                                  " definitions!" % action)
+        return action_values
+
+    def _search_action_values(self, action, scope=SCOPE.AUTHZ, realm=None,
+                              resolver=None, user=None, client=None,
+                              allow_white_space_in_action=False,
+                              adminrealm=None):
+        """
+        Collect the action values of the matching policies. The parameters
+        are the same as in get_action_values.
+
+        :return: A list of the action values
+        :rtype: list
+        """
         action_values = []
         policies = self.get_policies(scope=scope, adminrealm=adminrealm,
                                      action=action, active=True,
@@ -615,12 +860,7 @@ class PolicyClass(object):
                 action_values.extend(action_dict.get(action, "").split())
 
         # reduce the entries to unique entries
-        action_values = list(set(action_values))
-        if unique:
-            if len(action_values) > 1:
-                raise PolicyError("There are conflicting %s"
-                                  " definitions!" % action)
-        return action_values
+        return list(set(action_values))
 
     @log_with(log)
     def ui_get_main_menus(self, logged_in_user, client=None):
@@ -765,6 +1005,56 @@ class PolicyClass(object):
 
         return enroll_types
 
+
+def _freeze(value):
+    """
+    Return a hashable representation of a filter value, that can be used in
+    the key of the request cache. Lists are converted to tuples.
+    """
+    if type(value) == list:
+        value = tuple(value)
+    return value
+
+
+def get_policy_time():
+    """
+    Return the time, for which the policies are evaluated. During a request
+    all policies are evaluated for the same time, which is the time of the
+    first policy evaluation in this request.
+
+    :return: datetime
+    """
+    if has_request_context():
+        if getattr(request, "policy_time", None) is None:
+            request.policy_time = datetime.datetime.now()
+        return request.policy_time
+    return datetime.datetime.now()
+
+
+def _count_policy_cache(counter):
+    with POLICY_CACHE_STATISTICS_LOCK:
+        POLICY_CACHE_STATISTICS[counter] += 1
+
+
+def get_policy_cache_statistics():
+    """
+    Return the number of hits and misses of the request cache of
+    get_policies and get_action_values in this process.
+
+    :return: dict with the keys "hits" and "misses"
+    """
+    with POLICY_CACHE_STATISTICS_LOCK:
+        return dict(POLICY_CACHE_STATISTICS)
+
+
+def get_policy_object():
+    """
+    Return the PolicyClass object, that is pinned to the current request.
+
+    :return: PolicyClass object
+    """
+    return get_request_object("policy_object", PolicyClass)
+
 # --------------------------------------------------------------------------
 #
 #  NEW STUFF
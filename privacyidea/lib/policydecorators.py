@@ -37,16 +37,21 @@ policy decorators for the API (pre/post) are defined in api/lib/policy
 The functions of this module are tested in tests/test_lib_policy_decorator.py
 """
 import logging
-from privacyidea.lib.error import PolicyError, privacyIDEAError
+from privacyidea.lib.error import PolicyError, privacyIDEAError, UserError
 import functools
 from privacyidea.lib.policy import ACTION, SCOPE, ACTIONVALUE, LOGINMODE
 from privacyidea.lib.user import User
 from privacyidea.lib.utils import parse_timelimit, parse_timedelta
 import datetime
 from privacyidea.lib.radiusserver import get_radius
+from privacyidea.lib.config import get_request_cache
 
 log = logging.getLogger(__name__)
 
+# The name of the request cache, that holds the user information shared
+# by the decorators
+LIBPOLICY_CACHE = "libpolicy"
+
 
 class libpolicy(object):
     """
@@ -79,11 +84,99 @@ class libpolicy(object):
         """
         @functools.wraps(wrapped_function)
         def policy_wrapper(*args, **kwds):
-            return self.decorator_function(wrapped_function, *args, **kwds)
+            # The user information is shared between the stacked decorators
+            # and the decorated function. It is dropped, when the outermost
+            # decorator returns.
+            cache = get_request_cache(LIBPOLICY_CACHE)
+            outermost = not cache.get("depth")
+            if outermost:
+                cache.clear()
+            cache["depth"] = cache.get("depth", 0) + 1
+            try:
+                return self.decorator_function(wrapped_function, *args,
+                                               **kwds)
+            finally:
+                cache["depth"] -= 1
+                if outermost:
+                    cache.clear()
 
         return policy_wrapper
 
 
+def _get_user_cache(user_object):
+    """
+    Return the dictionary with the shared information of the given user or
+    None, if we are not called within a libpolicy decorator.
+    """
+    cache = get_request_cache(LIBPOLICY_CACHE)
+    if not cache.get("depth"):
+        return None
+    key = (user_object.login, user_object.realm, user_object.resolver)
+    return cache.setdefault(key, {})
+
+
+def get_user_identifiers(user_object):
+    """
+    Return the user identifiers (uid, resolvertype, resolvername) of the
+    user. Within the libpolicy decorators the resolver is only asked once.
+    A UserError is raised, if the user can not be found.
+
+    :param user_object: The user
+    :type user_object: User object
+    :return: tuple of uid, resolvertype and resolvername
+    """
+    user_cache = _get_user_cache(user_object)
+    if user_cache is None:
+        return user_object.get_user_identifiers()
+    if "identifiers" not in user_cache:
+        user_cache["identifiers"] = user_object.get_user_identifiers()
+    return user_cache["identifiers"]
+
+
+def user_exists(user_object):
+    """
+    Check if the user exists in the user store. Like User.exist, but the
+    user identifiers are shared within the libpolicy decorators.
+
+    :param user_object: The user
+    :type user_object: User object
+    :return: True or False
+    """
+    try:
+        uid, _rtype, _resolver = get_user_identifiers(user_object)
+    except UserError:
+        log.debug("User {0!s} does not exist.".format(user_object))
+        return False
+    # The SQL resolver does not raise an exception but returns an empty UID.
+    return bool(uid)
+
+
+def get_user_tokens(user_object):
+    """
+    Return the token objects of the user. Within the libpolicy decorators
+    the tokens are only read once from the database.
+
+    :param user_object: The user
+    :type user_object: User object
+    :return: list of token objects
+    """
+    from privacyidea.lib.token import get_tokens, get_tokens_of_user_id
+    user_cache = _get_user_cache(user_object)
+    if user_cache is not None and "tokens" in user_cache:
+        return user_cache["tokens"]
+    uid = None
+    if not user_object.is_empty():
+        (uid, _rtype, resolver) = get_user_identifiers(user_object)
+    if uid:
+        tokens = get_tokens_of_user_id(resolver, u"{0!s}".format(uid),
+                                       realm=user_object.realm, eager=True)
+    else:
+        tokens = get_tokens(user=user_object, eager=True)
+    if user_cache is not None:
+        user_cache["tokens"] = tokens
+    return tokens
+
+
 def challenge_response_allowed(func):
     """
     This decorator is used to wrap tokenclass.is_challenge_request.
@@ -153,7 +246,6 @@ def auth_user_has_no_token(wrapped_function, user_object, passw,
     :param options: Dict containing values for "g" and "clientip"
     :return: Tuple of True/False and reply-dictionary
     """
-    from privacyidea.lib.token import get_tokens
     options = options or {}
     g = options.get("g")
     if g:
@@ -166,7 +258,7 @@ def auth_user_has_no_token(wrapped_function, user_object, passw,
                                                    client=clientip, active=True)
         if pass_no_token:
             # Now we need to check, if the user really has no token.
-            tokencount = get_tokens(user=user_object, count=True)
+            tokencount = len(get_user_tokens(user_object))
             if tokencount == 0:
                 return True, {"message": "The user has no token, but is "
                                          "accepted due to policy '%s'." %
@@ -204,7 +296,7 @@ def auth_user_does_not_exist(wrapped_function, user_object, passw,
                                                   active=True)
         if pass_no_user:
             # Check if user object exists
-            if not user_object.exist():
+            if not user_exists(user_object):
                 return True, {"message": "The user does not exist, but is "
                                          "accepted due to policy '%s'." %
                                          pass_no_user[0].get("name")}
@@ -228,8 +320,6 @@ def auth_user_passthru(wrapped_function, user_object, passw, options=None):
     :param options: Dict containing values for "g" and "clientip"
     :return: Tuple of True/False and reply-dictionary
     """
-
-    from privacyidea.lib.token import get_tokens
     options = options or {}
     g = options.get("g")
     if g:
@@ -242,7 +332,7 @@ def auth_user_passthru(wrapped_function, user_object, passw, options=None):
                                                client=clientip, active=True)
         if len(pass_thru) > 1:
             raise PolicyError("Contradicting passthru policies.")
-        if pass_thru and get_tokens(user=user_object, count=True) == 0:
+        if pass_thru and not get_user_tokens(user_object):
             # If the user has NO Token, authenticate against the user store
             # Now we need to check the userstore password
             pass_thru_action = pass_thru[0].get("action").get("passthru")
@@ -40,8 +40,7 @@ from ..models import (Realm,
                       ResolverRealm,
                       Resolver, db, save_config_timestamp)
 from log import log_with
-from flask import g
-from privacyidea.lib.config import ConfigClass
+from privacyidea.lib.config import get_config_object
 import logging
 from privacyidea.lib.utils import sanity_name_check
 log = logging.getLogger(__name__)
@@ -60,8 +59,7 @@ def get_realms(realmname=""):
     :return: a dict with realm description like
     :rtype: dict
     '''
-    g.config_object = ConfigClass()
-    realms = g.config_object.realm
+    realms = get_config_object().realm
     if realmname:
         if realmname in realms:
             realms = {realmname: realms.get(realmname)}
@@ -136,8 +134,7 @@ def get_default_realm():
     @return: the realm name
     @rtype : string
     """
-    g.config_object = ConfigClass()
-    return g.config_object.default_realm
+    return get_config_object().default_realm
 
 
 @log_with(log)
@@ -43,6 +43,8 @@ webservice!
 """
 
 import logging
+import hashlib
+import threading
 from log import log_with
 from config import (get_resolver_types,
                      get_resolver_class_dict)
@@ -54,13 +56,18 @@ from .error import ConfigAdminError
 from sqlalchemy import func
 from .crypto import encryptPassword, decryptPassword
 from privacyidea.lib.utils import sanity_name_check
-from flask import g
-from privacyidea.lib.config import ConfigClass
+from privacyidea.lib.config import get_config_object
 from privacyidea.lib.utils import is_true
 #from privacyidea.lib.cache import cache
 
 log = logging.getLogger(__name__)
 
+# The resolver objects are created once per process and configuration.
+# The cache is keyed by the resolver name and the hash of the configuration.
+# The values are tuples of the config timestamp and the resolver object.
+RESOLVER_OBJECT_CACHE = {}
+RESOLVER_OBJECT_CACHE_LOCK = threading.Lock()
+
 
 # Hide the keyswords BINDPW and Password in params
 @log_with(log, hide_args_keywords={0: ["BINDPW", "Password"]})
@@ -180,8 +187,7 @@ def get_resolver_list(filter_resolver_type=None,
     :rtype: Dictionary of the resolvers and their configuration
     """
     # We need to check if we need to update the config object
-    g.config_object = ConfigClass()
-    resolvers = g.config_object.resolver
+    resolvers = get_config_object().resolver
     if filter_resolver_type:
         reduced_resolvers = {}
         for reso_name, reso in resolvers.iteritems():
@@ -235,6 +241,7 @@ def delete_resolver(resolvername):
                                    "realm %r." % (resolvername, realmname))
         reso.delete()
         ret = reso.id
+        clear_resolver_object_cache(resolvername)
     return ret
 
 
@@ -312,34 +319,103 @@ def get_resolver_type(resolvername):
     return r_type
 
 
+def _get_config_hash(resolvertype, resolver_config):
+    """
+    Return a hash over the type and the complete configuration of a resolver.
+
+    :param resolvertype: The type of the resolver like "passwdresolver"
+    :param resolver_config: The configuration dictionary of the resolver
+    :return: hex digest
+    """
+    items = sorted(resolver_config.items())
+    return hashlib.sha256(repr((resolvertype, items))).hexdigest()
+
+
 @log_with(log)
-#@cache.memoize(10)
 def get_resolver_object(resolvername):
     """
-    TODO: We can cache this
     create a resolver object from a resolvername
 
+    The resolver objects are cached per process and are shared between the
+    requests and threads. An object is reused as long as the configuration
+    of the resolver is unchanged and the config timestamp in the database
+    has not changed since the object was created. Resolvers, which are not
+    cacheable, are created for each call.
+
     :param resolvername: the resolver string as from the token including
                          the config as last part
     :return: instance of the resolver with the loaded config
 
     """
     r_obj = None
-    r_type = get_resolver_type(resolvername)
+    config_object = get_config_object()
+    resolver = config_object.resolver.get(resolvername, {})
+    r_type = resolver.get("type")
     r_obj_class = get_resolver_class(r_type)
 
     if r_obj_class is None:
         log.error("Can not find resolver with name {0!s} ".format(resolvername))
-    else:
-        # create the resolver instance and load the config
+    elif not r_obj_class.cacheable:
         r_obj = r_obj_class()
-        if r_obj is not None:
-            resolver_config = get_resolver_config(resolvername)
+        r_obj.loadConfig(resolver.get("data", {}))
+    else:
+        resolver_config = resolver.get("data", {})
+        timestamp = config_object.config_timestamp
+        cache_key = (resolvername,
+                     _get_config_hash(r_type, resolver_config))
+        entry = RESOLVER_OBJECT_CACHE.get(cache_key)
+        if entry is not None and entry[0] == timestamp:
+            r_obj = entry[1]
+        else:
+            # create the resolver instance and load the config
+            r_obj = r_obj_class()
             r_obj.loadConfig(resolver_config)
+            evicted = []
+            with RESOLVER_OBJECT_CACHE_LOCK:
+                entry = RESOLVER_OBJECT_CACHE.get(cache_key)
+                if entry is not None and entry[0] == timestamp:
+                    # Another thread was faster, we use its object
+                    evicted.append(r_obj)
+                    r_obj = entry[1]
+                else:
+                    # Remove the objects of the old configurations
+                    for k in [k for k in RESOLVER_OBJECT_CACHE
+                              if k[0] == resolvername]:
+                        evicted.append(RESOLVER_OBJECT_CACHE.pop(k)[1])
+                    RESOLVER_OBJECT_CACHE[cache_key] = (timestamp, r_obj)
+            _dispose_resolver_objects(evicted)
 
     return r_obj
 
 
+def _dispose_resolver_objects(r_objs):
+    """
+    Release the connection pools of the resolver objects, which were removed
+    from the cache.
+    """
+    for r_obj in r_objs:
+        try:
+            r_obj.dispose()
+        except Exception as exx:  # pragma: no cover
+            log.warning("Could not dispose the resolver object: "
+                        "{0!r}".format(exx))
+
+
+def clear_resolver_object_cache(resolvername=None):
+    """
+    Remove the cached resolver objects of the given resolver or of all
+    resolvers.
+
+    :param resolvername: The name of the resolver
+    """
+    evicted = []
+    with RESOLVER_OBJECT_CACHE_LOCK:
+        for k in [k for k in RESOLVER_OBJECT_CACHE
+                  if resolvername is None or k[0] == resolvername]:
+            evicted.append(RESOLVER_OBJECT_CACHE.pop(k)[1])
+    _dispose_resolver_objects(evicted)
+
+
 @log_with(log)
 def pretestresolver(resolvertype, params):
     """
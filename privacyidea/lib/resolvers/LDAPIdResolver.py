@@ -52,6 +52,8 @@ The file is tested in tests/test_lib_resolver.py
 import logging
 import yaml
 import functools
+import threading
+import time
 
 from UserIdResolver import UserIdResolver
 
@@ -72,9 +74,10 @@ from privacyidea.lib import _
 from privacyidea.lib.utils import to_utf8
 from privacyidea.lib.error import privacyIDEAError
 import uuid
-from ldap3.utils.conv import escape_bytes
-
-CACHE = {}
+from ldap3.utils.conv import escape_bytes, escape_filter_chars
+from ldap3.core.exceptions import LDAPCommunicationError
+from privacyidea.lib.cache.lrucache import (LRUCache, RedisBackend,
+                                             NOT_FOUND, DEFAULT_CACHE_SIZE)
 
 log = logging.getLogger(__name__)
 ENCODING = "utf-8"
@@ -88,6 +91,16 @@ MS_AD_MULTIPLYER = 10 ** 7
 MS_AD_START = datetime.datetime(1601, 1, 1)
 
 DEFAULT_CA_FILE = "/etc/privacyidea/ldap-ca.crt"
+# The number of idle service connections, that are kept per resolver
+DEFAULT_POOL_SIZE = 10
+# The number of idle connections for the password checks
+DEFAULT_USER_POOL_SIZE = 2
+# The number of seconds, after which a connection is closed and replaced
+DEFAULT_POOL_MAX_AGE = 300
+# The maximum number of users, that are looked up in one search
+BATCH_SIZE = 100
+# The maximum number of seconds, that unknown users are cached
+DEFAULT_NEGATIVE_CACHE_TIMEOUT = 30
 
 
 def get_ad_timestamp_now():
@@ -114,42 +127,208 @@ def trim_objectGUID(userId):
 
 def cache(func):
     """
-    Decorator to check if a token is locked or not.
-    The decorator is to be used in token class methods.
-    It can be used to avoid performing an action on a locked token.
+    Decorator to cache the results of the LDAP lookups in the LRU cache of
+    the resolver. The cache key is the name of the method and the first
+    argument.
 
-    If the token is locked, a TokenAdminError is raised.
+    Empty results are cached as negative entries with the timeout
+    self.negative_cache_timeout, so that lookups of unknown users do not
+    query the LDAP server each time.
     """
     @functools.wraps(func)
     def cache_wrapper(self, *args, **kwds):
-        # If it does not exist, create the node for this instance
-        resolver_id = self.getResolverId()
-        if not resolver_id in CACHE:
-            CACHE[resolver_id] = {"getUserId": {},
-                                  "getUserInfo": {},
-                                  "_getDN": {}}
-
-        # get the portion of the cache for this very LDAP resolver
-        r_cache = CACHE.get(resolver_id).get(func.func_name)
-        if args[0] in r_cache and \
-                        datetime.datetime.now() < r_cache[args[0]][
-                    "timestamp"] + \
-                        datetime.timedelta(seconds=self.cache_timeout):
+        cache_key = (func.func_name, args[0])
+        value = self.cache.get(cache_key)
+        if value is not NOT_FOUND:
             log.debug("Reading {0!s} from cache for {1!s}".format(args[0],
                                                               func.func_name))
-            return r_cache[args[0]]["value"]
+            return value
 
         f_result = func(self, *args, **kwds)
         # now we cache the result
-        CACHE[resolver_id][func.func_name][args[0]] = {
-            "value": f_result,
-            "timestamp": datetime.datetime.now()}
+        if f_result:
+            timeout = self.cache_timeout
+        else:
+            timeout = self.negative_cache_timeout
+        if timeout > 0:
+            self.cache.set(cache_key, f_result, timeout)
 
         return f_result
 
     return cache_wrapper
 
 
+def pooled(retry=True):
+    """
+    Decorator for the resolver methods, that use the LDAP connection self.l.
+    The connection is taken from the connection pool of the resolver by
+    self._bind() and is returned to the pool, when the method is finished.
+    Nested calls of decorated methods use the same connection.
+
+    If the connection fails with a communication error, it is removed from
+    the pool. In case of retry=True the method is called again with a new
+    connection. This is the case, if the server has closed an idle connection.
+
+    :param retry: Whether the method can be called a second time
+    """
+    def pooled_decorator(func):
+        @functools.wraps(func)
+        def pooled_wrapper(self, *args, **kwds):
+            if getattr(self._local, "pooled", False):
+                # The connection is already held by an outer method
+                return func(self, *args, **kwds)
+            attempts = 2 if retry else 1
+            self._local.pooled = True
+            try:
+                while True:
+                    attempts -= 1
+                    try:
+                        return func(self, *args, **kwds)
+                    except LDAPCommunicationError as exx:
+                        if self.l is not None:
+                            self.pool.release(self.l, broken=True)
+                            self.l = None
+                        if not attempts:
+                            raise
+                        log.info("LDAP connection failed: {0!r}. "
+                                 "Retrying with a new connection.".format(exx))
+            finally:
+                if self.l is not None:
+                    self.pool.release(self.l)
+                    self.l = None
+                self._local.pooled = False
+
+        return pooled_wrapper
+    return pooled_decorator
+
+
+class ConnectionPool(object):
+    """
+    A pool of LDAP connections, that is shared between the requests and the
+    threads of a process.
+
+    Idle connections are checked before they are handed out again. A
+    connection is closed, if it is closed by the server, if it is not bound
+    anymore or if it is older than max_age seconds. If all connections are in
+    use, a new connection is created. At most size connections are kept in
+    the pool, when they are returned.
+    """
+
+    def __init__(self, create_connection, size=DEFAULT_POOL_SIZE,
+                 max_age=DEFAULT_POOL_MAX_AGE, check_bound=True):
+        """
+        :param create_connection: function that returns a new connection
+        :param size: The maximum number of idle connections
+        :param max_age: The maximum age of a connection in seconds
+        :param check_bound: Whether a connection, that is not bound, is
+            closed. The connections of the password checks are rebound and
+            are kept, if the password was wrong.
+        """
+        self.create_connection = create_connection
+        self.size = size
+        self.max_age = max_age
+        self.check_bound = check_bound
+        self._lock = threading.Lock()
+        # list of idle connections
+        self._idle = []
+        # the creation time of the open connections by id
+        self._created = {}
+        self.counters = {"created": 0,
+                         "reused": 0,
+                         "closed": 0,
+                         "failed": 0}
+
+    def _usable(self, connection):
+        if getattr(connection, "closed", False):
+            return False
+        if self.check_bound and not getattr(connection, "bound", True):
+            return False
+        age = time.time() - self._created.get(id(connection), 0)
+        return age < self.max_age
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.unbind()
+        except Exception as exx:  # pragma: no cover
+            log.debug("Could not close the LDAP connection: {0!r}".format(exx))
+
+    def acquire(self):
+        """
+        Return an idle connection or a new connection.
+        """
+        stale = []
+        connection = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.pop()
+                if self._usable(candidate):
+                    connection = candidate
+                    self.counters["reused"] += 1
+                    break
+                self._created.pop(id(candidate), None)
+                self.counters["closed"] += 1
+                stale.append(candidate)
+        for candidate in stale:
+            self._close(candidate)
+        if connection is None:
+            try:
+                connection = self.create_connection()
+            except Exception:
+                with self._lock:
+                    self.counters["failed"] += 1
+                raise
+            with self._lock:
+                self._created[id(connection)] = time.time()
+                self.counters["created"] += 1
+        return connection
+
+    def release(self, connection, broken=False):
+        """
+        Return a connection to the pool.
+
+        :param connection: The connection from acquire
+        :param broken: If the connection failed, it is closed.
+        """
+        with self._lock:
+            keep = not broken and len(self._idle) < self.size and \
+                   self._usable(connection)
+            if keep:
+                self._idle.append(connection)
+            else:
+                self._created.pop(id(connection), None)
+                self.counters["closed"] += 1
+                if broken:
+                    self.counters["failed"] += 1
+        if not keep:
+            self._close(connection)
+
+    def clear(self):
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+            for connection in idle:
+                self._created.pop(id(connection), None)
+                self.counters["closed"] += 1
+        for connection in idle:
+            self._close(connection)
+
+    def get_metrics(self):
+        """
+        :return: dict with the counters and the number of idle and open
+            connections
+        """
+        with self._lock:
+            metrics = dict(self.counters)
+            metrics["idle"] = len(self._idle)
+            metrics["open"] = len(self._created)
+            metrics["in_use"] = len(self._created) - len(self._idle)
+        return metrics
+
+
 class AUTHTYPE(object):
     SIMPLE = "Simple"
     SASL_DIGEST_MD5 = "SASL Digest-MD5"
@@ -162,7 +341,14 @@ class IdResolver (UserIdResolver):
     updateable = True
 
     def __init__(self):
-        self.i_am_bound = False
+        # The resolver object is shared between threads. Each thread takes
+        # its own connection from the pool.
+        self._local = threading.local()
+        self.pool = None
+        self.user_pool = None
+        self.pool_size = DEFAULT_POOL_SIZE
+        self.user_pool_size = DEFAULT_USER_POOL_SIZE
+        self.pool_max_age = DEFAULT_POOL_MAX_AGE
         self.uri = ""
         self.basedn = ""
         self.binddn = ""
@@ -180,9 +366,45 @@ class IdResolver (UserIdResolver):
         self.resolverId = self.uri
         self.scope = ldap3.SUBTREE
         self.cache_timeout = 120
+        self.negative_cache_timeout = DEFAULT_NEGATIVE_CACHE_TIMEOUT
+        self.cache = LRUCache()
         self.tls_context = None
         self.start_tls = False
 
+    @property
+    def l(self):
+        """
+        The LDAP connection of the current thread, that is taken from the
+        pool by self._bind()
+        """
+        return getattr(self._local, "connection", None)
+
+    @l.setter
+    def l(self, connection):
+        self._local.connection = connection
+
+    def get_metrics(self):
+        """
+        Return the counters of the connection pools.
+
+        :return: dict
+        """
+        metrics = {}
+        if self.pool:
+            metrics["pool"] = self.pool.get_metrics()
+        if self.user_pool:
+            metrics["user_pool"] = self.user_pool.get_metrics()
+        metrics["cache"] = self.cache.get_metrics()
+        return metrics
+
+    def dispose(self):
+        """
+        Close the idle connections of the connection pools.
+        """
+        for pool in [self.pool, self.user_pool]:
+            if pool:
+                pool.clear()
+
     def checkPass(self, uid, password):
         """
         This function checks the password for a given uid.
@@ -203,10 +425,6 @@ class IdResolver (UserIdResolver):
         else:
             bind_user = self._getDN(uid)
 
-        server_pool = self.get_serverpool(self.uri, self.timeout,
-                                          get_info=ldap3.NONE,
-                                          tls_context=self.tls_context)
-
         try:
             log.debug("Authtype: {0!r}".format(self.authtype))
             log.debug("user    : {0!r}".format(bind_user))
@@ -214,21 +432,47 @@ class IdResolver (UserIdResolver):
             # since we must avoid anonymous binds!
             if not bind_user or len(bind_user) < 1:
                 raise Exception("No valid user. Empty bind_user.")
-            l = self.create_connection(authtype=self.authtype,
-                                       server=server_pool,
-                                       user=bind_user,
-                                       password=password,
-                                       receive_timeout=self.timeout,
-                                       auto_referrals=not self.noreferrals,
-                                       start_tls=self.start_tls)
-            l.open()
-            r = l.bind()
-            log.debug("bind result: {0!r}".format(r))
-            if not r:
-                raise Exception("Wrong credentials")
-            log.debug("bind seems successful.")
-            l.unbind()
-            log.debug("unbind successful.")
+            # A bind with an empty password is an unauthenticated bind,
+            # which succeeds at many LDAP servers.
+            if not password:
+                raise Exception("No valid password. Empty password.")
+            if self.authtype == AUTHTYPE.SIMPLE:
+                # A connection from the user pool is bound as the user. The
+                # credentials are set explicitly, since rebind() keeps the
+                # previous password of the connection if the new one is empty.
+                l = self.user_pool.acquire()
+                try:
+                    l.authentication = ldap3.SIMPLE
+                    l.user = bind_user
+                    l.password = password
+                    r = l.bind()
+                except Exception:
+                    self.user_pool.release(l, broken=True)
+                    raise
+                self.user_pool.release(l)
+                log.debug("bind result: {0!r}".format(r))
+                if not r:
+                    raise Exception("Wrong credentials")
+                log.debug("bind seems successful.")
+            else:
+                server_pool = self.get_serverpool(self.uri, self.timeout,
+                                                  get_info=ldap3.NONE,
+                                                  tls_context=self.tls_context)
+                l = self.create_connection(authtype=self.authtype,
+                                           server=server_pool,
+                                           user=bind_user,
+                                           password=password,
+                                           receive_timeout=self.timeout,
+                                           auto_referrals=not self.noreferrals,
+                                           start_tls=self.start_tls)
+                l.open()
+                r = l.bind()
+                log.debug("bind result: {0!r}".format(r))
+                if not r:
+                    raise Exception("Wrong credentials")
+                log.debug("bind seems successful.")
+                l.unbind()
+                log.debug("unbind successful.")
         except Exception as e:
             log.warning("failed to check password for {0!r}/{1!r}: {2!r}".format(uid, bind_user, e))
             log.debug(traceback.format_exc())
@@ -303,6 +547,7 @@ class IdResolver (UserIdResolver):
         return userId
 
     @cache
+    @pooled()
     def _getDN(self, userId):
         """
         This function returns the DN of a userId.
@@ -338,24 +583,51 @@ class IdResolver (UserIdResolver):
         return dn
 
     def _bind(self):
-        if not self.i_am_bound:
-            server_pool = self.get_serverpool(self.uri, self.timeout,
-                                              tls_context=self.tls_context)
-            self.l = self.create_connection(authtype=self.authtype,
-                                            server=server_pool,
-                                            user=self.binddn,
-                                            password=self.bindpw,
-                                            receive_timeout=self.timeout,
-                                            auto_referrals=not
-                                            self.noreferrals,
-                                            start_tls=self.start_tls)
-            self.l.open()
-            #log.error("LDAP Server Pool States: %s" % server_pool.pool_states)
-            if not self.l.bind():
-                raise Exception("Wrong credentials")
-            self.i_am_bound = True
+        """
+        Take a bound connection from the pool for the current thread. The
+        connection is returned to the pool by the decorator pooled.
+        """
+        if self.l is None:
+            self.l = self.pool.acquire()
+
+    def _create_service_connection(self):
+        """
+        Create a new connection, that is bound with the service account of
+        the resolver.
+        """
+        server_pool = self.get_serverpool(self.uri, self.timeout,
+                                          tls_context=self.tls_context)
+        l = self.create_connection(authtype=self.authtype,
+                                   server=server_pool,
+                                   user=self.binddn,
+                                   password=self.bindpw,
+                                   receive_timeout=self.timeout,
+                                   auto_referrals=not self.noreferrals,
+                                   start_tls=self.start_tls)
+        l.open()
+        #log.error("LDAP Server Pool States: %s" % server_pool.pool_states)
+        if not l.bind():
+            raise Exception("Wrong credentials")
+        return l
+
+    def _create_user_connection(self):
+        """
+        Create a new anonymous connection, that is rebound with the
+        credentials of the users to check their passwords.
+        """
+        server_pool = self.get_serverpool(self.uri, self.timeout,
+                                          get_info=ldap3.NONE,
+                                          tls_context=self.tls_context)
+        l = self.create_connection(authtype=self.authtype,
+                                   server=server_pool,
+                                   receive_timeout=self.timeout,
+                                   auto_referrals=not self.noreferrals,
+                                   start_tls=self.start_tls)
+        l.open()
+        return l
 
     @cache
+    @pooled()
     def getUserInfo(self, userId):
         """
         This function returns all user info for a given userid/object.
@@ -394,6 +666,101 @@ class IdResolver (UserIdResolver):
 
         return ret
 
+    @pooled()
+    def getUserInfos(self, userids):
+        """
+        Returns the user information of several users. The users, that are
+        not cached, are read with one search with an OR filter per
+        BATCH_SIZE users. For the uid type DN each user is read separately.
+
+        :param userids: list of userids
+        :type userids: list
+        :return: dictionary with the userids as keys and the user
+            information as values. Unknown userids are not contained.
+        :rtype: dict
+        """
+        userinfos = {}
+        missing = []
+        for userid in userids:
+            userinfo = self.cache.get(("getUserInfo", userid))
+            if userinfo is NOT_FOUND:
+                missing.append(userid)
+            elif userinfo:
+                userinfos[userid] = userinfo
+
+        if self.uidtype.lower() == "dn":
+            for userid in missing:
+                userinfo = self.getUserInfo(userid)
+                if userinfo:
+                    userinfos[userid] = userinfo
+            return userinfos
+
+        if not missing:
+            return userinfos
+
+        self._bind()
+        attributes = self.userinfo.values() + [str(self.uidtype)]
+        for i in range(0, len(missing), BATCH_SIZE):
+            requested = dict((self._normalize_uid(userid), userid)
+                             for userid in missing[i:i + BATCH_SIZE])
+            uid_filter = "".join(["({0!s}={1!s})".format(
+                self.uidtype, self._escape_user_id(userid))
+                for userid in requested.values()])
+            filter = u"(&{0!s}(|{1!s}))".format(self.searchfilter,
+                                                uid_filter)
+            self.l.search(search_base=self.basedn,
+                          search_scope=self.scope,
+                          search_filter=filter,
+                          attributes=attributes)
+            for entry in self._trim_result(self.l.response):
+                uid = self._normalize_uid(self._get_uid(entry, self.uidtype))
+                userid = requested.pop(uid, None)
+                if userid is not None:
+                    userinfos[userid] = self._ldap_attributes_to_user_object(
+                        entry.get("attributes"))
+                    if self.cache_timeout > 0:
+                        self.cache.set(("getUserInfo", userid),
+                                       userinfos[userid], self.cache_timeout)
+            if self.negative_cache_timeout > 0:
+                for userid in requested.values():
+                    self.cache.set(("getUserInfo", userid), {},
+                                   self.negative_cache_timeout)
+
+        return userinfos
+
+    def getUsernames(self, userids):
+        """
+        Returns the usernames of several users.
+
+        :param userids: list of userids
+        :type userids: list
+        :return: dictionary with the userids as keys and the usernames as
+            values. Unknown userids are not contained.
+        :rtype: dict
+        """
+        return dict((userid, info.get("username"))
+                    for userid, info in self.getUserInfos(userids).items()
+                    if info.get("username"))
+
+    @staticmethod
+    def _normalize_uid(uid):
+        """
+        Return the uid in a form, that allows to compare the uids in the
+        LDAP response with the requested uids.
+        """
+        try:
+            return u"{0!s}".format(uid).strip(u"{}").lower()
+        except UnicodeDecodeError:  # pragma: no cover
+            return uid
+
+    def _escape_user_id(self, userId):
+        """
+        Escape the userId to be used as a value in a search filter.
+        """
+        if self.uidtype == "objectGUID":
+            return trim_objectGUID(userId)
+        return escape_filter_chars(u"{0!s}".format(userId))
+
     def _ldap_attributes_to_user_object(self, attributes):
         """
         This helper function converts the LDAP attributes to a dictionary for
@@ -431,6 +798,7 @@ class IdResolver (UserIdResolver):
         return info.get('username', "")
 
     @cache
+    @pooled()
     def getUserId(self, LoginName):
         """
         resolve the loginname to the userid.
@@ -466,6 +834,7 @@ class IdResolver (UserIdResolver):
 
         return userid
 
+    @pooled()
     def getUserList(self, searchDict):
         """
         :param searchDict: A dictionary with search parameters
@@ -574,6 +943,12 @@ class IdResolver (UserIdResolver):
         self.bindpw = config.get("BINDPW")
         self.timeout = float(config.get("TIMEOUT", 5))
         self.cache_timeout = int(config.get("CACHE_TIMEOUT", 120))
+        negative_cache_timeout = config.get("NEGATIVE_CACHE_TIMEOUT")
+        if negative_cache_timeout in [None, ""]:
+            self.negative_cache_timeout = min(self.cache_timeout,
+                                              DEFAULT_NEGATIVE_CACHE_TIMEOUT)
+        else:
+            self.negative_cache_timeout = int(negative_cache_timeout)
         self.sizelimit = int(config.get("SIZELIMIT", 500))
         self.loginname_attribute = config.get("LOGINNAMEATTRIBUTE")
         self.searchfilter = config.get("LDAPSEARCHFILTER")
@@ -597,6 +972,31 @@ class IdResolver (UserIdResolver):
                                    ca_certs_file=self.tls_ca_file)
         else:
             self.tls_context = None
+        # The shared cache entries of different configurations are separated
+        namespace = "pi-ldap:{0!s}".format(hashlib.sha256(
+            repr(sorted(config.items()))).hexdigest()[:16])
+        shared = None
+        if config.get("CACHE_REDIS"):
+            shared = RedisBackend(config.get("CACHE_REDIS"))
+        self.cache = LRUCache(int(config.get("CACHE_SIZE") or
+                                  DEFAULT_CACHE_SIZE),
+                              shared=shared, namespace=namespace)
+        self.pool_size = int(config.get("POOL_SIZE") or DEFAULT_POOL_SIZE)
+        self.user_pool_size = int(config.get("USER_POOL_SIZE") or
+                                  DEFAULT_USER_POOL_SIZE)
+        self.pool_max_age = int(config.get("POOL_MAX_AGE") or
+                                DEFAULT_POOL_MAX_AGE)
+        # The connections of a previous configuration are closed
+        for pool in [self.pool, self.user_pool]:
+            if pool:
+                pool.clear()
+        self.pool = ConnectionPool(self._create_service_connection,
+                                   size=self.pool_size,
+                                   max_age=self.pool_max_age)
+        self.user_pool = ConnectionPool(self._create_user_connection,
+                                        size=self.user_pool_size,
+                                        max_age=self.pool_max_age,
+                                        check_bound=False)
 
         return self
 
@@ -701,7 +1101,14 @@ class IdResolver (UserIdResolver):
                                 'AUTHTYPE': 'string',
                                 'TLS_VERIFY': 'bool',
                                 'TLS_CA_FILE': 'string',
-                                'START_TLS': 'bool'}
+                                'START_TLS': 'bool',
+                                'POOL_SIZE': 'int',
+                                'USER_POOL_SIZE': 'int',
+                                'POOL_MAX_AGE': 'int',
+                                'CACHE_TIMEOUT': 'int',
+                                'NEGATIVE_CACHE_TIMEOUT': 'int',
+                                'CACHE_SIZE': 'int',
+                                'CACHE_REDIS': 'string'}
         return {typ: descriptor}
 
     @classmethod
@@ -793,6 +1200,7 @@ class IdResolver (UserIdResolver):
 
         return success, desc
 
+    @pooled(retry=False)
     def add_user(self, attributes=None):
         """
         Add a new user to the LDAP directory.
@@ -831,8 +1239,24 @@ class IdResolver (UserIdResolver):
             log.error("Error during adding of user {0}: {1}".format(dn, self.l.result.get('message')))
             raise privacyIDEAError(self.l.result.get('message'))
 
+        # The new user might be cached as unknown
+        self._invalidate_cache(username=attributes.get("username"))
         return self.getUserId(attributes.get("username"))
 
+    def _invalidate_cache(self, uid=None, username=None):
+        """
+        Remove the cache entries of a user, that was added, modified or
+        deleted.
+
+        :param uid: The uid of the user
+        :param username: The login name of the user
+        """
+        for key in [("getUserInfo", uid), ("_getDN", uid),
+                    ("getUserId", username)]:
+            if key[1]:
+                self.cache.delete(key)
+
+    @pooled(retry=False)
     def delete_user(self, uid):
         """
         Delete a user from the LDAP Directory.
@@ -846,8 +1270,9 @@ class IdResolver (UserIdResolver):
         res = True
         try:
             self._bind()
-
+            username = self.getUserInfo(uid).get("username")
             self.l.delete(self._getDN(uid))
+            self._invalidate_cache(uid, username)
         except Exception as exx:
             log.error("Error deleting user: {0}".format(exx))
             res = False
@@ -927,6 +1352,7 @@ class IdResolver (UserIdResolver):
 
         return modify_changes
 
+    @pooled(retry=False)
     def update_user(self, uid, attributes=None):
         """
         Update an existing user.
@@ -946,10 +1372,12 @@ class IdResolver (UserIdResolver):
         attributes = attributes or {}
         try:
             self._bind()
-
+            username = self.getUserInfo(uid).get("username")
             mapped = self._create_ldap_modify_changes(attributes, uid)
             params = self._attributes_to_ldap_attributes(mapped)
             self.l.modify(self._getDN(uid), params)
+            self._invalidate_cache(uid, username)
+            self._invalidate_cache(username=attributes.get("username"))
         except Exception as e:
             log.error("Error accessing LDAP server: {0!s}".format(e))
             log.debug("{0!s}".format(traceback.format_exc()))
@@ -52,6 +52,9 @@ logger = logging.getLogger(__name__)
 
 class IdResolver (UserIdResolver):
 
+    # The access token of the object would expire
+    cacheable = False
+
     def __init__(self):
         self.auth_server = ''
         self.resource_server = ''
@@ -35,7 +35,7 @@ from UserIdResolver import UserIdResolver
 
 from sqlalchemy import and_
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 
 import traceback
 from base64 import (b64decode,
@@ -50,6 +50,8 @@ import binascii
 
 log = logging.getLogger(__name__)
 ENCODING = "utf-8"
+# The maximum number of userids, that are looked up in one query
+IN_CLAUSE_SIZE = 500
 
 SQLSOUP_LOADED = False
 try:
@@ -304,6 +306,13 @@ class IdResolver (UserIdResolver):
         self._editable = False
         return
 
+    def dispose(self):
+        """
+        Close the connections of the connection pool of the engine.
+        """
+        if self.engine is not None:
+            self.engine.dispose()
+
     def getSearchFields(self):
         return self.searchFields
 
@@ -408,6 +417,9 @@ class IdResolver (UserIdResolver):
                 userinfo = self._get_user_from_mapped_object(r)
         except Exception as exx:  # pragma: no cover
             log.error("Could not get the userinformation: {0!r}".format(exx))
+        finally:
+            # end the transaction and return the connection to the pool
+            self.session.close()
 
         return userinfo
 
@@ -422,6 +434,59 @@ class IdResolver (UserIdResolver):
         info = self.getUserInfo(userId)
         return info.get('username', "")
 
+    def getUserInfos(self, userids):
+        """
+        Returns the user information of several users. The users are read
+        with one query per IN_CLAUSE_SIZE userids.
+
+        :param userids: list of userids
+        :type userids: list
+        :return: dictionary with the userids as keys and the user
+            information as values. Unknown userids are not contained.
+        :rtype: dict
+        """
+        userinfos = {}
+        # The userids from the database might have another type than the
+        # requested userids
+        requested = dict((u"{0!s}".format(userid), userid)
+                         for userid in userids)
+        column = self.map.get("userid")
+        uid_list = list(requested.values())
+        try:
+            for i in range(0, len(uid_list), IN_CLAUSE_SIZE):
+                conditions = [getattr(self.TABLE, column).in_(
+                    uid_list[i:i + IN_CLAUSE_SIZE])]
+                conditions = self._append_where_filter(conditions,
+                                                       self.TABLE,
+                                                       self.where)
+                result = self.session.query(self.TABLE).filter(
+                    and_(*conditions))
+                for r in result:
+                    user = self._get_user_from_mapped_object(r)
+                    userid = requested.get(u"{0!s}".format(user.get("id")))
+                    if userid is not None:
+                        userinfos[userid] = user
+        except Exception as exx:  # pragma: no cover
+            log.error("Could not get the userinformation: {0!r}".format(exx))
+        finally:
+            self.session.close()
+
+        return userinfos
+
+    def getUsernames(self, userids):
+        """
+        Returns the usernames of several users with one query.
+
+        :param userids: list of userids
+        :type userids: list
+        :return: dictionary with the userids as keys and the usernames as
+            values. Unknown userids are not contained.
+        :rtype: dict
+        """
+        return dict((userid, info.get("username"))
+                    for userid, info in self.getUserInfos(userids).items()
+                    if info.get("username"))
+
     def getUserId(self, LoginName):
         """
         resolve the loginname to the userid.
@@ -449,6 +514,8 @@ class IdResolver (UserIdResolver):
                 userid = user["id"]
         except Exception as exx:    # pragma: no cover
             log.error("Could not get the userinformation: {0!r}".format(exx))
+        finally:
+            self.session.close()
 
         return userid
 
@@ -509,10 +576,13 @@ class IdResolver (UserIdResolver):
             filter(filter_condition).\
             limit(self.limit)
 
-        for r in result:
-            user = self._get_user_from_mapped_object(r)
-            if "id" in user:
-                users.append(user)
+        try:
+            for r in result:
+                user = self._get_user_from_mapped_object(r)
+                if "id" in user:
+                    users.append(user)
+        finally:
+            self.session.close()
 
         return users
 
@@ -585,9 +655,14 @@ class IdResolver (UserIdResolver):
         # create a configured "Session" class
         Session = sessionmaker(bind=self.engine)
 
-        # create a Session
-        self.session = Session()
-        self.session._model_changes = {}
+        def create_session():
+            session = Session()
+            session._model_changes = {}
+            return session
+
+        # The resolver object is shared between threads, so each thread
+        # gets its own session.
+        self.session = scoped_session(create_session)
         self.db = SQLSoup(self.engine)
         self.TABLE = self.db.entity(self.table)
 
@@ -757,6 +832,8 @@ class IdResolver (UserIdResolver):
         except Exception as exx:
             log.error("Error deleting user: {0!s}".format(exx))
             res = False
+        finally:
+            self.session.close()
         return res
 
     def update_user(self, uid, attributes=None):
@@ -63,6 +63,8 @@ class UserIdResolver(object):
 
     # If the resolver could be configured editable
     updateable = False
+    # If the resolver object can be cached and shared between the requests
+    cacheable = True
 
     def close(self):
         """
@@ -70,6 +72,22 @@ class UserIdResolver(object):
         """
         return
 
+    def dispose(self):
+        """
+        Hook to release the resources like connection pools, when the
+        resolver object is removed from the cache.
+        """
+        return
+
+    def get_metrics(self):
+        """
+        Return the counters of the resolver object like the state of the
+        connection pools.
+
+        :return: dict
+        """
+        return {}
+
     @staticmethod
     def getResolverClassType():
         """
@@ -154,6 +172,42 @@ class UserIdResolver(object):
         """
         return {}
 
+    def getUsernames(self, userids):
+        """
+        Returns the usernames of several users. Resolvers, that can look up
+        several users in one request, should overwrite this method.
+
+        :param userids: list of userids in this resolver
+        :type userids: list
+        :return: dictionary with the userids as keys and the usernames as
+            values. Unknown userids are not contained.
+        :rtype: dict
+        """
+        usernames = {}
+        for userid in userids:
+            username = self.getUsername(userid)
+            if username:
+                usernames[userid] = username
+        return usernames
+
+    def getUserInfos(self, userids):
+        """
+        Returns the user information of several users. Resolvers, that can
+        look up several users in one request, should overwrite this method.
+
+        :param userids: list of userids in this resolver
+        :type userids: list
+        :return: dictionary with the userids as keys and the user information
+            dictionaries as values. Unknown userids are not contained.
+        :rtype: dict
+        """
+        userinfos = {}
+        for userid in userids:
+            userinfo = self.getUserInfo(userid)
+            if userinfo:
+                userinfos[userid] = userinfo
+        return userinfos
+
     def getUserList(self, searchDict=None):
         """
         This function finds the user objects,
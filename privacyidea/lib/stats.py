@@ -19,7 +19,11 @@
 # License along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 __doc__ = """This module reads audit data and can create statistics from
-audit data using pandas.
+audit data.
+
+The statistics are created from the hourly counts of the audit entries, which
+are updated incrementally by the audit module. Each plot is returned as image
+and as data series.
 
 This module is tested in tests/test_lib_stats.py
 """
@@ -27,19 +31,56 @@ import logging
 from privacyidea.lib.log import log_with
 import datetime
 import StringIO
+import threading
+import time
 log = logging.getLogger(__name__)
 
 try:
     import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot
     MATPLOT_READY = True
     matplotlib.style.use('ggplot')
-    matplotlib.use('Agg')
 except Exception as exx:
     MATPLOT_READY = False
     log.warning("If you want to see statistics you need to install python "
                 "matplotlib.")
 
 customcmap = [(1, 0, 0), (0, 1, 0), (0, 0, 1)]
+VALIDATE_ACTIONS = ["POST /validate/check", "GET /validate/check"]
+# The statistics update the hourly counts at most once within this number of
+# seconds per process. Only one request at a time updates the counts.
+ROLLUP_INTERVAL = 300
+ROLLUP_LOCK = threading.Lock()
+LAST_ROLLUP = {"time": 0}
+
+
+def _rollup(auditobject, start_time):
+    """
+    Update the hourly counts of the audit entries, if they were not updated
+    within the ROLLUP_INTERVAL and no other request is updating them.
+
+    If nothing is counted, yet, only the entries since start_time are
+    counted. Older entries can be counted with "pi-manage rollup_audit".
+
+    :param auditobject: The audit object
+    :param start_time: The start time of the requested statistics
+    :return: True, if the counts were updated
+    """
+    if not ROLLUP_LOCK.acquire(False):
+        # Another request is updating the counts right now
+        return False
+    try:
+        if time.time() - LAST_ROLLUP["time"] < ROLLUP_INTERVAL:
+            return False
+        LAST_ROLLUP["time"] = time.time()
+        auditobject.rollup(first_start_time=start_time)
+        return True
+    except Exception as exx:  # pragma: no cover
+        log.error("Could not update the audit statistics: {0!r}".format(exx))
+        return False
+    finally:
+        ROLLUP_LOCK.release()
 
 
 @log_with(log)
@@ -51,110 +92,139 @@ def get_statistics(auditobject, start_time=datetime.datetime.now()
     The auditobject is passed from the upper level, usually from the REST API
     as g.auditobject.
 
+    Each plot "<name>_plot" is accompanied by the data series "<name>_data".
+
     :param auditobject: The audit object
     :type auditobject: Audit Object as defined in auditmodules.base.Audit
     :return: JSON
     """
     result = {}
-    df = auditobject.get_dataframe(start_time=start_time, end_time=end_time)
+    _rollup(auditobject, start_time)
 
     # authentication successful/fail per user or serial
     for key in ["user", "serial"]:
-        result["validate_{0!s}_plot".format(key)] = _get_success_fail(df, key)
+        counts = auditobject.get_rollup_counts([key, "success"],
+                                               start_time=start_time,
+                                               end_time=end_time,
+                                               actions=VALIDATE_ACTIONS)
+        data = _get_success_fail(counts)
+        result["validate_{0!s}_data".format(key)] = data
+        result["validate_{0!s}_plot".format(key)] = _plot_success_fail(data)
 
     # get simple usage
     for key in ["serial", "action"]:
-        result["{0!s}_plot".format(key)] = _get_number_of(df, key)
+        counts = auditobject.get_rollup_counts([key], start_time=start_time,
+                                               end_time=end_time)
+        data = _get_number_of(counts)
+        result["{0!s}_data".format(key)] = data
+        result["{0!s}_plot".format(key)] = _plot_number_of(
+            data, "Numbers of {0!s}".format(key), "Blues")
 
     # failed authentication requests
     for key in ["user", "serial"]:
-        result["validate_failed_{0!s}_plot".format(key)] = _get_fail(df, key)
-
-    result["admin_plot"] = _get_number_of(df, "action", nums=20)
+        counts = auditobject.get_rollup_counts([key], start_time=start_time,
+                                               end_time=end_time,
+                                               actions=VALIDATE_ACTIONS,
+                                               success=0)
+        data = _get_number_of(counts)
+        result["validate_failed_{0!s}_data".format(key)] = data
+        result["validate_failed_{0!s}_plot".format(key)] = _plot_number_of(
+            data, "Failed Authentications", "Reds")
+
+    counts = auditobject.get_rollup_counts(["action"], start_time=start_time,
+                                           end_time=end_time)
+    data = _get_number_of(counts, nums=20)
+    result["admin_data"] = data
+    result["admin_plot"] = _plot_number_of(data, "Numbers of action", "Blues")
 
     return result
 
-def _get_success_fail(df, key):
 
-    try:
-        output = StringIO.StringIO()
-        series = df[df.action.isin(["POST /validate/check",
-                                    "GET /validate/check"])].groupby([key,
-                                                                'success']).size().unstack()
-        fig = series.plot(kind="bar", stacked=True,
-                          legend=True,
-                          title="Authentications",
-                          grid=True,
-                          color=customcmap).get_figure()
-        fig.savefig(output, format="png")
-        o_data = output.getvalue()
-        output.close()
-        image_data = o_data.encode("base64")
-        image_uri = 'data:image/png;base64,{0!s}'.format(image_data)
-    except Exception as exx:
-        log.info(exx)
-        image_uri = "{0!s}".format(exx)
-    return image_uri
+def _get_success_fail(counts):
+    """
+    Return the number of successful and failed authentications per value.
 
-def _get_fail(df, key):
+    :param counts: dict with (value, success) and the number
+    :return: list of [value, successful, failed], sorted by the value
+    """
+    values = {}
+    for (value, success), count in counts.items():
+        numbers = values.setdefault(value, [0, 0])
+        numbers[0 if success else 1] += count
+    return [[value, numbers[0], numbers[1]]
+            for value, numbers in sorted(values.items())]
 
-    try:
-        output = StringIO.StringIO()
-        series = df[(df.success==0)
-                    & (df.action.isin(["POST /validate/check",
-                                       "GET /validate/check"]))][
-                     key].value_counts()[:5]
 
-        plot_canvas = matplotlib.pyplot.figure()
-        ax = plot_canvas.add_subplot(1,1,1)
-
-        fig = series.plot(ax=ax, kind="bar",
-                          colormap="Reds",
-                          stacked=False,
-                          legend=False,
-                          grid=True,
-                          title="Failed Authentications").get_figure()
-        fig.savefig(output, format="png")
-        o_data = output.getvalue()
-        output.close()
-        image_data = o_data.encode("base64")
-        image_uri = 'data:image/png;base64,{0!s}'.format(image_data)
-    except Exception as exx:
-        log.info(exx)
-        image_uri = "{0!s}".format(exx)
-    return image_uri
+def _get_number_of(counts, nums=5):
+    """
+    Return the "nums" most occurrences of the values.
+
+    :param counts: dict with (value,) and the number
+    :param nums: how many of the most often values should be returned
+    :return: list of [value, number], sorted by the number
+    """
+    data = [[key[0], count] for key, count in counts.items()]
+    data.sort(key=lambda x: x[1], reverse=True)
+    return data[:nums]
 
 
+def _plot_success_fail(data):
+    return _plot(data, "Authentications",
+                 [("success", customcmap[1]), ("fail", customcmap[0])])
 
-def _get_number_of(df, key, nums=5):
+
+def _plot_number_of(data, title, colormap):
     """
     return a data url image with a single keyed value.
-    It plots the "nums" most occurrences of the "key" column in the dataframe.
 
-    :param df: The DataFrame
-    :type df: Pandas DataFrame
-    :param key: The key, which should be plotted.
-    :param count: how many of the most often values should be plotted
+    :param data: list of [value, number]
+    :param title: The title of the plot
+    :param colormap: The name of the matplotlib colormap
+    :return: A data url
+    """
+    color = "blue"
+    if MATPLOT_READY:
+        color = matplotlib.pyplot.get_cmap(colormap)(0.7)
+    return _plot(data, title, [(None, color)])
+
+
+def _plot(data, title, bars):
+    """
+    Plot the data as stacked bars.
+
+    :param data: list of [label, number of the first bar, number of the
+        second bar...]
+    :param title: The title of the plot
+    :param bars: list of the legend and the color of each bar
     :return: A data url
     """
+    if not MATPLOT_READY or not data:
+        return "No data"
     output = StringIO.StringIO()
-    output.truncate(0)
     try:
         plot_canvas = matplotlib.pyplot.figure()
         ax = plot_canvas.add_subplot(1, 1, 1)
-
-        series = df[key].value_counts()[:nums]
-        fig = series.plot(ax=ax, kind="bar", colormap="Blues",
-                          legend=False,
-                          stacked=False,
-                          title="Numbers of {0!s}".format(key),
-                          grid=True).get_figure()
-        fig.savefig(output, format="png")
-        o_data = output.getvalue()
-        output.close()
-        image_data = o_data.encode("base64")
+        positions = range(len(data))
+        bottom = [0] * len(data)
+        for i, (label, color) in enumerate(bars):
+            values = [row[i + 1] for row in data]
+            ax.bar(positions, values, bottom=bottom, color=color,
+                   label=label, align="center")
+            bottom = [b + v for b, v in zip(bottom, values)]
+        ax.set_xticks(positions)
+        ax.set_xticklabels([row[0] for row in data], rotation=90)
+        ax.set_title(title)
+        ax.grid(True)
+        if len(bars) > 1:
+            ax.legend()
+        plot_canvas.tight_layout()
+        plot_canvas.savefig(output, format="png")
+        matplotlib.pyplot.close(plot_canvas)
+        image_data = output.getvalue().encode("base64")
         image_uri = 'data:image/png;base64,{0!s}'.format(image_data)
     except Exception as exx:
         log.info(exx)
         image_uri = "No data"
+    finally:
+        output.close()
     return image_uri
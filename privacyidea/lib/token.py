@@ -60,6 +60,7 @@ import os
 import logging
 
 from sqlalchemy import (and_, func)
+from sqlalchemy.orm import subqueryload
 from privacyidea.lib.error import (TokenAdminError,
                                    ParameterError,
                                    privacyIDEAError)
@@ -76,7 +77,7 @@ from privacyidea.lib.config import (get_token_class, get_token_prefix,
                                     get_inc_fail_count_on_false_pin)
 from privacyidea.lib.user import get_user_info
 from privacyidea.lib import _
-from privacyidea.lib.realm import realm_is_defined
+from privacyidea.lib.realm import realm_is_defined, get_realms
 from privacyidea.lib.resolver import get_resolver_object
 from privacyidea.lib.policy import ACTION, SCOPE
 from privacyidea.lib.policydecorators import (libpolicy,
@@ -85,7 +86,8 @@ from privacyidea.lib.policydecorators import (libpolicy,
                                               auth_user_passthru,
                                               auth_user_timelimit,
                                               auth_lastauth,
-                                              config_lost_token)
+                                              config_lost_token,
+                                              get_user_tokens)
 
 log = logging.getLogger(__name__)
 
@@ -257,12 +259,28 @@ def _create_token_query(tokentype=None, realm=None, assigned=None, user=None,
     return sql_query
 
 
+def _eager_token_query(sql_query):
+    """
+    Load the tokeninfo and the realms of the tokens of the given query
+    together with the tokens. Instead of one query per token and
+    relation, this results in a fixed number of queries.
+
+    :param sql_query: An SQLAlchemy query for tokens
+    :return: An SQLAlchemy sql query
+    """
+    # The tokens of the tokeninfo and the tokenrealm entries are already
+    # in the session, so we do not need to join them again.
+    return sql_query.options(
+        subqueryload(Token.info_list).lazyload(TokenInfo.token),
+        subqueryload(Token.realm_list).lazyload(TokenRealm.token))
+
+
 @log_with(log)
 #@cache.memoize(10)
 def get_tokens(tokentype=None, realm=None, assigned=None, user=None,
                serial=None, active=None, resolver=None, rollout_state=None,
                count=False, revoked=None, locked=None, tokeninfo=None,
-               maxfail=None):
+               maxfail=None, eager=False):
     """
     (was getTokensOfType)
     This function returns a list of token objects of a
@@ -306,6 +324,9 @@ def get_tokens(tokentype=None, realm=None, assigned=None, user=None,
     :type tokeninfo: dict
     :param maxfail: If only tokens should be returned, which failcounter
         reached maxfail
+    :param eager: Load the tokeninfo and the realms together with the
+        tokens. This saves queries, if many tokens are read.
+    :type eager: bool
 
     :return: A list of tokenclasses (lib.tokenclass)
     :rtype: list
@@ -323,6 +344,8 @@ def get_tokens(tokentype=None, realm=None, assigned=None, user=None,
     if count is True:
         ret = sql_query.count()
     else:
+        if eager:
+            sql_query = _eager_token_query(sql_query)
         # Return a simple, flat list of tokenobjects
         for token in sql_query.all():
             # the token is the database object, but we want an instance of the
@@ -338,11 +361,49 @@ def get_tokens(tokentype=None, realm=None, assigned=None, user=None,
     return ret
 
 
+@log_with(log)
+def get_tokens_of_user_id(resolver, userid, realm=None, eager=False):
+    """
+    Return the token objects, that are assigned to the user with the given
+    userid in the resolver. The resolver and the userid are matched
+    exactly. If a realm is given, only the tokens in this realm are
+    returned like in get_tokens.
+
+    :param resolver: The name of the resolver
+    :type resolver: basestring
+    :param userid: The id of the user in the resolver
+    :type userid: basestring
+    :param realm: The realm, the user logged in with
+    :type realm: basestring
+    :param eager: Load the tokeninfo and the realms together with the
+        tokens.
+    :type eager: bool
+    :return: A list of tokenclasses (lib.tokenclass)
+    :rtype: list
+    """
+    sql_query = Token.query.filter(Token.resolver == resolver,
+                                   Token.user_id == userid)
+    if realm is not None:
+        sql_query = sql_query.filter(and_(func.lower(Realm.name) ==
+                                          realm.lower(),
+                                          TokenRealm.realm_id == Realm.id,
+                                          TokenRealm.token_id ==
+                                          Token.id)).distinct()
+    if eager:
+        sql_query = _eager_token_query(sql_query)
+    token_list = []
+    for token in sql_query.all():
+        tokenobject = create_tokenclass_object(token)
+        if isinstance(tokenobject, TokenClass):
+            token_list.append(tokenobject)
+    return token_list
+
+
 @log_with(log)
 def get_tokens_paginate(tokentype=None, realm=None, assigned=None, user=None,
                 serial=None, active=None, resolver=None, rollout_state=None,
                 sortby=Token.serial, sortdir="asc", psize=15,
-                page=1, description=None, userid=None):
+                page=1, description=None, userid=None, eager=False):
     """
     This function is used to retrieve a token list, that can be displayed in
     the Web UI. It supports pagination.
@@ -372,6 +433,9 @@ def get_tokens_paginate(tokentype=None, realm=None, assigned=None, user=None,
     :type psize: int
     :param page: The number of the page to view. Starts with 1 ;-)
     :type page: int
+    :param eager: Load the tokeninfo and the realms together with the
+        tokens. This saves queries, if many tokens are read.
+    :type eager: bool
     :return: dict with tokens, prev, next and count
     :rtype: dict
     """
@@ -392,6 +456,8 @@ def get_tokens_paginate(tokentype=None, realm=None, assigned=None, user=None,
     else:
         sql_query = sql_query.order_by(sortby.asc())
 
+    if eager:
+        sql_query = _eager_token_query(sql_query)
     pagination = sql_query.paginate(page, per_page=psize,
                                     error_out=False)
     tokens = pagination.items
@@ -401,26 +467,57 @@ def get_tokens_paginate(tokentype=None, realm=None, assigned=None, user=None,
     next = None
     if pagination.has_next:
         next = page + 1
+    # The owners of the tokens are looked up with one request per resolver
+    userids = {}
+    for token in tokens:
+        if token.user_id and token.resolver:
+            userids.setdefault(token.resolver, set()).add(token.user_id)
+    usernames = {}
+    editable = {}
+    # The realms of each resolver
+    resolver_realms = {}
+    for realmname, realm in get_realms().items():
+        for resolver in realm.get("resolver", []):
+            resolver_realms.setdefault(resolver.get("name"),
+                                       set()).add(realmname)
+    for resolvername, resolver_userids in userids.items():
+        # In certain cases the LDAP or SQL server might not be reachable.
+        # Then an exception is raised
+        try:
+            y = get_resolver_object(resolvername)
+            if y:
+                usernames[resolvername] = y.getUsernames(
+                    list(resolver_userids))
+                editable[resolvername] = y.editable
+            else:
+                usernames[resolvername] = {}
+        except Exception as exx:
+            log.error("User information can not be retrieved: {0!s}".format(exx))
+
     token_list = []
     for token in tokens:
         tokenobject = create_tokenclass_object(token)
         if isinstance(tokenobject, TokenClass):
             token_dict = tokenobject.get_as_dict()
             # add user information
-            # In certain cases the LDAP or SQL server might not be reachable.
-            # Then an exception is raised
             token_dict["username"] = ""
             token_dict["user_realm"] = ""
-            try:
-                userobject = tokenobject.user
-                if userobject:
-                    token_dict["username"] = userobject.login
-                    token_dict["user_realm"] = userobject.realm
-                    token_dict["user_editable"] = get_resolver_object(
-                        userobject.resolver).editable
-            except Exception as exx:
-                log.error("User information can not be retrieved: {0!s}".format(exx))
-                token_dict["username"] = "**resolver error**"
+            if token.user_id and token.resolver:
+                if token.resolver not in usernames:
+                    token_dict["username"] = "**resolver error**"
+                else:
+                    username = usernames[token.resolver].get(token.user_id)
+                    realms = [tr.realm.name for tr in token.realm_list]
+                    if len(realms) > 1:
+                        # The token is also assigned to other realms, so we
+                        # use the realm of the resolver of the owner.
+                        realms = [r for r in realms if r in
+                                  resolver_realms.get(token.resolver, set())]
+                    if username and len(realms) == 1:
+                        token_dict["username"] = username
+                        token_dict["user_realm"] = realms[0]
+                        token_dict["user_editable"] = editable.get(
+                            token.resolver)
 
             token_list.append(token_dict)
 
@@ -1771,7 +1868,8 @@ def check_realm_pass(realm, passw, options=None):
     # since an attacker does not know, which token is tested, we restrict to
     # only active tokens. He would not guess that the given OTP value is that
     #  of an inactive token.
-    tokenobject_list = get_tokens(realm=realm, assigned=True, active=True)
+    tokenobject_list = get_tokens(realm=realm, assigned=True, active=True,
+                                  eager=True)
     if not tokenobject_list:
         res = False
         reply_dict["message"] = "There is no active and assigned token in " \
@@ -1860,7 +1958,8 @@ def check_user_pass(user, passw, options=None):
     :return: tuple of result (True, False) and additional dict
     :rtype: tuple
     """
-    tokenobject_list = get_tokens(user=user)
+    # The decorators may already have read the tokens of the user
+    tokenobject_list = get_user_tokens(user)
     reply_dict = {}
     if not tokenobject_list:
         # The user has no tokens assigned
@@ -46,6 +46,21 @@ pver = float(int(ma) + int(mi) * 0.1)
 
 log = logging.getLogger(__name__)
 
+try:
+    from hmac import compare_digest
+except ImportError:  # pragma: no cover
+    # Python < 2.7.7
+    def compare_digest(a, b):
+        """
+        Compare two strings in constant time.
+        """
+        if len(a) != len(b):
+            return False
+        result = 0
+        for x, y in zip(a, b):
+            result |= ord(x) ^ ord(y)
+        return result == 0
+
 
 class HmacOtp(object):
 
@@ -131,9 +146,56 @@ class HmacOtp(object):
             self.counter = counter + 1
         return sotp
 
+    def generate_batch(self, start, end, key=None):
+        """
+        Generate the OTP values for the counters start to end - 1.
+
+        The key is only set up once. For each counter the precomputed
+        inner and outer HMAC state is copied, so that only the counter
+        needs to be hashed.
+
+        :param start: The first counter
+        :param end: The counter after the last counter
+        :param key: The binary key. If omitted the secretObj is used.
+        :return: generator of tuples (counter, otp value)
+        """
+        if key is None:
+            template = self.secretObj.hmac_object(self.hashfunc)
+        else:
+            template = hmac.new(key, digestmod=self.hashfunc)
+        digits = self.digits
+        modulo = 10 ** digits
+        pack = struct.pack
+        unpack = struct.unpack
+        for counter in xrange(start, end):
+            h = template.copy()
+            h.update(pack(">Q", counter))
+            digest = h.digest()
+            offset = ord(digest[-1]) & 0x0f
+            binary = unpack(">I", digest[offset:offset + 4])[0] & 0x7fffffff
+            yield counter, "{0:0{1:d}d}".format(binary % modulo, digits)
+
+    def find_otp(self, anOtpVal, start, end):
+        """
+        Search the OTP value in the counters start to end - 1. The values
+        are compared in constant time. The search stops at the first match.
+
+        :param anOtpVal: The OTP value to search
+        :param start: The first counter
+        :param end: The counter after the last counter
+        :return: the matching counter or -1
+        """
+        if isinstance(anOtpVal, unicode):
+            anOtpVal = anOtpVal.encode("utf-8")
+        else:
+            anOtpVal = str(anOtpVal)
+        for counter, otpval in self.generate_batch(start, end):
+            if compare_digest(otpval, anOtpVal):
+                return counter
+        return -1
+
     @log_with(log)
     def checkOtp(self, anOtpVal, window, symetric=False):
-        res = -1
         start = self.counter
         end = self.counter + window
         if symetric is True:
@@ -143,12 +205,5 @@ class HmacOtp(object):
             end = self.counter + (window)
 
         log.debug("OTP range counter: {0!r} - {1!r}".format(start, end))
-        for c in range(start, end):
-            otpval = self.generate(c)
-            log.debug("calculating counter {0!r}: {1!r} {2!r}".format(c, anOtpVal, otpval))
-
-            if unicode(otpval) == unicode(anOtpVal):
-                res = c
-                break
         # return -1 or the counter
-        return res
+        return self.find_otp(anOtpVal, start, end)
@@ -567,10 +567,10 @@ class HotpTokenClass(TokenClass):
 
         if count > 0:
             error = "OK"
-            for i in range(count):
-                otpval = hmac2Otp.generate(self.token.count + i,
-                                           inc_counter=False)
-                otp_dict["otp"][i] = otpval
+            start = self.token.count
+            for counter, otpval in hmac2Otp.generate_batch(start,
+                                                           start + count):
+                otp_dict["otp"][counter - start] = otpval
             ret = True
 
         return ret, error, otp_dict
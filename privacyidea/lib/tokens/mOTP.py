@@ -37,6 +37,7 @@ import time
 from hashlib import md5
 
 from privacyidea.lib.crypto import zerome
+from privacyidea.lib.tokens.HMAC import compare_digest
 from privacyidea.lib.log import log_with
 
 
@@ -106,9 +107,13 @@ class mTimeOtp(object):
             pin = self.secPin.getKey()
 
 
+        if isinstance(anOtpVal, unicode):
+            anOtpVal = anOtpVal.encode("utf-8")
+        else:
+            anOtpVal = str(anOtpVal)
         for i in range(otime - window, otime + window):
-            otp = unicode(self.calcOtp(i, key, pin))
-            if unicode(anOtpVal) == otp:
+            otp = self.calcOtp(i, key, pin)
+            if compare_digest(otp, anOtpVal):
                 res = i
                 log.debug("otpvalue {0!r} found at: {1!r}".format(anOtpVal, res))
                 break
@@ -591,15 +591,14 @@ class TotpTokenClass(HotpTokenClass):
 
         if count > 0:
             error = "OK"
-            for i in range(0, count):
-                otpval = hmac2Otp.generate(counter=counter + i,
-                                           inc_counter=False)
-                timeCounter = ((counter + i) * self.timestep) + self.timeshift
-                
+            for c, otpval in hmac2Otp.generate_batch(counter,
+                                                     counter + count):
+                timeCounter = (c * self.timestep) + self.timeshift
+
                 val_time = datetime.datetime.\
                     fromtimestamp(timeCounter).strftime("%Y-%m-%d %H:%M:%S")
-                otp_dict["otp"][counter + i] = {'otpval': otpval,
-                                                'time': val_time}
+                otp_dict["otp"][c] = {'otpval': otpval,
+                                      'time': val_time}
             ret = True
             
         return ret, error, otp_dict
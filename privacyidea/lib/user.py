@@ -46,7 +46,11 @@ This code is tested in tests/test_lib_user.py
 '''
 
 import logging
+import os
+import threading
+import time
 import traceback
+import Queue
 
 from .error import UserError
 from ..api.lib.utils import (getParam,
@@ -61,6 +65,10 @@ from .realm import (get_realms,
 from .config import get_from_config
 
 ENCODING = 'utf-8'
+# The number of seconds to wait for the user list of a resolver
+DEFAULT_SEARCH_TIMEOUT = 30
+# The number of threads, that search the resolvers
+DEFAULT_SEARCH_THREADS = 10
 
 log = logging.getLogger(__name__)
 
@@ -561,9 +569,16 @@ def get_user_from_param(param, optionalOrRequired=optional):
     return user_object
 
 
-@log_with(log)
-def get_user_list(param=None, user=None):
-    users = []
+def _get_search_parameters(param=None, user=None):
+    """
+    Determine the search dictionary and the names of the resolvers, that
+    need to be searched for the parameters of a user list request.
+
+    :param param: The request parameters
+    :param user: A user object, that restricts the search to its resolver
+        and realm
+    :return: tuple of the search dictionary and the set of resolver names
+    """
     resolvers = []
     searchDict = {"username": "*"}
     param = param or {}
@@ -612,30 +627,175 @@ def get_user_list(param=None, user=None):
             for resolver_entry in res_list.get("resolver"):
                 resolvers.append(resolver_entry.get("name"))
 
-    for resolver_name in set(resolvers):
+    return searchDict, set(resolvers)
+
+
+class SearchPool(object):
+    """
+    A pool of threads, that search the resolvers. The pool is shared by all
+    requests of the process.
+
+    At most size threads are started, further searches wait in the queue.
+    A search, whose deadline has passed before a thread takes it from the
+    queue, is skipped. Thus a hanging resolver blocks at most the threads of
+    the pool, but does not create new threads.
+    """
+
+    def __init__(self, size=DEFAULT_SEARCH_THREADS):
+        """
+        :param size: The maximum number of threads
+        """
+        self.size = size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.queue = Queue.Queue()
+        self.threads = []
+
+    def submit(self, deadline, func, *args):
+        """
+        Call func with the arguments in a thread of the pool, if a thread is
+        available before the deadline.
+
+        :param deadline: The time after which the call is skipped
+        :type deadline: float
+        """
+        with self._lock:
+            if os.getpid() != self.pid:
+                # The threads of the parent are not running in a forked
+                # process.
+                self._reset()
+            if len(self.threads) < self.size:
+                thread = threading.Thread(target=self._work,
+                                          args=(self.queue,))
+                # A daemon thread does not stop the process, if a resolver
+                # hangs
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+            self.queue.put((deadline, func, args))
+
+    @staticmethod
+    def _work(queue):
+        while True:
+            deadline, func, args = queue.get()
+            if time.time() > deadline:
+                continue
+            try:
+                func(*args)
+            except Exception as exx:  # pragma: no cover
+                log.error("{0!r}".format(exx))
+                log.debug("{0!s}".format(traceback.format_exc()))
+
+
+USER_SEARCH_POOL = SearchPool()
+
+
+def _search_resolver(resolver_name, y, searchDict, results):
+    """
+    Read the user list of one resolver and put the result to the queue
+    results. This function is run by a thread of the USER_SEARCH_POOL.
+    """
+    try:
+        log.debug("with this search dictionary: {0!r} ".format(searchDict))
+        ulist = y.getUserList(searchDict)
+        log.debug("Found this userlist: {0!r}".format(ulist))
+        results.put((resolver_name, ulist, None))
+    except Exception as exx:
+        log.error("{0!r}".format((exx)))
+        log.debug("{0!s}".format(traceback.format_exc()))
+        results.put((resolver_name, None, exx))
+
+
+def get_user_generator(param=None, user=None, timeout=DEFAULT_SEARCH_TIMEOUT,
+                       failed_resolvers=None):
+    """
+    Search the users in the resolvers, that are determined by the
+    parameters. The resolvers are searched at the same time by the threads
+    of the USER_SEARCH_POOL. The users of a resolver are yielded as soon as
+    the resolver has returned its user list.
+
+    The parameters are evaluated and the searches are started, when the
+    function is called, so errors are raised before the generator is read.
+    Resolvers, that fail or do not return the user list within the timeout,
+    are skipped and added to the dictionary failed_resolvers.
+
+    :param param: The request parameters like realm, resolver and the
+        search expressions
+    :param user: A user object, that restricts the search to its resolver
+        and realm
+    :param timeout: The number of seconds to wait for each resolver
+    :param failed_resolvers: A dictionary, that is filled with the names of
+        the failed resolvers and the reason
+    :return: A generator, that yields the user dictionaries
+    """
+    if failed_resolvers is None:
+        failed_resolvers = {}
+    searchDict, resolver_names = _get_search_parameters(param, user)
+    results = Queue.Queue()
+    editable = {}
+    deadline = time.time() + timeout
+    for resolver_name in resolver_names:
         try:
             log.debug("Check for resolver class: {0!r}".format(resolver_name))
             y = get_resolver_object(resolver_name)
-            log.debug("with this search dictionary: {0!r} ".format(searchDict))
-            ulist = y.getUserList(searchDict)
-            # Add resolvername to the list
-            for ue in ulist:
-                ue["resolver"] = resolver_name
-                ue["editable"] = y.editable
-            log.debug("Found this userlist: {0!r}".format(ulist))
-            users.extend(ulist)
-
-        except KeyError as exx:  # pragma: no cover
+            if y is None:
+                raise UserError("The resolver {0!s} does not "
+                                "exist.".format(resolver_name))
+        except Exception as exx:
             log.error("{0!r}".format((exx)))
             log.debug("{0!s}".format(traceback.format_exc()))
-            raise exx
+            failed_resolvers[resolver_name] = "{0!s}".format(exx)
+            continue
+        editable[resolver_name] = y.editable
+        USER_SEARCH_POOL.submit(deadline, _search_resolver, resolver_name, y,
+                                searchDict, results)
 
-        except Exception as exx:  # pragma: no cover
-            log.error("{0!r}".format((exx)))
-            log.debug("{0!s}".format(traceback.format_exc()))
+    return _read_search_results(results, editable, deadline, timeout,
+                                failed_resolvers)
+
+
+def _read_search_results(results, editable, deadline, timeout,
+                         failed_resolvers):
+    """
+    Yield the users of the resolvers from the queue results until all
+    resolvers have returned their user list or the deadline has passed.
+    See get_user_generator.
+    """
+    pending = set(editable)
+    while pending:
+        try:
+            resolver_name, ulist, error = results.get(
+                timeout=max(deadline - time.time(), 0))
+        except Queue.Empty:
+            break
+        pending.discard(resolver_name)
+        if error is not None:
+            failed_resolvers[resolver_name] = "{0!s}".format(error)
             continue
+        # Add resolvername to the list
+        for ue in ulist:
+            ue["resolver"] = resolver_name
+            ue["editable"] = editable[resolver_name]
+            yield ue
+
+    for resolver_name in pending:
+        log.warning("The resolver {0!s} did not return the user list "
+                    "within {1!s} seconds.".format(resolver_name, timeout))
+        failed_resolvers[resolver_name] = "timeout"
 
-    return users
+
+@log_with(log)
+def get_user_list(param=None, user=None, timeout=DEFAULT_SEARCH_TIMEOUT):
+    """
+    Return the list of the users in the resolvers, that are determined by
+    the parameters. See get_user_generator.
+
+    :return: list of user dictionaries
+    """
+    return list(get_user_generator(param, user, timeout=timeout))
 
 
 @log_with(log)
@@ -37,9 +37,14 @@ import traceback
 ENCODING = "utf-8"
 
 
-def check_time_in_range(time_range, check_time=None):
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_time_range(time_range):
     """
-    Check if the given time is contained in the time_range string.
+    Parse the time_range string into a bitset of the minutes of the week.
+    The bit number n is set, if the minute n of the week is contained in the
+    time range. The minute 0 is Monday 00:00.
     The time_range can be something like
 
      <DOW>-<DOW>: <hh:mm>-<hh:mm>,  <DOW>-<DOW>: <hh:mm>-<hh:mm>
@@ -50,15 +55,15 @@ def check_time_in_range(time_range, check_time=None):
     hh: 00-23
     mm: 00-59
 
-    If time is omitted the current time is used: time.localtime()
+    The bitset only needs to be calculated once and can be checked with
+    check_time_in_bitset.
 
     :param time_range: The timerange
     :type time_range: basestring
-    :param time: The time to check
-    :type time: datetime
-    :return: True, if time is within time_range.
+    :return: The bitset of the minutes of the week
+    :rtype: long
     """
-    time_match = False
+    bitset = 0
     dow_index = {"mon": 1,
                  "tue": 2,
                  "wed": 3,
@@ -67,9 +72,6 @@ def check_time_in_range(time_range, check_time=None):
                  "sat": 6,
                  "sun": 7}
 
-    check_time = check_time or datetime.now()
-    check_day = check_time.isoweekday()
-    check_hour = time(check_time.hour, check_time.minute)
     # remove whitespaces
     time_range = ''.join(time_range.split())
     # split into list of time ranges
@@ -95,16 +97,66 @@ def check_time_in_range(time_range, check_time=None):
             else:
                 time_end = time(te[0])
 
-            # check the day and the time
-            if (dow_index.get(dow_start) <= check_day <= dow_index.get(dow_end)
-                    and
-                    time_start <= check_hour <= time_end):
-                time_match = True
+            # An unknown start day matches from Monday, an unknown end day
+            # never matches.
+            day_start = dow_index.get(dow_start, 1)
+            day_end = dow_index.get(dow_end, 0)
+            minute_start = time_start.hour * 60 + time_start.minute
+            minute_end = time_end.hour * 60 + time_end.minute
+            if minute_start > minute_end:
+                continue
+            day_mask = (1 << (minute_end - minute_start + 1)) - 1
+            for day in range(day_start, day_end + 1):
+                bitset |= day_mask << ((day - 1) * MINUTES_PER_DAY +
+                                       minute_start)
     except ValueError:
         log.error("Wrong time range format: <dow>-<dow>:<hh:mm>-<hh:mm>")
         log.debug("{0!s}".format(traceback.format_exc()))
 
-    return time_match
+    return bitset
+
+
+def check_time_in_bitset(bitset, check_time=None):
+    """
+    Check if the given time is contained in the bitset of a time range, that
+    was created by parse_time_range.
+
+    If time is omitted the current time is used.
+
+    :param bitset: The bitset of the minutes of the week
+    :type bitset: long
+    :param check_time: The time to check
+    :type check_time: datetime
+    :return: True, if time is within the time range.
+    """
+    check_time = check_time or datetime.now()
+    minute = (check_time.isoweekday() - 1) * MINUTES_PER_DAY + \
+        check_time.hour * 60 + check_time.minute
+    return bool((bitset >> minute) & 1)
+
+
+def check_time_in_range(time_range, check_time=None):
+    """
+    Check if the given time is contained in the time_range string.
+    The time_range can be something like
+
+     <DOW>-<DOW>: <hh:mm>-<hh:mm>,  <DOW>-<DOW>: <hh:mm>-<hh:mm>
+     <DOW>-<DOW>: <h:mm>-<hh:mm>,  <DOW>: <h:mm>-<hh:mm>
+     <DOW>: <h>-<hh>
+
+    DOW beeing the day of the week: Mon, Tue, Wed, Thu, Fri, Sat, Sun
+    hh: 00-23
+    mm: 00-59
+
+    If time is omitted the current time is used: time.localtime()
+
+    :param time_range: The timerange
+    :type time_range: basestring
+    :param time: The time to check
+    :type time: datetime
+    :return: True, if time is within time_range.
+    """
+    return check_time_in_bitset(parse_time_range(time_range), check_time)
 
 
 def to_utf8(password):
@@ -452,6 +504,94 @@ def parse_proxy(proxy_settings):
     return proxy_dict
 
 
+class IPPrefixTree(object):
+    """
+    A binary prefix tree (radix tree) of IPv4 and IPv6 networks. Each
+    network is stored with a value. A lookup of an IP address walks the tree
+    once along the bits of the address and returns the values of all
+    networks, that contain the address.
+    """
+
+    def __init__(self):
+        # a node is a list [child for bit 0, child for bit 1, values]
+        self.roots = {4: [None, None, []],
+                      6: [None, None, []]}
+
+    def __len__(self):
+        return self._count(self.roots[4]) + self._count(self.roots[6])
+
+    def _count(self, node):
+        if node is None:
+            return 0
+        return len(node[2]) + self._count(node[0]) + self._count(node[1])
+
+    def insert(self, network, value):
+        """
+        Store the value for the network.
+
+        :param network: The network like "10.0.0.0/8" or a single IP address
+        :type network: basestring or IPNetwork
+        :param value: The value to be returned by lookup
+        """
+        network = IPNetwork(network)
+        width = 32 if network.version == 4 else 128
+        first = network.first
+        node = self.roots[network.version]
+        for i in range(network.prefixlen):
+            bit = (first >> (width - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, []]
+            node = node[bit]
+        node[2].append(value)
+
+    def lookup(self, ip):
+        """
+        Return the values of all networks, that contain the IP address,
+        starting with the shortest prefix.
+
+        :param ip: The IP address
+        :type ip: basestring or IPAddress
+        :return: list of values
+        """
+        ip = IPAddress(ip)
+        width = 32 if ip.version == 4 else 128
+        address = int(ip)
+        node = self.roots[ip.version]
+        values = list(node[2])
+        for i in range(width):
+            node = node[(address >> (width - 1 - i)) & 1]
+            if node is None:
+                break
+            values.extend(node[2])
+        return values
+
+
+# The parsed proxy settings. The key is the OverrideAuthorizationClient string
+PROXY_TREES = {}
+
+
+def get_proxy_tree(proxy_settings):
+    """
+    Return the OverrideAuthorizationClient setting as an IPPrefixTree, that
+    maps the proxy networks to the client networks. The tree is only built
+    once for each setting.
+
+    :param proxy_settings: The OverrideAuthorizationClient config string
+    :type proxy_settings: basestring
+    :return: IPPrefixTree
+    """
+    proxy_tree = PROXY_TREES.get(proxy_settings)
+    if proxy_tree is None:
+        proxy_tree = IPPrefixTree()
+        for proxynet, clientnet in parse_proxy(proxy_settings).items():
+            proxy_tree.insert(proxynet, clientnet)
+        if len(PROXY_TREES) > 20:
+            # The setting only changes rarely. Forget the old settings.
+            PROXY_TREES.clear()
+        PROXY_TREES[proxy_settings] = proxy_tree
+    return proxy_tree
+
+
 def check_proxy(proxy_ip, rewrite_ip, proxy_settings):
     """
     This function checks if the proxy_ip is allowed to rewrite the IP to
@@ -465,7 +605,7 @@ def check_proxy(proxy_ip, rewrite_ip, proxy_settings):
     :return:
     """
     try:
-        proxy_dict = parse_proxy(proxy_settings)
+        proxy_tree = get_proxy_tree(proxy_settings)
     except AddrFormatError:
         log.error("Error parsing the OverrideAuthorizationClient setting: {"
                   "0!s}! The IP addresses need to be comma separated. Fix "
@@ -473,9 +613,8 @@ def check_proxy(proxy_ip, rewrite_ip, proxy_settings):
         log.debug("{0!s}".format(traceback.format_exc()))
         return False
 
-    for proxynet, clientnet in proxy_dict.items():
-        if IPAddress(proxy_ip) in proxynet and IPAddress(rewrite_ip) in \
-                clientnet:
+    for clientnet in proxy_tree.lookup(proxy_ip):
+        if IPAddress(rewrite_ip) in clientnet:
             return True
 
     return False
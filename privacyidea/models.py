@@ -519,6 +519,7 @@ class Token(MethodsMixin, db.Model):
         for k, v in info.items():
             if k.endswith(".type"):
                 types[".".join(k.split(".")[:-1])] = v
+        self._info_cache = None
         for k, v in info.items():
             if not k.endswith(".type"):
                 TokenInfo(self.id, k, v,
@@ -533,6 +534,7 @@ class Token(MethodsMixin, db.Model):
         :param key: searches for the given key to delete the entry
         :return:
         """
+        self._info_cache = None
         if key:
             tokeninfos = TokenInfo.query.filter_by(token_id=self.id, Key=key)
         else:
@@ -542,15 +544,19 @@ class Token(MethodsMixin, db.Model):
 
     def get_info(self):
         """
+        The token info is read only once from the database and kept in the
+        token object, until it is written with set_info or del_info.
 
         :return: The token info as dictionary
         """
-        ret = {}
-        for ti in self.info_list:
-            if ti.Type:
-                ret[ti.Key + ".type"] = ti.Type
-            ret[ti.Key] = ti.Value
-        return ret
+        if getattr(self, "_info_cache", None) is None:
+            info = {}
+            for ti in self.info_list:
+                if ti.Type:
+                    info[ti.Key + ".type"] = ti.Type
+                info[ti.Key] = ti.Value
+            self._info_cache = info
+        return dict(self._info_cache)
 
     def update_type(self, typ):
         """
@@ -2244,8 +2250,17 @@ class Audit(MethodsMixin, db.Model):
     This class stores the Audit entries
     """
     __tablename__ = AUDIT_TABLE_NAME
+    # The indexes for the searches in the audit log, the counting of the
+    # authentications and the statistics.
+    __table_args__ = (db.Index('ix_pidea_audit_user_realm_date',
+                               'user', 'realm', 'date'),
+                      db.Index('ix_pidea_audit_serial_date',
+                               'serial', 'date'),
+                      db.Index('ix_pidea_audit_action_date',
+                               'action', 'date'),
+                      {})
     id = db.Column(db.Integer, primary_key=True, index=True)
-    date = db.Column(db.DateTime)
+    date = db.Column(db.DateTime, index=True)
     signature = db.Column(db.String(audit_column_length.get("signature")))
     action = db.Column(db.String(audit_column_length.get("action")))
     success = db.Column(db.Integer)
@@ -2298,3 +2313,36 @@ class Audit(MethodsMixin, db.Model):
         self.client = client
         self.loglevel = loglevel
         self.clearance_level = clearance_level
+
+
+class AuditStats(MethodsMixin, db.Model):
+    """
+    This class stores the number of audit entries per hour, action, success,
+    user, realm and serial. The statistics are created from these counts
+    instead of the audit entries.
+    """
+    __tablename__ = 'pidea_audit_stats'
+    __table_args__ = (db.UniqueConstraint('hour', 'action', 'success',
+                                          'user', 'realm', 'serial',
+                                          name='asix_1'), {})
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, index=True)
+    action = db.Column(db.String(audit_column_length.get("action")),
+                       default=u"")
+    success = db.Column(db.Integer, default=0)
+    user = db.Column(db.String(audit_column_length.get("user")), default=u"")
+    realm = db.Column(db.String(audit_column_length.get("realm")),
+                      default=u"")
+    serial = db.Column(db.String(audit_column_length.get("serial")),
+                       default=u"")
+    count = db.Column(db.Integer, default=0)
+
+    def __init__(self, hour, action="", success=0, user="", realm="",
+                 serial="", count=0):
+        self.hour = hour
+        self.action = action
+        self.success = success
+        self.user = user
+        self.realm = realm
+        self.serial = serial
+        self.count = count
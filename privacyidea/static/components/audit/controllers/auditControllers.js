@@ -52,20 +52,30 @@ myApp.controller("auditController", function (AuditFactory, $scope,
         });
     };
 
+    // Only append a wildcard, unless the user entered one, so that the
+    // database can use its indexes.
+    var filterValue = function (value) {
+        value = value || "";
+        if (value.indexOf("*") === -1) {
+            value = value + "*";
+        }
+        return value;
+    };
+
     $scope.getParams = function () {
-        $scope.params.serial = "*" + ($scope.serialFilter || "") + "*";
-        $scope.params.user = "*" + ($scope.userFilter || "") + "*";
-        $scope.params.administrator = "*" + ($scope.administratorFilter || "") + "*";
-        $scope.params.tokentype = "*" + ($scope.typeFilter || "") + "*";
-        $scope.params.action = "*" + ($scope.actionFilter || "") + "*";
-        $scope.params.success = "*" + ($scope.successFilter || "") + "*";
-        $scope.params.action_detail = "*" + ($scope.action_detailFilter || "") + "*";
-        $scope.params.realm = "*" + ($scope.realmFilter || "") + "*";
-        $scope.params.resolver = "*" + ($scope.resolverFilter || "") + "*";
-        $scope.params.client = "*" + ($scope.clientFilter || "") + "*";
-        $scope.params.privacyidea_server = "*" + ($scope.serverFilter || "") + "*";
-        $scope.params.info = "*" + ($scope.infoFilter || "") + "*";
-        $scope.params.date = "*" + ($scope.dateFilter || "") + "*";
+        $scope.params.serial = filterValue($scope.serialFilter);
+        $scope.params.user = filterValue($scope.userFilter);
+        $scope.params.administrator = filterValue($scope.administratorFilter);
+        $scope.params.tokentype = filterValue($scope.typeFilter);
+        $scope.params.action = filterValue($scope.actionFilter);
+        $scope.params.success = filterValue($scope.successFilter);
+        $scope.params.action_detail = filterValue($scope.action_detailFilter);
+        $scope.params.realm = filterValue($scope.realmFilter);
+        $scope.params.resolver = filterValue($scope.resolverFilter);
+        $scope.params.client = filterValue($scope.clientFilter);
+        $scope.params.privacyidea_server = filterValue($scope.serverFilter);
+        $scope.params.info = filterValue($scope.infoFilter);
+        $scope.params.date = filterValue($scope.dateFilter);
         console.log("Request Audit Trail with params");
         console.log($scope.params);
     };
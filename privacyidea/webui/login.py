@@ -34,7 +34,7 @@ from privacyidea.api.lib.prepolicy import is_remote_user_allowed
 from privacyidea.lib.passwordreset import is_password_reset
 from privacyidea.lib.error import HSMException
 from privacyidea.lib.realm import get_realms
-from privacyidea.lib.policy import PolicyClass, ACTION, SCOPE
+from privacyidea.lib.policy import get_policy_object, ACTION, SCOPE
 
 DEFAULT_THEME = "/static/contrib/css/bootstrap-theme.css"
 
@@ -72,7 +72,7 @@ def single_page_application():
     if not hasattr(request, "all_data"):
         request.all_data = {}
     # Depending on displaying the realm dropdown, we fill realms or not.
-    policy_object = PolicyClass()
+    policy_object = get_policy_object()
     realms = ""
     client_ip = request.access_route[0] if request.access_route else \
         request.remote_addr
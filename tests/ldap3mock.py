@@ -144,6 +144,9 @@ class Connection(object):
         import copy
         self.directory = copy.deepcopy(directory)
         self.bound = False
+        # The credentials, that are set after the connection is created
+        self.user = None
+        self.password = None
         self.extend = self.Extend(self)
 
         self.operation = {
@@ -163,6 +166,30 @@ class Connection(object):
         return
 
     def bind(self):
+        if self.user is not None:
+            return self._bind_as(self.user, self.password)
+        return self.bound
+
+    def _bind_as(self, user, password):
+        """
+        Bind the connection as another user
+        """
+        self.bound = False
+        # Reload the directory just in case a change has been made to
+        # user credentials by another connection
+        with open(DIRECTORY, 'r') as f:
+            self.directory = literal_eval(f.read())
+        if isinstance(password, unicode):
+            password = password.encode("utf-8")
+        for entry in self.directory:
+            if entry.get("dn") == user:
+                pw = entry.get("attributes").get("userPassword")
+                if isinstance(pw, unicode):
+                    pw = pw.encode("utf-8")
+                if pw == password:
+                    self.bound = True
+                elif pw.startswith(b'{SSHA}'):
+                    self.bound = Ldap3Mock._check_password(password, pw)
         return self.bound
 
     def add(self, dn, object_class=None, attributes=None):
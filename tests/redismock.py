@@ -100,6 +100,9 @@ class Redis(object):
         self.dictionary[key] = value
         return True
 
+    def delete(self, key):
+        return int(self.dictionary.pop(key, None) is not None)
+
     def set_data(self, data):
         self.dictionary = data
 
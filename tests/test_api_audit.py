@@ -1,4 +1,6 @@
+import gzip
 import json
+from StringIO import StringIO
 from .base import MyTestCase
 from privacyidea.lib.error import (ParameterError, ConfigAdminError)
 from urllib import urlencode
@@ -31,12 +33,59 @@ class APIAuditTestCase(MyTestCase):
             self.assertTrue("serial_plot" in json_response.get(
                 "result").get("value"), json_response.get("result"))
 
+    def test_02_get_audit_cursor(self):
+        with self.app.test_request_context('/audit/',
+                                           method='GET',
+                                           data={"cursor": "",
+                                                 "page_size": 1,
+                                                 "max_count": 1},
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            value = json.loads(res.data).get("result").get("value")
+            self.assertEqual(len(value.get("auditdata")), 1)
+            self.assertEqual(value.get("count"), "1+")
+            cursor = value.get("next")
+            self.assertEqual(cursor, value.get("auditdata")[0].get("number"))
+
+        with self.app.test_request_context('/audit/',
+                                           method='GET',
+                                           data={"cursor": cursor,
+                                                 "page_size": 1},
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            value = json.loads(res.data).get("result").get("value")
+            self.assertEqual(value.get("current"), cursor)
+            self.assertTrue(value.get("auditdata")[0].get("number") < cursor)
+
+        # An invalid cursor is a parameter error
+        with self.app.test_request_context('/audit/',
+                                           method='GET',
+                                           data={"cursor": "last"},
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertEqual(res.status_code, 400, res)
+
+    def test_03_download_audit(self):
+        with self.app.test_request_context('/audit/auditfile.csv',
+                                           method='GET',
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            self.assertTrue(res.mimetype == "text/csv", res.mimetype)
+            self.assertTrue(res.is_streamed)
+            self.assertEqual(res.headers.get("Content-Encoding"), None)
+            data = res.get_data()
+            self.assertTrue(data.startswith("number,date,sig_check"), data)
 
-    #def test_01_download_audit(self):
-    #    with self.app.test_request_context('/audit/auditfile.csv',
-    #                                       method='GET',
-    #                                       headers={'Authorization': self.at}):
-    #        res = self.app.full_dispatch_request()
-    #        self.assertTrue(res.status_code == 200, res)
-    #        self.assertTrue(res.mimetype == "text/csv", res.mimetype)
-    #        self.assertTrue(res.stream)
+        with self.app.test_request_context('/audit/auditfile.csv',
+                                           method='GET',
+                                           headers={'Authorization': self.at,
+                                                    'Accept-Encoding':
+                                                        'gzip, deflate'}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            self.assertEqual(res.headers.get("Content-Encoding"), "gzip")
+            data = gzip.GzipFile(fileobj=StringIO(res.get_data())).read()
+            self.assertTrue(data.startswith("number,date,sig_check"), data)
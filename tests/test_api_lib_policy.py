@@ -3,6 +3,8 @@ This test file tests the api.lib.policy.py
 
 The api.lib.policy.py depends on lib.policy and on flask!
 """
+import hashlib
+import hmac
 import json
 from .base import (MyTestCase, PWFILE)
 
@@ -28,7 +30,9 @@ from privacyidea.api.lib.postpolicy import (check_serial, check_tokentype,
                                             offline_info, sign_response,
                                             get_webui_settings,
                                             save_pin_change,
-                                            add_user_detail_to_response)
+                                            add_user_detail_to_response,
+                                            canonical_json)
+from privacyidea.api.lib.utils import send_result, send_stream_result
 from privacyidea.lib.token import (init_token, get_tokens, remove_token,
                                    set_realms, check_user_pass, unassign_token)
 from privacyidea.lib.user import User
@@ -1541,7 +1545,77 @@ class PostPolicyDecoratorTestCase(MyTestCase):
         new_response = sign_response(req, resp)
         jresult = json.loads(new_response.data)
         self.assertEqual(jresult.get("nonce"), "12345678")
-        self.assertEqual(jresult.get("signature"), "7220461805369685253863294214862525311437731987121534735993146952136348520396812489782945679627890785973634896605293523175424850299832912878523161817380029213546063467888018205435416020286712762804412024065559270543774578319469096483246637875013247101135063221604113204491121777932147776087110152414627230087278622508771143940031542890514380486863296102037208395371717795767683973979032142677315402422403254992482761563612174177151960004042109847122772813717599078313600692433727690239340230353616318691769042290314664126975201679642739717702497638318611217001361093950139025744740660953017413716736691777322916588328")
+        self.assertEqual(jresult.get("signature"), "11355158914966210201410734667484298031497086510917116878993822963793177737963323849914979806826759273431791474575057946263651613906587629736481370983420295626001055840803201448376203681672140726404056349423937599480275853513810616624349811159346536182220806878464577429106150903913526744093300868582898892977164229848617413618851794501457802670374543399415905458325601994002527427083792164898293507308423780001137468154518279116138010266341425663850327379848131113626641510715557748879427991785684858504631545256553961505159377600982900016536629720752767147086708626971940835730555782551222922985302674756190839458609")
+        # The signature is appended to the canonical serialization of the
+        # response
+        signature = jresult.pop("signature")
+        data = canonical_json(jresult)
+        self.assertEqual(new_response.data,
+                         '{0!s}, "signature": "{1!s}"}}'.format(data[:-1],
+                                                              signature))
+        self.assertTrue(g.sign_object.verify(data, signature))
+
+        # The result of send_result is not parsed again
+        req.all_data = {"nonce": "abc"}
+        with self.app.test_request_context():
+            resp = send_result(True)
+        content = resp.pi_content[0]
+        new_response = sign_response(req, resp)
+        self.assertEqual(content.get("nonce"), "abc")
+        jresult = json.loads(new_response.data)
+        self.assertEqual(jresult.get("result"), {"status": True,
+                                                 "value": True})
+        signature = jresult.pop("signature")
+        self.assertTrue(g.sign_object.verify(canonical_json(jresult),
+                                             signature))
+
+        # A modified response is parsed
+        with self.app.test_request_context():
+            resp = send_result(True)
+        resp.data = json.dumps({"result": {"status": True, "value": False}})
+        jresult = json.loads(sign_response(req, resp).data)
+        self.assertEqual(jresult.get("result").get("value"), False)
+
+        # Responses, which are no JSON, are not signed
+        resp = Response("serial, type\nHOTP1, hotp\n")
+        self.assertEqual(sign_response(req, resp).data,
+                         "serial, type\nHOTP1, hotp\n")
+
+        # Streamed JSON responses are signed as they are sent
+        with self.app.test_request_context():
+            resp = send_stream_result(iter([{"user": "a"}, {"user": "b"}]))
+            new_response = sign_response(req, resp)
+            self.assertTrue(new_response.is_streamed)
+            data = new_response.get_data()
+        jresult = json.loads(data)
+        self.assertEqual(jresult.get("nonce"), "abc")
+        self.assertEqual(jresult.get("result").get("value"),
+                         [{"user": "a"}, {"user": "b"}])
+        signature = jresult.get("signature")
+        signed_data = data.replace(', "signature": "{0!s}"'.format(signature),
+                                   "")
+        self.assertTrue(data.startswith('{"nonce": "abc", "jsonrpc"'), data)
+        self.assertTrue(g.sign_object.verify(signed_data, signature))
+        # Streamed responses, which are no JSON, are not signed
+        with self.app.test_request_context():
+            resp = Response(iter(["serial, type\n", "HOTP1, hotp\n"]),
+                            mimetype="text/csv")
+            new_response = sign_response(req, resp)
+            self.assertEqual(new_response.get_data(),
+                             "serial, type\nHOTP1, hotp\n")
+
+        # The response can be signed with HMAC
+        current_app.config["PI_RESPONSE_SIGN_ALGORITHM"] = "hmac"
+        current_app.config["PI_RESPONSE_SIGN_HMAC_KEY"] = "secret"
+        try:
+            resp = Response(json.dumps(res))
+            jresult = json.loads(sign_response(req, resp).data)
+            signature = jresult.pop("signature")
+            self.assertEqual(signature, hmac.new(
+                "secret", canonical_json(jresult), hashlib.sha256).hexdigest())
+        finally:
+            current_app.config.pop("PI_RESPONSE_SIGN_ALGORITHM")
+            current_app.config.pop("PI_RESPONSE_SIGN_HMAC_KEY")
 
     def test_08_get_webui_settings(self):
         # Test that a machine definition will return offline hashes
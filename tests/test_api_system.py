@@ -326,6 +326,22 @@ class APIConfigTestCase(MyTestCase):
             # The value is empty
             self.assertTrue(result["value"] == {}, result)
 
+        # Get the counters of the resolver object
+        with self.app.test_request_context('/resolver/resolver1/metrics',
+                                           method='GET',
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            result = json.loads(res.data).get("result")
+            self.assertTrue(result["status"] is True, result)
+            self.assertEqual(result["value"], {})
+
+        with self.app.test_request_context('/resolver/unknown/metrics',
+                                           method='GET',
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 400, res)
+
         # Get only editable resolvers
         with self.app.test_request_context('/resolver/',
                                            method='GET',
@@ -730,6 +746,16 @@ class APIConfigTestCase(MyTestCase):
             self.assertTrue("enrollHOTP" in admin_pol, admin_pol)
             self.assertTrue("enrollPW" in admin_pol, admin_pol)
 
+        # The hits and misses of the policy cache
+        with self.app.test_request_context('/policy/statistics',
+                                           method='GET',
+                                           headers={'Authorization': self.at}):
+            res = self.app.full_dispatch_request()
+            self.assertTrue(res.status_code == 200, res)
+            value = json.loads(res.data).get("result").get("value")
+            self.assertTrue(value.get("hits") >= 0, value)
+            self.assertTrue(value.get("misses") > 0, value)
+
     def test_14_enable_disable_policy(self):
         with self.app.test_request_context('/policy/pol2',
                                            method='GET',
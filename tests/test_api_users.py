@@ -2,9 +2,14 @@ from .base import MyTestCase
 import json
 from privacyidea.lib.resolver import (save_resolver)
 from privacyidea.lib.realm import (set_realm)
+from privacyidea.lib.resolvers.PasswdIdResolver import IdResolver
+from privacyidea.lib.crypto import Sign
 from urllib import urlencode
+import mock
+import time
 
 PWFILE = "tests/testdata/passwd"
+PWFILE2 = "tests/testdata/passwords"
 
 
 class APIUsersTestCase(MyTestCase):
@@ -209,3 +214,48 @@ class APIUsersTestCase(MyTestCase):
             self.assertTrue(res.status_code == 200, res)
             result = json.loads(res.data).get("result")
             self.assertTrue(result.get("value"))
+
+    def test_03_slow_resolver(self):
+        save_resolver({"resolver": "slow",
+                       "type": "passwdresolver",
+                       "fileName": PWFILE2})
+        (added, failed) = set_realm("slowrealm", ["r1", "slow"])
+        self.assertTrue(len(failed) == 0)
+        self.assertTrue(len(added) == 2)
+
+        getUserList = IdResolver.getUserList
+
+        def slow_getUserList(resolver, searchDict=None):
+            if resolver.fileName == PWFILE2:
+                time.sleep(1)
+            return getUserList(resolver, searchDict)
+
+        self.app.config["PI_USER_SEARCH_TIMEOUT"] = 0.3
+        with mock.patch.object(IdResolver, "getUserList", slow_getUserList):
+            with self.app.test_request_context('/user/',
+                                               query_string=urlencode(
+                                                   {"realm": "slowrealm"}),
+                                               method='GET',
+                                               headers={'Authorization':
+                                                            self.at}):
+                res = self.app.full_dispatch_request()
+                self.assertTrue(res.status_code == 200, res)
+                # The user list is streamed
+                self.assertTrue(res.is_streamed)
+                result = json.loads(res.data)
+                self.assertTrue(result.get("result").get("status"), res.data)
+                value = result.get("result").get("value")
+                self.assertTrue(len(value) > 0, res.data)
+                self.assertEqual(set(u.get("resolver") for u in value),
+                                 {"r1"})
+                failed_resolvers = result.get("detail").get(
+                    "failed_resolvers")
+                self.assertEqual(failed_resolvers, {"slow": "timeout"})
+                # The streamed user list is signed
+                signature = result.get("signature")
+                data = res.data.replace(
+                    ', "signature": "{0!s}"'.format(signature), "")
+                sign_object = Sign("tests/testdata/private.pem",
+                                   "tests/testdata/public.pem")
+                self.assertTrue(sign_object.verify(data, signature))
+        del self.app.config["PI_USER_SEARCH_TIMEOUT"]
@@ -4,7 +4,10 @@ import json
 from .base import MyTestCase
 from privacyidea.lib.user import (User)
 from privacyidea.lib.tokens.totptoken import HotpTokenClass
-from privacyidea.models import (Token)
+from privacyidea.models import (Token, db, PRIVACYIDEA_TIMESTAMP,
+                                Audit as AuditEntry)
+from privacyidea.lib.auditmodules.sqlaudit import (AUDIT_RESOURCES,
+                                                   get_audit_resources)
 from privacyidea.lib.config import (set_privacyidea_config, get_token_types,
                                     get_inc_fail_count_on_false_pin,
                                     delete_privacyidea_config)
@@ -15,7 +18,13 @@ from privacyidea.lib.error import TokenAdminError
 from privacyidea.lib.resolver import save_resolver, get_resolver_list
 from privacyidea.lib.realm import set_realm, set_default_realm
 
+from sqlalchemy import event
+from flask import g
+import logging
+import time
+
 import smtpmock, ldap3mock, responses
+log = logging.getLogger(__name__)
 
 
 PWFILE = "tests/testdata/passwords"
@@ -1400,3 +1409,92 @@ class ValidateAPITestCase(MyTestCase):
 
         remove_token(serial)
 
+
+    def test_25_sql_statements_per_check(self):
+        # Count the SQL statements of a single /validate/check request, so
+        # that additional queries per request are detected.
+        init_token({"serial": "SPASS_SQL", "type": "spass", "pin": "sqlpin"},
+                   user=User("cornelius", self.realm1))
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context,
+                            executemany):
+            statements.append((statement, parameters))
+
+        engine = db.get_engine(self.app)
+        event.listen(engine, "before_cursor_execute", count_statement)
+        try:
+            with self.app.test_request_context('/validate/check',
+                                               method='POST',
+                                               data={"user": "cornelius",
+                                                     "realm": self.realm1,
+                                                     "pass": "sqlpin"}):
+                res = self.app.full_dispatch_request()
+                self.assertTrue(res.status_code == 200, res)
+                result = json.loads(res.data).get("result")
+                self.assertTrue(result.get("value"))
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statement)
+
+        timestamp_queries = [s for s in statements
+                             if PRIVACYIDEA_TIMESTAMP in str(s[1])]
+        # The config timestamp is only read once for the config object and
+        # once for the policy object.
+        self.assertEqual(len(timestamp_queries), 2, timestamp_queries)
+        self.assertTrue(len(statements) <= 35, len(statements))
+        remove_token("SPASS_SQL")
+
+    def test_26_check_throughput(self):
+        # Measure the requests per second of /validate/check with the audit
+        # in the file based test database and in an SQLite memory database.
+        init_token({"serial": "SPASS_RPS", "type": "spass", "pin": "rpspin"},
+                   user=User("cornelius", self.realm1))
+        rounds = 30
+
+        def run_checks(fresh_resources=False):
+            engines = set()
+            start = time.time()
+            for _i in range(rounds):
+                if fresh_resources:
+                    # This is how it was before: each request creates its
+                    # own engine and reads the keys.
+                    AUDIT_RESOURCES.clear()
+                with self.app.test_request_context('/validate/check',
+                                                   method='POST',
+                                                   data={"user": "cornelius",
+                                                         "realm": self.realm1,
+                                                         "pass": "rpspin"}):
+                    res = self.app.full_dispatch_request()
+                    self.assertTrue(res.status_code == 200, res)
+                    result = json.loads(res.data).get("result")
+                    self.assertTrue(result.get("value"))
+                    engines.add(g.audit_object.engine)
+            return rounds / (time.time() - start), engines
+
+        fresh_rps, engines = run_checks(fresh_resources=True)
+        self.assertEqual(len(engines), rounds)
+        for engine in engines:
+            engine.dispose()
+        file_rps, engines = run_checks()
+        # All requests use the same engine
+        self.assertEqual(len(engines), 1)
+
+        # Audit to an SQLite memory database. This only works, since all
+        # requests share the engine.
+        self.app.config["PI_AUDIT_SQL_URI"] = "sqlite://"
+        try:
+            engine = get_audit_resources(self.app.config).engine
+            AuditEntry.__table__.create(engine)
+            memory_rps, engines = run_checks()
+            self.assertEqual(engines, set([engine]))
+            entries = engine.execute(AuditEntry.__table__.count()).scalar()
+            self.assertEqual(entries, rounds)
+        finally:
+            del self.app.config["PI_AUDIT_SQL_URI"]
+
+        log.info("/validate/check: {0:.1f} requests/s with engine per "
+                 "request, {1:.1f} requests/s with file database, {2:.1f} "
+                 "requests/s with memory database".format(fresh_rps,
+                                                          file_rps,
+                                                          memory_rps))
+        remove_token("SPASS_RPS")
@@ -6,10 +6,28 @@ This tests the files
 
 from .base import MyTestCase
 from privacyidea.lib.audit import getAudit, search
-from privacyidea.lib.auditmodules.sqlaudit import column_length
+from privacyidea.lib.error import ParameterError
+from privacyidea.lib.auditmodules.sqlaudit import (column_length,
+                                                   Audit, AuditWriter,
+                                                   CSV_COLUMNS, AuditArchive,
+                                                   rotate_audit_entries,
+                                                   AUDIT_RESOURCES,
+                                                   get_audit_resources,
+                                                   LogEntry)
+import csv
 import datetime
+import gzip
+import hashlib
+import json
+import mock
+import os
+import shutil
+import tempfile
 import time
+from StringIO import StringIO
+from Crypto.PublicKey import RSA
 from privacyidea.models import db
+from sqlalchemy import create_engine, event
 from privacyidea.app import create_app
 
 
@@ -161,6 +179,21 @@ class AuditTestCase(MyTestCase):
             self.assertTrue(type(audit_entry).__name__ in ["unicode", "str"],
                             type(audit_entry).__name__)
 
+        # The entries are returned in chunks and escaped by the csv module
+        self.Audit.log({"serial": "oath", "info": 'a "quoted", info'})
+        self.Audit.finalize_log()
+        chunks = list(self.Audit.csv_generator(param={"serial": "*a*"},
+                                               chunk_size=2))
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.reader(StringIO("".join(chunks))))
+        self.assertEqual(rows[0], CSV_COLUMNS)
+        self.assertEqual(len(rows), 6)
+        info = CSV_COLUMNS.index("info")
+        self.assertEqual(rows[5][info], 'a "quoted", info')
+        self.assertEqual(rows[5][CSV_COLUMNS.index("sig_check")], "OK")
+        self.assertEqual([r[CSV_COLUMNS.index("serial")] for r in rows[1:]],
+                         ["serial1", "serial1", "serial2", "oath", "oath"])
+
     def test_05_dataframe(self):
         self.Audit.log({"action": "action1",
                         "serial": "s2"})
@@ -193,3 +226,441 @@ class AuditTestCase(MyTestCase):
                          column_length.get("serial"))
         self.assertEqual(len(self.Audit.audit_data.get("token_type")),
                          column_length.get("token_type"))
+
+    def test_07_async_writer(self):
+        config = dict(self.app.config)
+        config["PI_AUDIT_ASYNC"] = True
+        config["PI_AUDIT_ASYNC_BATCH_SIZE"] = 5
+        config["PI_AUDIT_ASYNC_FLUSH_INTERVAL"] = 0.1
+        audit = getAudit(config)
+        writer = audit.writer
+        self.assertTrue(isinstance(writer, AuditWriter))
+        statements = []
+
+        def count_statements(conn, cursor, statement, parameters, context,
+                             executemany):
+            if statement.split()[0].upper() == "INSERT":
+                statements.append(executemany)
+
+        event.listen(audit.engine, "before_cursor_execute", count_statements)
+        try:
+            for i in range(12):
+                audit.log({"action": "async",
+                           "serial": "async{0!s}".format(i)})
+                audit.finalize_log()
+            writer.flush()
+        finally:
+            event.remove(audit.engine, "before_cursor_execute",
+                         count_statements)
+        self.assertEqual(writer.written, 12)
+        # The batches are written with multi-row INSERTs
+        self.assertTrue(len(statements) < 12, statements)
+        self.assertTrue(any(statements), statements)
+        self.assertEqual(self.Audit.get_total({"action": "async"}), 12)
+        # The entries are signed
+        entries = self.Audit.search({"action": "async"}, page_size=20)
+        self.assertEqual(len(entries.auditdata), 12)
+        for entry in entries.auditdata:
+            self.assertEqual(entry.get("sig_check"), "OK")
+
+        # The remaining entries are written, when the writer is stopped
+        audit.log({"action": "async", "serial": "last"})
+        audit.finalize_log()
+        writer.stop()
+        self.assertEqual(self.Audit.get_total({"action": "async"}), 13)
+
+        # After the writer is stopped, the entries are written synchronously
+        self.assertFalse(writer.put({"action": "async"}))
+        audit.log({"action": "async", "serial": "stopped"})
+        audit.finalize_log()
+        self.assertEqual(self.Audit.get_total({"action": "async"}), 14)
+        AUDIT_RESOURCES.clear()
+
+    def test_08_async_writer_queue_full(self):
+        # A writer with a full queue, which is not running
+        writer = AuditWriter(get_audit_resources(self.app.config),
+                             queue_size=1)
+        self.assertTrue(writer.put({"action": "queued"}))
+        self.assertFalse(writer.put({"action": "queued"}))
+
+        # The audit object writes synchronously, if the queue is full
+        audit = getAudit(self.app.config)
+        audit.writer = writer
+        audit.log({"action": "sync"})
+        audit.finalize_log()
+        self.assertEqual(self.Audit.get_total({"action": "sync"}), 1)
+        self.assertEqual(self.Audit.get_total({"action": "queued"}), 0)
+
+        # stopping writes the queued entry
+        writer.stop()
+        self.assertEqual(self.Audit.get_total({"action": "queued"}), 1)
+        self.assertEqual(writer.written, 1)
+
+        # The queued entry is dated at the end of the request, not when it
+        # is written
+        writer = AuditWriter(get_audit_resources(self.app.config))
+        audit.writer = writer
+        audit.log({"action": "delayed"})
+        audit.finalize_log()
+        finalized = datetime.datetime.now()
+        time.sleep(1.1)
+        writer.stop()
+        le = self.Audit.session.query(LogEntry).filter(
+            LogEntry.action == "delayed").one()
+        self.assertTrue(le.date <= finalized, (le.date, finalized))
+
+    def test_08b_async_writer_failed_batch(self):
+        resources = get_audit_resources(self.app.config)
+        writer = AuditWriter(resources)
+        statements = []
+
+        def fail_insert(conn, cursor, statement, parameters, context,
+                        executemany):
+            if statement.split()[0].upper() == "INSERT":
+                statements.append(executemany)
+                if executemany or "broken" in parameters:
+                    raise Exception("Insert failed")
+
+        writer.put({"action": "batch", "serial": "ok1"})
+        writer.put({"action": "batch", "serial": "broken"})
+        writer.put({"action": "batch", "serial": "ok2"})
+        event.listen(resources.engine, "before_cursor_execute", fail_insert)
+        try:
+            writer.stop()
+        finally:
+            event.remove(resources.engine, "before_cursor_execute",
+                         fail_insert)
+        # The failed batch is written row by row
+        self.assertEqual(statements, [True, False, False, False])
+        self.assertEqual(writer.written, 2)
+        self.assertEqual(writer.dropped, 1)
+        self.assertEqual(self.Audit.get_total({"action": "batch"}), 2)
+        self.assertEqual(self.Audit.get_total({"serial": "broken"}), 0)
+
+    def test_09_signature_before_insert(self):
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement.split()[0].upper())
+
+        event.listen(self.Audit.engine, "before_cursor_execute",
+                     count_statements)
+        try:
+            self.Audit.log({"action": "signed", "serial": "s1"})
+            self.Audit.finalize_log()
+            self.Audit.log({"action": "signed", "serial": "s2"})
+            self.Audit.finalize_log()
+        finally:
+            event.remove(self.Audit.engine, "before_cursor_execute",
+                         count_statements)
+        # One INSERT per entry and no UPDATE of the signature
+        self.assertEqual(statements, ["INSERT", "INSERT"])
+
+        entries = self.Audit.session.query(LogEntry).filter(
+            LogEntry.action == "signed").order_by(LogEntry.id).all()
+        self.assertEqual(len(entries), 2)
+        p1 = entries[0].signature.split(":")
+        p2 = entries[1].signature.split(":")
+        self.assertEqual(p1[0], "v2")
+        # same process, next sequence number
+        self.assertEqual(p1[1], p2[1])
+        self.assertEqual(int(p2[2]), int(p1[2]) + 1)
+        # the second entry contains the hash of the first entry
+        s1 = self.Audit._log_to_string(entries[0],
+                                       prefix=":".join(p1[:4]))
+        self.assertEqual(p2[3], hashlib.sha256(s1).hexdigest()[:32])
+        for le in entries:
+            self.assertTrue(self.Audit._verify_signature(le))
+        self.Audit.session.close()
+
+        # A modified entry fails
+        le = self.Audit.session.query(LogEntry).filter(
+            LogEntry.serial == "s2").first()
+        le.action = "modified"
+        self.Audit.session.commit()
+        result = self.Audit.search({"serial": "s*"})
+        checks = dict((e.get("serial"), e.get("sig_check"))
+                      for e in result.auditdata)
+        self.assertEqual(checks, {"s1": "OK", "s2": "FAIL"})
+
+    def test_10_legacy_signature(self):
+        # An entry, that was signed with the database id
+        le = LogEntry(action="legacy", serial="legacy1")
+        self.Audit.session.add(le)
+        self.Audit.session.commit()
+        le.signature = self.Audit.sign_object.sign(
+            self.Audit._log_to_string(le))
+        self.Audit.session.merge(le)
+        self.Audit.session.commit()
+        self.assertFalse(le.signature.startswith("v2:"))
+
+        result = self.Audit.search({"action": "legacy"})
+        self.assertEqual(result.auditdata[0].get("sig_check"), "OK")
+
+        # A changed id fails
+        le = self.Audit.session.query(LogEntry).filter(
+            LogEntry.action == "legacy").first()
+        le.id += 1000
+        self.Audit.session.commit()
+        result = self.Audit.search({"action": "legacy"})
+        self.assertEqual(result.auditdata[0].get("sig_check"), "FAIL")
+
+    def test_11_search_uses_indexes(self):
+        engine = create_engine("sqlite://")
+        LogEntry.__table__.create(engine)
+
+        def query_plan(search_dict, timelimit=None):
+            condition = Audit._create_filter(search_dict, timelimit=timelimit)
+            statement = self.Audit.session.query(LogEntry).filter(
+                condition).statement.compile(engine)
+            params = [statement.params[k] for k in statement.positiontup]
+            plan = engine.execute("EXPLAIN QUERY PLAN {0!s}".format(
+                statement), params).fetchall()
+            return " ".join([row[len(row) - 1] for row in plan])
+
+        # Values without wildcard are compared directly
+        plan = query_plan({"user": "cornelius", "realm": "realm1"})
+        self.assertTrue("USING INDEX ix_pidea_audit_user_realm_date" in plan,
+                        plan)
+        plan = query_plan({"serial": "OATH0001"},
+                          timelimit=datetime.timedelta(days=1))
+        self.assertTrue("USING INDEX ix_pidea_audit_serial_date" in plan, plan)
+        plan = query_plan({"action": "POST /validate/check"})
+        self.assertTrue("USING INDEX ix_pidea_audit_action_date" in plan, plan)
+        plan = query_plan({}, timelimit=datetime.timedelta(days=1))
+        self.assertTrue("USING INDEX ix_pidea_audit_date" in plan, plan)
+        # A leading wildcard needs to scan the table
+        plan = query_plan({"serial": "*0001"})
+        self.assertFalse("USING INDEX" in plan, plan)
+
+    def test_12_cursor_pagination(self):
+        for i in range(7):
+            self.Audit.log({"action": "cursor",
+                            "serial": "cursor{0!s}".format(i)})
+            self.Audit.finalize_log()
+
+        # The first page in the cursor mode
+        res = self.Audit.search({"action": "cursor"}, page_size=3,
+                                sortorder="desc", cursor="")
+        self.assertEqual(res.total, 7)
+        self.assertEqual([e.get("serial") for e in res.auditdata],
+                         ["cursor6", "cursor5", "cursor4"])
+        self.assertEqual(res.next, res.auditdata[-1].get("number"))
+        self.assertEqual(res.prev, None)
+        # the next pages
+        res = self.Audit.search({"action": "cursor"}, page_size=3,
+                                sortorder="desc", cursor=res.next)
+        self.assertEqual([e.get("serial") for e in res.auditdata],
+                         ["cursor3", "cursor2", "cursor1"])
+        res = self.Audit.search({"action": "cursor"}, page_size=3,
+                                sortorder="desc", cursor=res.next)
+        self.assertEqual([e.get("serial") for e in res.auditdata],
+                         ["cursor0"])
+        self.assertEqual(res.next, None)
+
+        # ascending order
+        res = self.Audit.search({"action": "cursor"}, page_size=4,
+                                sortorder="asc", cursor="")
+        self.assertEqual(len(res.auditdata), 4)
+        res = self.Audit.search({"action": "cursor"}, page_size=4,
+                                sortorder="asc", cursor=res.next)
+        self.assertEqual([e.get("serial") for e in res.auditdata],
+                         ["cursor4", "cursor5", "cursor6"])
+        self.assertEqual(res.next, None)
+
+        # The pages of the page mode are the same
+        res = self.Audit.search({"action": "cursor"}, page_size=3,
+                                sortorder="desc", page=2)
+        self.assertEqual([e.get("serial") for e in res.auditdata],
+                         ["cursor3", "cursor2", "cursor1"])
+        self.assertEqual(res.next, 3)
+        self.assertEqual(res.prev, 1)
+
+    def test_13_capped_count(self):
+        for i in range(5):
+            self.Audit.log({"action": "capped"})
+            self.Audit.finalize_log()
+        self.assertEqual(self.Audit.get_total({"action": "capped"},
+                                              max_count=10), 5)
+        self.assertEqual(self.Audit.get_total({"action": "capped"},
+                                              max_count=5), 5)
+        self.assertEqual(self.Audit.get_total({"action": "capped"},
+                                              max_count=3), "3+")
+
+        # The page mode still knows, that there is a next page
+        res = search(self.app.config, {"action": "capped", "page_size": 3,
+                                       "max_count": 3})
+        self.assertEqual(res.get("count"), "3+")
+        self.assertEqual(res.get("next"), 2)
+        res = search(self.app.config, {"action": "capped", "page_size": 3,
+                                       "cursor": ""})
+        self.assertEqual(res.get("count"), 5)
+        self.assertEqual(len(res.get("auditdata")), 3)
+        res = search(self.app.config, {"action": "capped", "page_size": 3,
+                                       "cursor": res.get("next")})
+        self.assertEqual(len(res.get("auditdata")), 2)
+        self.assertEqual(res.get("next"), None)
+
+        # The maximum count can be configured
+        config = dict(self.app.config)
+        config["PI_AUDIT_SEARCH_MAX_COUNT"] = 2
+        res = getAudit(config).search({"action": "capped"})
+        self.assertEqual(res.total, "2+")
+
+        # 0 counts all entries
+        self.assertEqual(self.Audit.get_total({"action": "capped"},
+                                              max_count="0"), 5)
+        # The cursor mode counts a limited number of entries by default
+        with mock.patch("privacyidea.lib.auditmodules.sqlaudit."
+                        "CURSOR_MAX_COUNT", 3):
+            res = self.Audit.search({"action": "capped"}, cursor="")
+            self.assertEqual(res.total, "3+")
+            res = self.Audit.search({"action": "capped"}, cursor="",
+                                    max_count=0)
+            self.assertEqual(res.total, 5)
+
+        # Invalid parameters
+        self.assertRaises(ParameterError, self.Audit.get_total,
+                          {"action": "capped"}, max_count="many")
+        self.assertRaises(ParameterError, self.Audit.get_total,
+                          {"action": "capped"}, max_count=-1)
+        self.assertRaises(ParameterError, self.Audit.search,
+                          {"action": "capped"}, cursor="last")
+
+    def test_14_rotate_audit(self):
+        for i in range(10):
+            self.Audit.log({"action": "rotate", "serial": "rot{0!s}".format(i)})
+            self.Audit.finalize_log()
+        session = self.Audit.session
+        ids = [row[0] for row in session.query(LogEntry.id).order_by(
+            LogEntry.id)]
+        # The first three entries are old
+        session.query(LogEntry).filter(LogEntry.id <= ids[2]).update(
+            {"date": datetime.datetime.now() - datetime.timedelta(days=100)},
+            synchronize_session=False)
+        session.commit()
+
+        progress = []
+        archive = AuditArchive("tests/testdata/audit-archive.jsonl.gz")
+        try:
+            deleted = rotate_audit_entries(
+                session, cut_date=datetime.datetime.now() -
+                datetime.timedelta(days=90),
+                batch_size=2, archive=archive,
+                progress=lambda d, s: progress.append(d))
+            archive.close()
+            self.assertEqual(deleted, 3)
+            self.assertEqual(progress, [2, 3])
+            self.assertEqual(archive.written, 3)
+            lines = gzip.open(archive.filename).read().splitlines()
+            entries = [json.loads(line) for line in lines]
+            self.assertEqual([e.get("serial") for e in entries],
+                             ["rot0", "rot1", "rot2"])
+            self.assertTrue(entries[0].get("signature").startswith("v2:"))
+        finally:
+            os.remove(archive.filename)
+        self.assertEqual(self.Audit.get_total({"action": "rotate"}), 7)
+
+        # delete by id in batches, which fit exactly
+        archive = AuditArchive("tests/testdata/audit-archive.csv")
+        try:
+            deleted = rotate_audit_entries(session, cut_id=ids[7],
+                                           batch_size=2, sleep=0.01,
+                                           archive=archive)
+            archive.close()
+            self.assertEqual(deleted, 4)
+            rows = list(csv.reader(open(archive.filename)))
+            self.assertEqual(rows[0][0], "id")
+            self.assertEqual([r[rows[0].index("serial")] for r in rows[1:]],
+                             ["rot3", "rot4", "rot5", "rot6"])
+        finally:
+            os.remove(archive.filename)
+        self.assertEqual(self.Audit.get_total({"action": "rotate"}), 3)
+
+        # Without a condition nothing is deleted
+        self.assertEqual(rotate_audit_entries(session), 0)
+        self.assertEqual(rotate_audit_entries(session, cut_id=ids[7]), 0)
+        self.assertEqual(self.Audit.get_total({"action": "rotate"}), 3)
+        self.assertRaises(ValueError, AuditArchive, "archive.txt", "xml")
+
+    def test_15_key_rotation(self):
+        tmpdir = tempfile.mkdtemp()
+        private = os.path.join(tmpdir, "private.pem")
+        public = os.path.join(tmpdir, "public.pem")
+        shutil.copy(self.app.config.get("PI_AUDIT_KEY_PRIVATE"), private)
+        shutil.copy(self.app.config.get("PI_AUDIT_KEY_PUBLIC"), public)
+        config = dict(self.app.config)
+        config["PI_AUDIT_KEY_PRIVATE"] = private
+        config["PI_AUDIT_KEY_PUBLIC"] = public
+        try:
+            audit = getAudit(config)
+            audit.log({"action": "rotatekey", "serial": "key1"})
+            audit.finalize_log()
+
+            # The administrator replaces the keys
+            key = RSA.generate(1024)
+            with open(private, "w") as f:
+                f.write(key.exportKey())
+            with open(public, "w") as f:
+                f.write(key.publickey().exportKey())
+            # make sure, that the modification time changes
+            mtime = time.time() + 10
+            os.utime(private, (mtime, mtime))
+            os.utime(public, (mtime, mtime))
+
+            audit = getAudit(config)
+            audit.log({"action": "rotatekey", "serial": "key2"})
+            audit.finalize_log()
+            entries = audit.session.query(LogEntry).filter(
+                LogEntry.action == "rotatekey").order_by(LogEntry.id).all()
+            self.assertEqual(len(entries), 2)
+            # The new entry is signed with the new key
+            self.assertTrue(audit._verify_signature(entries[1]))
+            self.assertFalse(audit._verify_signature(entries[0]))
+            audit.session.close()
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_16_signature_chain(self):
+        audit = getAudit(self.app.config)
+        for i in range(3):
+            audit.log({"action": "chained", "serial": "chain{0!s}".format(i)})
+            audit.finalize_log()
+        entries = audit.session.query(LogEntry).filter(
+            LogEntry.action == "chained").order_by(LogEntry.id).all()
+        self.assertEqual(len(entries), 3)
+        for le in entries:
+            # The signed date does not contain microseconds
+            self.assertEqual(le.date.microsecond, 0)
+            self.assertTrue(audit._verify_signature(le))
+        # The previous entries of the process may have been deleted by the
+        # other tests, so we start with the second entry.
+        # In ascending order the previous entry is known
+        audit = getAudit(self.app.config)
+        audit._check_chain(entries[0])
+        with mock.patch.object(audit.session, "query") as mock_query:
+            self.assertTrue(audit._check_chain(entries[1]))
+            self.assertTrue(audit._check_chain(entries[2]))
+            self.assertEqual(mock_query.call_count, 0)
+        # in descending order the previous entry is read
+        audit = getAudit(self.app.config)
+        self.assertTrue(audit._check_chain(entries[2]))
+        self.assertTrue(audit._check_chain(entries[1]))
+
+        # A deleted entry is detected by the next entry of the process
+        audit.session.query(LogEntry).filter(
+            LogEntry.id == entries[1].id).delete()
+        audit.session.commit()
+        audit = getAudit(self.app.config)
+        self.assertFalse(audit._check_chain(entries[2]))
+        # The chain is only checked on request
+        with mock.patch.object(audit, "_check_chain") as mock_check:
+            result = audit.search({"action": "chained"})
+            self.assertEqual(mock_check.call_count, 0)
+        self.assertEqual(len(result.auditdata), 2)
+        result = search(self.app.config, {"action": "chained",
+                                          "verify_chain": "1"})
+        checks = dict((e.get("serial"), e.get("missing_line"))
+                      for e in result.get("auditdata"))
+        self.assertEqual(checks.get("chain2"), "FAIL")
+        audit.session.close()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+This test file tests the lib/cache/lrucache.py
+"""
+from .base import MyTestCase
+from privacyidea.lib.cache.lrucache import (LRUCache, RedisBackend,
+                                            NOT_FOUND)
+import redismock
+import time
+
+
+class BrokenBackend(object):
+
+    def get(self, key):
+        raise Exception("Connection refused")
+
+    def setex(self, key, value, timeout):
+        raise Exception("Connection refused")
+
+    def delete(self, key):
+        raise Exception("Connection refused")
+
+
+class LRUCacheTestCase(MyTestCase):
+
+    def test_01_lru_eviction(self):
+        cache = LRUCache(size=2)
+        cache.set("a", 1, 60)
+        cache.set("b", 2, 60)
+        # read "a", so that "b" is the least recently used entry
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3, 60)
+        self.assertEqual(cache.get("b"), NOT_FOUND)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        metrics = cache.get_metrics()
+        self.assertEqual(metrics.get("size"), 2)
+        self.assertEqual(metrics.get("evictions"), 1)
+        self.assertEqual(metrics.get("hits"), 3)
+        self.assertEqual(metrics.get("misses"), 1)
+        self.assertEqual(metrics.get("hit_rate"), 0.75)
+
+    def test_02_timeout_and_negative_entries(self):
+        cache = LRUCache()
+        cache.set(("getUserId", "unknown"), "", 0.1)
+        cache.set(("getUserId", "alice"), "1000", 60)
+        self.assertEqual(cache.get(("getUserId", "unknown")), "")
+        self.assertEqual(cache.get_metrics().get("negative_hits"), 1)
+        time.sleep(0.2)
+        self.assertEqual(cache.get(("getUserId", "unknown")), NOT_FOUND)
+        self.assertEqual(cache.get(("getUserId", "alice")), "1000")
+        metrics = cache.get_metrics()
+        self.assertEqual(metrics.get("expired"), 1)
+        self.assertEqual(metrics.get("size"), 1)
+        cache.delete(("getUserId", "alice"))
+        self.assertEqual(cache.get(("getUserId", "alice")), NOT_FOUND)
+        cache.set("x", 1, 60)
+        cache.clear()
+        self.assertEqual(cache.get_metrics().get("size"), 0)
+
+    @redismock.activate
+    def test_03_shared_backend(self):
+        redismock.set_data({})
+        # Two processes with their own local cache
+        cache1 = LRUCache(shared=RedisBackend("localhost"), namespace="r1")
+        cache2 = LRUCache(shared=RedisBackend("localhost"), namespace="r1")
+        other = LRUCache(shared=RedisBackend("localhost"), namespace="r2")
+        cache1.set(("getUserInfo", u"uid=ünicode"), {"username": "hans"}, 60)
+        self.assertEqual(cache2.get(("getUserInfo", u"uid=ünicode")),
+                         {"username": "hans"})
+        self.assertEqual(cache2.get_metrics().get("shared_hits"), 1)
+        # now the entry is also contained in the local cache
+        self.assertEqual(cache2.get(("getUserInfo", u"uid=ünicode")),
+                         {"username": "hans"})
+        self.assertEqual(cache2.get_metrics().get("hits"), 1)
+        # The namespaces are separated
+        self.assertEqual(other.get(("getUserInfo", u"uid=ünicode")),
+                         NOT_FOUND)
+
+        cache1.delete(("getUserInfo", u"uid=ünicode"))
+        cache2.clear()
+        self.assertEqual(cache2.get(("getUserInfo", u"uid=ünicode")),
+                         NOT_FOUND)
+
+    def test_04_broken_backend(self):
+        cache = LRUCache(shared=BrokenBackend())
+        cache.set("a", 1, 60)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("b"), NOT_FOUND)
+        cache.delete("a")
+        self.assertEqual(cache.get_metrics().get("shared_errors"), 3)
@@ -18,13 +18,21 @@ from privacyidea.lib.config import (get_resolver_list,
                                     get_token_class_dict,
                                     get_token_types,
                                     get_token_classes, get_token_prefix,
-                                    get_machine_resolver_class_dict
+                                    get_machine_resolver_class_dict,
+                                    ConfigClass, ConfigSnapshot, SYSCONF,
+                                    TokenClassRegistry,
+                                    build_token_class_registry,
+                                    get_token_class_registry,
+                                    get_token_class,
+                                    get_config_object
                                     )
 from privacyidea.lib.resolvers.PasswdIdResolver import IdResolver as PWResolver
 from privacyidea.lib.tokens.hotptoken import HotpTokenClass
 from privacyidea.lib.tokens.totptoken import TotpTokenClass
-from flask import current_app
+from privacyidea.lib.crypto import decryptPassword
+from flask import current_app, g
 import importlib
+import mock
 
 
 class ConfigTestCase(MyTestCase):
@@ -228,3 +236,123 @@ class ConfigTestCase(MyTestCase):
         self.assertTrue("secretInfo1" not in a)
         a = get_from_config("secretInfo1", role="public")
         self.assertEqual(a, None)
+
+    def test_07_config_snapshot(self):
+        set_privacyidea_config("snapBool", "true")
+        set_privacyidea_config("snapInt", "0")
+        set_privacyidea_config("snapSecret", "geheim", typ="password")
+        set_privacyidea_config("snapPublic", "1", typ="public")
+
+        config_object = ConfigClass()
+        admin = config_object.snapshots.get("admin")
+        public = config_object.snapshots.get("public")
+        self.assertTrue(isinstance(admin, ConfigSnapshot))
+        self.assertTrue("snapSecret" in admin)
+        self.assertFalse("snapSecret" in public)
+        self.assertTrue("snapPublic" in public)
+
+        # boolean values are precomputed
+        self.assertTrue(get_from_config("snapBool", return_bool=True) is True)
+        self.assertTrue(get_from_config("snapInt", return_bool=True) is False)
+        self.assertTrue(get_from_config("snapPublic", role="public",
+                                        return_bool=True) is True)
+        self.assertTrue(get_from_config("doesNotExist", default=False,
+                                        return_bool=True) is False)
+        # The default true keys are also available
+        self.assertTrue(get_from_config(SYSCONF.SPLITATSIGN,
+                                        return_bool=True))
+
+        # the password is only decrypted when it is accessed
+        admin = ConfigSnapshot(config_object.config, role="admin")
+        self.assertFalse("snapSecret" in admin._decrypted)
+        self.assertEqual(admin.get("snapSecret"), "geheim")
+        self.assertEqual(admin._decrypted.get("snapSecret"), "geheim")
+        self.assertEqual(get_from_config("snapSecret"), "geheim")
+
+        # the complete config is a new dictionary
+        conf = get_from_config()
+        conf["snapBool"] = "false"
+        self.assertEqual(get_from_config("snapBool"), "true")
+
+        # A changed value is visible after the reload
+        set_privacyidea_config("snapBool", "false")
+        self.assertTrue(get_from_config("snapBool", return_bool=True) is False)
+
+        for k in ["snapBool", "snapInt", "snapSecret", "snapPublic"]:
+            delete_privacyidea_config(k)
+
+    def test_08_lookup_decryptions(self):
+        # Before, every lookup built the complete config and decrypted all
+        # passwords. Now a lookup only decrypts the requested password once.
+        for i in range(20):
+            set_privacyidea_config("benchSecret{0!s}".format(i), "secret",
+                                   typ="password")
+            set_privacyidea_config("benchValue{0!s}".format(i), "True")
+        config_object = ConfigClass()
+        rounds = 200
+
+        with mock.patch("privacyidea.lib.config.decryptPassword",
+                        wraps=decryptPassword) as mock_decrypt:
+            for _i in range(rounds):
+                config_object.get_config("benchValue1", return_bool=True)
+            self.assertEqual(mock_decrypt.call_count, 0)
+
+            for _i in range(rounds):
+                self.assertEqual(config_object.get_config("benchSecret1"),
+                                 "secret")
+            self.assertEqual(mock_decrypt.call_count, 1)
+
+            # The complete config decrypts each remaining password once
+            config_object.get_config()
+            decryptions = mock_decrypt.call_count
+            self.assertTrue(decryptions >= 20)
+            config_object.get_config()
+            self.assertEqual(mock_decrypt.call_count, decryptions)
+
+        for i in range(20):
+            delete_privacyidea_config("benchSecret{0!s}".format(i))
+            delete_privacyidea_config("benchValue{0!s}".format(i))
+
+    def test_09_token_class_registry(self):
+        # The registry is built at the start of the app
+        self.assertTrue("pi_token_registry" in current_app.config)
+        registry = get_token_class_registry()
+        self.assertTrue(isinstance(registry, TokenClassRegistry))
+        self.assertTrue(registry is get_token_class_registry())
+
+        self.assertEqual(registry.get("HOTP"), HotpTokenClass)
+        self.assertEqual(registry.get("totp"), TotpTokenClass)
+        # hmac is an alias for hotp
+        self.assertEqual(registry.get("hmac"), HotpTokenClass)
+        self.assertEqual(registry.get("unknown"), None)
+        self.assertTrue("hotp" in registry)
+        self.assertFalse("unknown" in registry)
+        self.assertTrue("totp" in registry.types())
+        self.assertTrue(TotpTokenClass in registry.classes())
+        self.assertEqual(len(registry.types()), len(registry.classes()))
+
+        self.assertEqual(get_token_class("totp"), TotpTokenClass)
+        self.assertEqual(set(registry.types()), set(get_token_types()))
+
+        # A token type is only registered once
+        registry = TokenClassRegistry([HotpTokenClass, TotpTokenClass,
+                                       HotpTokenClass])
+        self.assertEqual(registry.types(), ["hotp", "totp"])
+
+        # A rebuilt registry contains the same token types
+        registry = build_token_class_registry()
+        self.assertEqual(set(registry.types()),
+                         set(get_token_class_registry().types()))
+
+    def test_10_unpin_on_config_change(self):
+        config_object = get_config_object()
+        self.assertTrue(config_object is get_config_object())
+        # Writing the config releases the pinned objects
+        set_privacyidea_config("pinnedKey", "1")
+        self.assertFalse("config_object" in g.pinned_objects)
+        self.assertEqual(get_from_config("pinnedKey"), "1")
+        # also, if the timestamp does not change within the same second
+        set_privacyidea_config("pinnedKey", "2")
+        self.assertFalse("config_object" in g.pinned_objects)
+        self.assertEqual(get_from_config("pinnedKey"), "2")
+        delete_privacyidea_config("pinnedKey")
@@ -8,12 +8,21 @@ from privacyidea.lib.crypto import (encryptPin, encryptPassword, decryptPin,
                                     decryptPassword, urandom,
                                     get_rand_digit_str, geturandom,
                                     get_alphanum_str,
-                                    hash_with_pepper, verify_with_pepper)
+                                    hash_with_pepper, verify_with_pepper,
+                                    Sign, RSA_KEY_CACHE)
 from privacyidea.lib.security.default import (SecurityModule,
                                               DefaultSecurityModule)
+from Crypto.PublicKey import RSA
+import mock
+import os
+import shutil
+import tempfile
 
 from flask import current_app
 
+PUBLIC = "tests/testdata/public.pem"
+PRIVATE = "tests/testdata/private.pem"
+
 
 class SecurityModuleTestCase(MyTestCase):
     """
@@ -201,3 +210,58 @@ class RandomTestCase(MyTestCase):
 
         r = verify_with_pepper(h, "super Password")
         self.assertEqual(r, False)
+
+
+class SignObjectTestCase(MyTestCase):
+    """
+    Test the Sign object and the cache of the RSA keys
+    """
+
+    def test_00_cached_keys(self):
+        RSA_KEY_CACHE.clear()
+        sign1 = Sign(PRIVATE, PUBLIC)
+        sign2 = Sign(PRIVATE, PUBLIC)
+        # The keys are only parsed once
+        self.assertEqual(len(RSA_KEY_CACHE), 2)
+        self.assertTrue(sign1.private_key is sign2.private_key)
+        self.assertTrue(sign1.public_key is sign2.public_key)
+
+        signature = sign1.sign("hallo")
+        self.assertTrue(sign2.verify("hallo", signature))
+        self.assertFalse(sign2.verify("hello", signature))
+
+        # A modified key file is read again
+        tmpdir = tempfile.mkdtemp()
+        private_file = os.path.join(tmpdir, "private-copy.pem")
+        shutil.copy(PRIVATE, private_file)
+        try:
+            sign3 = Sign(private_file, PUBLIC)
+            old_key = sign3.private_key
+            mtime = os.stat(private_file).st_mtime
+            os.utime(private_file, (mtime + 10, mtime + 10))
+            sign4 = Sign(private_file, PUBLIC)
+            self.assertFalse(sign4.private_key is old_key)
+            self.assertTrue(sign4.verify("hallo", sign4.sign("hallo")))
+            # Only the current version of the file is cached
+            self.assertEqual(len([k for k in RSA_KEY_CACHE
+                                  if k[0] == private_file]), 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
+        # Missing files still raise an error
+        self.assertRaises(IOError, Sign, "tests/testdata/missing.pem",
+                          PUBLIC)
+
+    def test_01_sign_verify_key_parsing(self):
+        RSA_KEY_CACHE.clear()
+        rounds = 100
+        messages = ["id={0!s},action=POST /validate/check".format(i)
+                    for i in range(rounds)]
+        with mock.patch.object(RSA, "importKey",
+                               wraps=RSA.importKey) as mock_parse:
+            for m in messages:
+                sign_object = Sign(PRIVATE, PUBLIC)
+                self.assertTrue(sign_object.verify(m, sign_object.sign(m)))
+            # Each key file is parsed once, all other reads are cache hits
+            self.assertEqual(mock_parse.call_count, 2)
+        self.assertEqual(len(RSA_KEY_CACHE), 2)
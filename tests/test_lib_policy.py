@@ -10,12 +10,19 @@ from privacyidea.lib.policy import (set_policy, delete_policy,
                                     get_static_policy_definitions,
                                     PolicyClass, SCOPE, enable_policy,
                                     PolicyError, ACTION, MAIN_MENU,
-                                    delete_all_policies)
+                                    delete_all_policies, PolicyIndex,
+                                    PolicyValueMatcher,
+                                    get_policy_cache_statistics,
+                                    get_policy_time)
 from privacyidea.lib.realm import (set_realm, delete_realm, get_realms)
 from privacyidea.lib.resolver import (save_resolver, get_resolver_list,
                                       delete_resolver)
 from privacyidea.lib.user import User
+from privacyidea.models import Policy, db, save_config_timestamp
+from netaddr import IPAddress, IPNetwork
 import datetime
+import logging
+log = logging.getLogger(__name__)
 PWFILE = "tests/testdata/passwords"
 
 
@@ -698,3 +705,171 @@ class PolicyTestCase(MyTestCase):
             rid = delete_resolver(reso)
             self.assertTrue(rid > 0, rid)
 
+
+    def test_22_policy_value_matcher(self):
+        P = PolicyClass()
+        cases = [(["v1", "v2"], "v1"),
+                 (["v1", "v2"], "v3"),
+                 (["v1", "*"], "v3"),
+                 (["v1", "-v2"], "v2"),
+                 (["v1", "!v2"], "v2"),
+                 (["v1", "v.*"], "v3"),
+                 (["v1", "r.*"], "v13"),
+                 (["user1"], "user1234"),
+                 (["reso1", "reso2"], ["reso2", "reso3"]),
+                 (["reso1", "*"], ["reso3"])]
+        for values, searchvalue in cases:
+            matcher = PolicyValueMatcher(values)
+            self.assertEqual(matcher.search(searchvalue),
+                             P._search_value(values, searchvalue),
+                             (values, searchvalue))
+
+        # The index only returns the policies for the requested action
+        index = PolicyIndex([{"name": "p1", "scope": SCOPE.AUTH,
+                              "action": {"otppin": "userstore"}},
+                             {"name": "p2", "scope": SCOPE.AUTH,
+                              "action": {"passthru": True}},
+                             {"name": "p3", "scope": SCOPE.AUTH,
+                              "action": {"pass.*": True}},
+                             {"name": "p4", "scope": SCOPE.ADMIN,
+                              "action": {"passthru": True}}])
+        names = [cpol.name for cpol in index.candidates(SCOPE.AUTH,
+                                                        "passthru")]
+        self.assertEqual(names, ["p2", "p3"])
+        names = [cpol.name for cpol in index.candidates(SCOPE.AUTH)]
+        self.assertEqual(names, ["p1", "p2", "p3"])
+        self.assertEqual(len(index.candidates()), 4)
+
+    def test_23_get_policies_benchmark(self):
+        # Compare the results and the time of the indexed get_policies with
+        # a linear search for 10, 100 and 1000 policies.
+        P = PolicyClass()
+
+        def linear_search(policies, scope, action, user, realm, client):
+            reduced = []
+            for pol in policies:
+                if pol.get("scope") != scope or not pol.get("active"):
+                    continue
+                matches = True
+                for key, value in [("action", action), ("user", user),
+                                   ("realm", realm)]:
+                    if pol.get(key):
+                        found, excluded = P._search_value(pol.get(key),
+                                                          value)
+                        matches = matches and found and not excluded
+                if matches:
+                    reduced.append(pol)
+            with_client = []
+            for pol in reduced:
+                found = False
+                excluded = False
+                for polclient in pol.get("client"):
+                    if polclient[0] in ["-", "!"]:
+                        if IPAddress(client) in IPNetwork(polclient[1:]):
+                            excluded = True
+                    elif IPAddress(client) in IPNetwork(polclient):
+                        found = True
+                if found and not excluded:
+                    with_client.append(pol)
+            return with_client + [pol for pol in reduced
+                                  if not pol.get("client")]
+
+        actions = [ACTION.OTPPIN, ACTION.PASSTHRU, ACTION.CHALLENGERESPONSE,
+                   ACTION.LASTAUTH, ACTION.PASSNOUSER]
+        filters = [("user{0!s}".format(u), "realm{0!s}".format(r),
+                    "10.{0!s}.{1!s}.1".format(r, u))
+                   for u in range(5) for r in range(3)]
+        for count in [10, 100, 1000]:
+            Policy.query.delete()
+            for i in range(count):
+                client = ""
+                if i % 3 == 0:
+                    client = "10.{0!s}.0.0/16, -10.{0!s}.{1!s}.1".format(
+                        i % 3, i % 5)
+                db.session.add(Policy("bench{0!s}".format(i),
+                                      scope=SCOPE.AUTH,
+                                      action=actions[i % len(actions)],
+                                      realm="realm{0!s}".format(i % 3),
+                                      user="user{0!s}, -user{1!s}, us.*".format(
+                                          i % 7, i % 4),
+                                      client=client))
+            save_config_timestamp()
+            db.session.commit()
+            P = PolicyClass()
+            self.assertEqual(len(P.policies), count)
+
+            start = datetime.datetime.now()
+            for user, realm, client in filters:
+                for action in actions:
+                    pols = P.get_policies(scope=SCOPE.AUTH, action=action,
+                                          user=user, realm=realm,
+                                          client=client, active=True)
+            indexed = datetime.datetime.now() - start
+
+            start = datetime.datetime.now()
+            for user, realm, client in filters:
+                for action in actions:
+                    linear = linear_search(P.policies, SCOPE.AUTH, action,
+                                           user, realm, client)
+            linear_time = datetime.datetime.now() - start
+
+            for user, realm, client in filters:
+                for action in actions:
+                    pols = P.get_policies(scope=SCOPE.AUTH, action=action,
+                                          user=user, realm=realm,
+                                          client=client, active=True)
+                    linear = linear_search(P.policies, SCOPE.AUTH, action,
+                                           user, realm, client)
+                    self.assertEqual([p.get("name") for p in pols],
+                                     [p.get("name") for p in linear])
+            log.info("get_policies with {0!s} policies: indexed {1!s}, "
+                     "linear {2!s}".format(count, indexed, linear_time))
+
+        Policy.query.delete()
+        save_config_timestamp()
+        db.session.commit()
+
+    def test_24_request_cache(self):
+        set_policy(name="cachepol", scope=SCOPE.AUTH,
+                   action="{0!s}=userstore".format(ACTION.OTPPIN))
+        P = PolicyClass()
+        stats = get_policy_cache_statistics()
+        values = P.get_action_values(ACTION.OTPPIN, scope=SCOPE.AUTH,
+                                     user="cornelius", realm="realm1")
+        self.assertEqual(values, ["userstore"])
+        # The same request is answered from the cache
+        values = P.get_action_values(ACTION.OTPPIN, scope=SCOPE.AUTH,
+                                     user="cornelius", realm="realm1")
+        self.assertEqual(values, ["userstore"])
+        new_stats = get_policy_cache_statistics()
+        self.assertTrue(new_stats.get("hits") > stats.get("hits"))
+        self.assertTrue(new_stats.get("misses") > stats.get("misses"))
+
+        # Changing the returned list does not change the cache
+        values.append("tokenpin")
+        values = P.get_action_values(ACTION.OTPPIN, scope=SCOPE.AUTH,
+                                     user="cornelius", realm="realm1")
+        self.assertEqual(values, ["userstore"])
+
+        # A changed policy is read again
+        set_policy(name="cachepol", scope=SCOPE.AUTH,
+                   action="{0!s}=tokenpin".format(ACTION.OTPPIN))
+        P = PolicyClass()
+        values = P.get_action_values(ACTION.OTPPIN, scope=SCOPE.AUTH,
+                                     user="cornelius", realm="realm1")
+        self.assertEqual(values, ["tokenpin"])
+        delete_policy("cachepol")
+        P = PolicyClass()
+        values = P.get_action_values(ACTION.OTPPIN, scope=SCOPE.AUTH,
+                                     user="cornelius", realm="realm1")
+        self.assertEqual(values, [])
+
+    def test_25_policy_time_in_request(self):
+        with self.app.test_request_context('/validate/check',
+                                           method='POST'):
+            t1 = get_policy_time()
+            t2 = get_policy_time()
+            self.assertTrue(t1 is t2)
+        with self.app.test_request_context('/validate/check',
+                                           method='POST'):
+            self.assertTrue(get_policy_time() >= t1)
@@ -7,7 +7,7 @@ PWFILE2 = "tests/testdata/passwords"
 DICT_FILE = "tests/testdata/dictionary"
 
 
-from .base import MyTestCase, FakeFlaskG
+from .base import MyTestCase, FakeFlaskG, FakeAudit
 
 from privacyidea.lib.policy import (set_policy, delete_policy,
                                     PolicyClass, SCOPE,
@@ -22,11 +22,13 @@ from privacyidea.lib.policydecorators import (auth_otppin,
                                               auth_lastauth)
 from privacyidea.lib.user import User
 from privacyidea.lib.resolver import save_resolver
-from privacyidea.lib.realm import set_realm
+from privacyidea.lib.realm import set_realm, delete_realm
 from privacyidea.lib.token import (init_token, remove_token, check_user_pass,
-                                   get_tokens)
+                                   get_tokens, set_realms)
 from privacyidea.lib.error import UserError, PolicyError
 from privacyidea.lib.radiusserver import add_radius
+from privacyidea.models import db
+from sqlalchemy import event
 import datetime
 import radiusmock
 
@@ -438,3 +440,86 @@ class LibPolicyTestCase(MyTestCase):
 
         remove_token(serial)
         delete_policy("pol_lastauth")
+
+    def test_11_shared_user_tokens(self):
+        user = User("cornelius", realm="r1")
+        pin = "sharedpin"
+        for i in range(5):
+            init_token({"type": "spass",
+                        "pin": "{0!s}{1!s}".format(pin, i),
+                        "serial": "SHARED{0!s}".format(i)}, user=user)
+        set_policy(name="pol_shared", scope=SCOPE.AUTH,
+                   action="{0!s}, {1!s}, {2!s}".format(ACTION.PASSNOTOKEN,
+                                                       ACTION.PASSNOUSER,
+                                                       ACTION.PASSTHRU))
+        g = FakeFlaskG()
+        g.policy_object = PolicyClass()
+        g.audit_object = FakeAudit()
+        options = {"g": g}
+
+        statements = []
+        lookups = []
+
+        def count_statements(conn, cursor, statement, *args):
+            if "token.user_id = " in statement:
+                statements.append(statement)
+
+        # User is wrapped by log_with, so we patch the class of the object
+        user_class = type(user)
+        get_user_identifiers = user_class.get_user_identifiers
+
+        def count_lookups(user_object):
+            lookups.append(user_object.login)
+            return get_user_identifiers(user_object)
+
+        engine = db.get_engine(self.app)
+        event.listen(engine, "before_cursor_execute", count_statements)
+        user_class.get_user_identifiers = count_lookups
+        try:
+            r = check_user_pass(user, "{0!s}3".format(pin), options)
+        finally:
+            user_class.get_user_identifiers = get_user_identifiers
+            event.remove(engine, "before_cursor_execute", count_statements)
+        self.assertTrue(r[0])
+        self.assertEqual(r[1].get("serial"), "SHARED3")
+        # The tokens of the user are read once with the tokeninfo and the
+        # realms and the resolver is asked once for the user.
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(lookups, ["cornelius"])
+
+        # The next authentication reads the tokens again
+        remove_token("SHARED3")
+        r = check_user_pass(user, "{0!s}3".format(pin), options)
+        self.assertFalse(r[0])
+        r = check_user_pass(user, "{0!s}4".format(pin), options)
+        self.assertTrue(r[0])
+
+        for i in range(5):
+            remove_token("SHARED{0!s}".format(i))
+        delete_policy("pol_shared")
+
+    def test_12_tokens_in_other_realms(self):
+        # The resolver of the user is contained in a second realm
+        (added, failed) = set_realm("r1b", ["myreso"])
+        self.assertTrue(len(failed) == 0)
+        user = User("cornelius", realm="r1")
+        init_token({"type": "spass",
+                    "pin": "crosspin",
+                    "serial": "CROSS1"}, user=user)
+        # The administrator moves the token to the other realm
+        set_realms("CROSS1", ["r1b"])
+        g = FakeFlaskG()
+        g.policy_object = PolicyClass()
+        g.audit_object = FakeAudit()
+        options = {"g": g}
+
+        # The token is only used with the login realm of the token
+        r = check_user_pass(user, "crosspin", options)
+        self.assertFalse(r[0])
+        r = check_user_pass(User("cornelius", realm="r1b"), "crosspin",
+                            options)
+        self.assertTrue(r[0])
+        self.assertEqual(r[1].get("serial"), "CROSS1")
+
+        remove_token("CROSS1")
+        delete_realm("r1b")
@@ -10,21 +10,29 @@ The lib.resolver.py only depends on the database model.
 """
 PWFILE = "tests/testdata/passwords"
 from .base import MyTestCase
+import ldap3
 import ldap3mock
+import mock
+import redismock
 import responses
 import uuid
+import threading
+from sqlalchemy import event
 from privacyidea.lib.resolvers.LDAPIdResolver import IdResolver as LDAPResolver
 from privacyidea.lib.resolvers.SQLIdResolver import IdResolver as SQLResolver
 from privacyidea.lib.resolvers.SCIMIdResolver import IdResolver as SCIMResolver
 from privacyidea.lib.resolvers.SQLIdResolver import PasswordHash
 from privacyidea.lib.resolvers.UserIdResolver import UserIdResolver
-from privacyidea.lib.resolvers.LDAPIdResolver import (SERVERPOOL_ROUNDS, SERVERPOOL_SKIP)
+from privacyidea.lib.resolvers.LDAPIdResolver import (SERVERPOOL_ROUNDS, SERVERPOOL_SKIP,
+                                                      ConnectionPool)
+from ldap3.core.exceptions import LDAPSessionTerminatedByServerError
 
 from privacyidea.lib.resolver import (save_resolver,
                                       delete_resolver,
                                       get_resolver_config,
                                       get_resolver_list,
-                                      get_resolver_object, pretestresolver)
+                                      get_resolver_object, pretestresolver,
+                                      RESOLVER_OBJECT_CACHE)
 from privacyidea.models import ResolverConfig
 
 objectGUIDs = [
@@ -244,6 +252,32 @@ class SQLResolverTestCase(MyTestCase):
         uid = y.getUserId("achmed")
         self.assertFalse(uid)
 
+    def test_06_batch_lookup(self):
+        y = SQLResolver()
+        y.loadConfig(self.parameters)
+        users = dict((u.get("username"), u.get("userid"))
+                     for u in y.getUserList())
+        userids = [users.get("cornelius"), users.get("fred"), 4711]
+        userinfos = y.getUserInfos(userids)
+        self.assertEqual(len(userinfos), 2)
+        self.assertEqual(userinfos.get(users.get("cornelius")),
+                         y.getUserInfo(users.get("cornelius")))
+        # The userids are returned as requested
+        usernames = y.getUsernames([str(uid) for uid in userids])
+        self.assertEqual(usernames, {str(users.get("cornelius")): "cornelius",
+                                     str(users.get("fred")):
+                                         "fred"})
+
+        # Only one query is sent to the database
+        statements = []
+
+        def count_statements(*args):
+            statements.append(args)
+        event.listen(y.engine, "before_cursor_execute", count_statements)
+        y.getUsernames(range(1, 8))
+        event.remove(y.engine, "before_cursor_execute", count_statements)
+        self.assertEqual(len(statements), 1)
+
     def test_99_testconnection_fail(self):
         y = SQLResolver()
         self.parameters['Database'] = "does_not_exist"
@@ -1183,6 +1217,233 @@ class LDAPResolverTestCase(MyTestCase):
         self.assertEqual(user_info.get("surname"), "Cooper")
         self.assertEqual(user_info.get("givenname"), "Alice")
 
+    @ldap3mock.activate
+    def test_23_connection_pool(self):
+        ldap3mock.setLDAPDirectory(LDAPDirectory)
+        y = LDAPResolver()
+        y.loadConfig({'LDAPURI': 'ldap://localhost',
+                      'LDAPBASE': 'o=test',
+                      'BINDDN': 'cn=manager,ou=example,o=test',
+                      'BINDPW': 'ldaptest',
+                      'LOGINNAMEATTRIBUTE': 'cn',
+                      'LDAPSEARCHFILTER': '(cn=*)',
+                      'USERINFO': '{ "username": "cn",'
+                                  '"email" : "mail", '
+                                  '"surname" : "sn", '
+                                  '"givenname" : "givenName" }',
+                      'UIDTYPE': 'objectGUID',
+                      'NOREFERRALS': True,
+                      'CACHE_TIMEOUT': 0,
+                      'POOL_SIZE': 2
+                      })
+        self.assertEqual(y.pool.size, 2)
+        self.assertEqual(y.user_pool.size, 2)
+        user_id = y.getUserId("bob")
+        self.assertEqual(y.getUsername(user_id), "bob")
+        self.assertEqual(len(y.getUserList({"username": "*"})), len(
+            LDAPDirectory))
+        # All requests use the same service connection
+        metrics = y.get_metrics().get("pool")
+        self.assertEqual(metrics.get("created"), 1)
+        self.assertEqual(metrics.get("reused"), 2)
+        self.assertEqual(metrics.get("idle"), 1)
+        self.assertEqual(metrics.get("in_use"), 0)
+
+        # The password checks rebind a connection of the user pool
+        self.assertTrue(y.checkPass(user_id, "bobpwééé"))
+        self.assertFalse(y.checkPass(user_id, "wrong"))
+        self.assertTrue(y.checkPass(user_id, "bobpwééé"))
+        metrics = y.get_metrics().get("user_pool")
+        self.assertEqual(metrics.get("created"), 1)
+        self.assertEqual(metrics.get("reused"), 2)
+        self.assertEqual(metrics.get("idle"), 1)
+        self.assertEqual(y.get_metrics().get("pool").get("created"), 1)
+
+        # A failed connection is replaced and the search is retried
+        connection = y.pool._idle[0]
+
+        def failing_search(**kwargs):
+            raise LDAPSessionTerminatedByServerError("closed by server")
+        connection.search = failing_search
+        self.assertEqual(y.getUserId("alice"), y.getUserId("alice"))
+        self.assertNotEqual(y.getUserId("alice"), "")
+        metrics = y.get_metrics().get("pool")
+        self.assertEqual(metrics.get("created"), 2)
+        self.assertEqual(metrics.get("failed"), 1)
+        self.assertEqual(metrics.get("open"), 1)
+
+    def test_24_connection_pool_health(self):
+        class FakeConnection(object):
+            closed = False
+            bound = True
+
+            def unbind(self):
+                self.closed = True
+
+        pool = ConnectionPool(FakeConnection, size=1, max_age=300)
+        c1 = pool.acquire()
+        c2 = pool.acquire()
+        self.assertFalse(c1 is c2)
+        self.assertEqual(pool.get_metrics().get("in_use"), 2)
+        pool.release(c1)
+        # Only one idle connection is kept
+        pool.release(c2)
+        self.assertTrue(c2.closed)
+        self.assertTrue(pool.acquire() is c1)
+        # A connection, that is not bound anymore, is replaced
+        c1.bound = False
+        pool.release(c1)
+        self.assertTrue(c1.closed)
+        # A connection, that is too old, is replaced
+        c3 = pool.acquire()
+        pool.release(c3)
+        pool.max_age = 0
+        c4 = pool.acquire()
+        self.assertFalse(c4 is c3)
+        self.assertTrue(c3.closed)
+        pool.max_age = 300
+        # A broken connection is closed
+        pool.release(c4, broken=True)
+        self.assertTrue(c4.closed)
+        metrics = pool.get_metrics()
+        self.assertEqual(metrics.get("created"), 4)
+        self.assertEqual(metrics.get("reused"), 1)
+        self.assertEqual(metrics.get("closed"), 4)
+        self.assertEqual(metrics.get("failed"), 1)
+        self.assertEqual(metrics.get("open"), 0)
+
+    @ldap3mock.activate
+    @redismock.activate
+    def test_25_lookup_cache(self):
+        ldap3mock.setLDAPDirectory(LDAPDirectory)
+        redismock.set_data({})
+        config = {'LDAPURI': 'ldap://localhost',
+                  'LDAPBASE': 'o=test',
+                  'BINDDN': 'cn=manager,ou=example,o=test',
+                  'BINDPW': 'ldaptest',
+                  'LOGINNAMEATTRIBUTE': 'cn',
+                  'LDAPSEARCHFILTER': '(cn=*)',
+                  'USERINFO': '{ "username": "cn",'
+                              '"email" : "mail", '
+                              '"surname" : "sn", '
+                              '"givenname" : "givenName" }',
+                  'UIDTYPE': 'objectGUID',
+                  'NOREFERRALS': True,
+                  'CACHE_TIMEOUT': 120,
+                  'CACHE_SIZE': 3,
+                  'CACHE_REDIS': 'localhost'}
+        y = LDAPResolver()
+        y.loadConfig(config)
+        self.assertEqual(y.negative_cache_timeout, 30)
+        # Unknown users are cached as negative entries
+        self.assertEqual(y.getUserId("unknown"), "")
+        self.assertEqual(y.getUserId("unknown"), "")
+        bob_id = y.getUserId("bob")
+        self.assertEqual(y.getUserInfo(bob_id).get("username"), "bob")
+        metrics = y.get_metrics().get("cache")
+        self.assertEqual(metrics.get("hits"), 1)
+        self.assertEqual(metrics.get("negative_hits"), 1)
+        self.assertEqual(metrics.get("misses"), 3)
+        # The cache is bounded
+        y.getUserId("alice")
+        metrics = y.get_metrics().get("cache")
+        self.assertEqual(metrics.get("size"), 3)
+        self.assertEqual(metrics.get("evictions"), 1)
+        # Only the misses queried the LDAP server
+        self.assertEqual(y.get_metrics().get("pool").get("reused"), 3)
+
+        # Another process reads the values from the shared cache
+        y2 = LDAPResolver()
+        y2.loadConfig(config)
+        self.assertEqual(y2.getUserId("bob"), bob_id)
+        self.assertEqual(y2.get_metrics().get("cache").get("shared_hits"), 1)
+        self.assertEqual(y2.get_metrics().get("pool").get("created"), 0)
+
+        # Negative caching can be switched off
+        config["NEGATIVE_CACHE_TIMEOUT"] = 0
+        y3 = LDAPResolver()
+        y3.loadConfig(config)
+        y3.getUserId("unknown")
+        y3.getUserId("unknown")
+        self.assertEqual(y3.get_metrics().get("cache").get("misses"), 2)
+
+    @ldap3mock.activate
+    def test_26_batch_lookup(self):
+        ldap3mock.setLDAPDirectory(LDAPDirectory)
+        y = LDAPResolver()
+        y.loadConfig({'LDAPURI': 'ldap://localhost',
+                      'LDAPBASE': 'o=test',
+                      'BINDDN': 'cn=manager,ou=example,o=test',
+                      'BINDPW': 'ldaptest',
+                      'LOGINNAMEATTRIBUTE': 'cn',
+                      'LDAPSEARCHFILTER': '(cn=*)',
+                      'USERINFO': '{ "username": "cn",'
+                                  '"email" : "mail", '
+                                  '"surname" : "sn", '
+                                  '"givenname" : "givenName" }',
+                      'UIDTYPE': 'objectGUID',
+                      'NOREFERRALS': True,
+                      'CACHE_TIMEOUT': 120
+                      })
+        bob_id = y.getUserId("bob")
+        alice_id = y.getUserId("alice")
+        unknown_id = str(uuid.uuid4())
+        y.cache.clear()
+        reused = y.get_metrics().get("pool").get("reused")
+        userinfos = y.getUserInfos([bob_id, alice_id, unknown_id])
+        self.assertEqual(set(userinfos.keys()), {bob_id, alice_id})
+        self.assertEqual(userinfos.get(alice_id).get("surname"), "Cooper")
+        self.assertEqual(userinfos.get(bob_id), y.getUserInfo(bob_id))
+        # The users are read with one search
+        reused += 1
+        self.assertEqual(y.get_metrics().get("pool").get("reused"), reused)
+        # The results are cached, the unknown user as negative entry
+        usernames = y.getUsernames([bob_id, alice_id, unknown_id])
+        self.assertEqual(usernames, {bob_id: "bob", alice_id: "alice"})
+        self.assertEqual(y.get_metrics().get("pool").get("reused"), reused)
+        self.assertEqual(y.get_metrics().get("cache").get("negative_hits"),
+                         1)
+
+        # The uid type DN reads the users separately
+        y.uidtype = "DN"
+        y.cache.clear()
+        usernames = y.getUsernames(["cn=bob,ou=example,o=test",
+                                    "cn=unknown,ou=example,o=test"])
+        self.assertEqual(usernames, {"cn=bob,ou=example,o=test": "bob"})
+
+    def test_27_checkpass_empty_password(self):
+        # The mock strategy of ldap3 treats a bind with an empty password
+        # as an anonymous bind like many LDAP servers.
+        server = ldap3.Server("fake_server")
+        dn = "cn=bob,ou=example,o=test"
+
+        def create_connection(**kwargs):
+            return ldap3.Connection(server, client_strategy=ldap3.MOCK_SYNC)
+
+        create_connection().strategy.add_entry(dn, {"cn": "bob",
+                                                    "userPassword": "bobpw"})
+        y = LDAPResolver()
+        y.loadConfig({'LDAPURI': 'ldap://localhost',
+                      'LDAPBASE': 'o=test',
+                      'BINDDN': 'cn=manager,ou=example,o=test',
+                      'BINDPW': 'ldaptest',
+                      'LOGINNAMEATTRIBUTE': 'cn',
+                      'LDAPSEARCHFILTER': '(cn=*)',
+                      'USERINFO': '{ "username": "cn" }',
+                      'UIDTYPE': 'DN',
+                      'CACHE_TIMEOUT': 0})
+        y.create_connection = create_connection
+        self.assertTrue(y.checkPass(dn, "bobpw"))
+        self.assertFalse(y.checkPass(dn, "wrong"))
+        # The connection, that was bound as bob, is not reused with an
+        # empty password
+        self.assertTrue(y.checkPass(dn, "bobpw"))
+        self.assertFalse(y.checkPass(dn, ""))
+        self.assertFalse(y.checkPass(dn, None))
+        metrics = y.get_metrics().get("user_pool")
+        self.assertEqual(metrics.get("created"), 1)
+        self.assertEqual(metrics.get("reused"), 2)
+
 
 class BaseResolverTestCase(MyTestCase):
 
@@ -1478,6 +1739,86 @@ class ResolverTestCase(MyTestCase):
         # Check that the email is NOT contained in the UI
         self.assertTrue("email" not in ui, ui)
 
+    def test_14_resolver_object_cache(self):
+        save_resolver({"resolver": "cachedres",
+                       "type": "passwdresolver",
+                       "fileName": "/etc/passwd"})
+        # The resolver object is only created once
+        y = get_resolver_object("cachedres")
+        self.assertTrue(get_resolver_object("cachedres") is y)
+        self.assertEqual(len([k for k in RESOLVER_OBJECT_CACHE
+                              if k[0] == "cachedres"]), 1)
+
+        # The object is shared between threads
+        objects = []
+
+        def get_object():
+            with self.app.app_context():
+                objects.append(get_resolver_object("cachedres"))
+
+        threads = [threading.Thread(target=get_object) for _i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(objects), 5)
+        for obj in objects:
+            self.assertTrue(obj is y)
+
+        # A changed configuration creates a new object and removes the old one
+        save_resolver({"resolver": "cachedres",
+                       "type": "passwdresolver",
+                       "fileName": PWFILE})
+        y2 = get_resolver_object("cachedres")
+        self.assertFalse(y2 is y)
+        self.assertEqual(y2.fileName, PWFILE)
+        self.assertTrue(get_resolver_object("cachedres") is y2)
+        self.assertEqual(len([k for k in RESOLVER_OBJECT_CACHE
+                              if k[0] == "cachedres"]), 1)
+
+        # Deleting the resolver removes the object from the cache
+        delete_resolver("cachedres")
+        self.assertEqual(len([k for k in RESOLVER_OBJECT_CACHE
+                              if k[0] == "cachedres"]), 0)
+
+    def test_15_resolver_object_dispose(self):
+        params = dict(SQLResolverTestCase.parameters)
+        params.update({"resolver": "disposedres", "type": "sqlresolver",
+                       "Database": "testuser.sqlite"})
+        save_resolver(params)
+        y = get_resolver_object("disposedres")
+        self.assertEqual(y.getUserId("cornelius"), 3)
+        # The connections of the old object are closed, when it is replaced
+        params["Encoding"] = "latin1"
+        save_resolver(params)
+        with mock.patch.object(y.engine, "dispose") as mock_dispose:
+            y2 = get_resolver_object("disposedres")
+            self.assertFalse(y2 is y)
+            self.assertEqual(mock_dispose.call_count, 1)
+        with mock.patch.object(y2.engine, "dispose") as mock_dispose:
+            delete_resolver("disposedres")
+            self.assertEqual(mock_dispose.call_count, 1)
+
+    @responses.activate
+    def test_16_scim_resolver_not_cached(self):
+        responses.add(responses.GET, SCIMResolverTestCase.TOKEN_URL,
+                      status=200, content_type='application/json',
+                      body=SCIMResolverTestCase.BODY_ACCESSTOKEN)
+        save_resolver({"resolver": "scimres",
+                       "type": "scimresolver",
+                       "Authserver": SCIMResolverTestCase.AUTHSERVER,
+                       "Resourceserver": SCIMResolverTestCase.RESOURCESERVER,
+                       "Client": SCIMResolverTestCase.CLIENT,
+                       "Secret": SCIMResolverTestCase.SECRET,
+                       "Mapping": "{}"})
+        # Each object gets a new access token
+        y = get_resolver_object("scimres")
+        self.assertEqual(y.access_token, "MOCKTOKEN")
+        self.assertFalse(get_resolver_object("scimres") is y)
+        self.assertEqual(len([k for k in RESOLVER_OBJECT_CACHE
+                              if k[0] == "scimres"]), 0)
+        delete_resolver("scimres")
+
 class PasswordHashTestCase(MyTestCase):
     """
     Test the password hashing in the SQL database
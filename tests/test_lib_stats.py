@@ -5,7 +5,11 @@ This tests the files
 
 from .base import MyTestCase
 from privacyidea.lib.audit import getAudit
-from privacyidea.lib.stats import get_statistics
+from privacyidea.lib.stats import (get_statistics, VALIDATE_ACTIONS,
+                                   LAST_ROLLUP, ROLLUP_LOCK)
+from privacyidea.models import Audit as LogEntry, AuditStats
+import datetime
+import mock
 
 PUBLIC = "tests/testdata/public.pem"
 PRIVATE = "tests/testdata/private.pem"
@@ -37,3 +41,117 @@ class StatsTestCase(MyTestCase):
 
         stat_json = get_statistics(self.Audit)
         self.assertTrue("serial_plot" in stat_json)
+
+    def test_01_rollup(self):
+        for i in range(3):
+            self.Audit.log({"action": "POST /validate/check",
+                            "user": "cornelius", "realm": "realm1",
+                            "serial": "hotp1", "success": 1})
+            self.Audit.finalize_log()
+        self.Audit.log({"action": "POST /validate/check",
+                        "user": "cornelius", "realm": "realm1",
+                        "serial": "hotp1", "success": 0})
+        self.Audit.finalize_log()
+        self.Audit.log({"action": "GET /validate/check",
+                        "user": "hans", "realm": "realm1",
+                        "serial": "totp1", "success": 0})
+        self.Audit.finalize_log()
+        self.Audit.log({"action": "POST /token/init", "serial": "totp1",
+                        "success": 1})
+        self.Audit.finalize_log()
+
+        self.assertEqual(self.Audit.rollup(), 6)
+        counts = self.Audit.get_rollup_counts(["user", "success"],
+                                              actions=VALIDATE_ACTIONS)
+        self.assertEqual(counts, {("cornelius", 1): 3, ("cornelius", 0): 1,
+                                  ("hans", 0): 1})
+
+        # Only the recent hours are counted again
+        self.Audit.log({"action": "POST /validate/check",
+                        "user": "hans", "realm": "realm1",
+                        "serial": "totp1", "success": 1})
+        self.Audit.finalize_log()
+        self.assertEqual(self.Audit.rollup(), 7)
+        old_hour = datetime.datetime.now() - datetime.timedelta(days=2)
+        self.assertEqual(self.Audit.rollup(start_time=old_hour), 7)
+        counts = self.Audit.get_rollup_counts(["serial"])
+        self.assertEqual(counts, {("hotp1",): 4, ("totp1",): 3})
+
+        # The counts of older hours are kept, when the audit entries are
+        # deleted.
+        session = self.Audit.session
+        session.query(AuditStats).update(
+            {"hour": datetime.datetime(2017, 1, 1, 10)})
+        session.commit()
+        self.Audit.session.query(LogEntry).delete()
+        self.Audit.session.commit()
+        self.Audit.log({"action": "POST /token/init", "serial": "new1"})
+        self.Audit.finalize_log()
+        self.assertEqual(self.Audit.rollup(
+            start_time=datetime.datetime.now()), 1)
+        self.assertEqual(self.Audit.rollup(), 1)
+        counts = self.Audit.get_rollup_counts(["serial"])
+        self.assertEqual(counts, {("hotp1",): 4, ("totp1",): 3,
+                                  ("new1",): 1})
+        counts = self.Audit.get_rollup_counts(
+            ["serial"], start_time=datetime.datetime(2017, 1, 1, 11))
+        self.assertEqual(counts, {("new1",): 1})
+
+        # The statistics contain the data series
+        stats = get_statistics(self.Audit,
+                               start_time=datetime.datetime(2017, 1, 1))
+        self.assertEqual(stats.get("validate_user_data"),
+                         [["cornelius", 3, 1], ["hans", 1, 1]])
+        self.assertEqual(stats.get("validate_failed_serial_data"),
+                         [["hotp1", 1], ["totp1", 1]])
+        self.assertEqual(stats.get("serial_data"), [["hotp1", 4],
+                                                    ["totp1", 3],
+                                                    ["new1", 1]])
+        self.assertEqual(stats.get("action_data"),
+                         [["POST /validate/check", 5],
+                          ["POST /token/init", 2],
+                          ["GET /validate/check", 1]])
+        self.assertTrue("admin_plot" in stats)
+
+    def test_02_rollup_interval(self):
+        LAST_ROLLUP["time"] = 0
+        with mock.patch.object(self.Audit, "rollup") as mock_rollup:
+            start_time = datetime.datetime.now() - datetime.timedelta(days=1)
+            get_statistics(self.Audit, start_time=start_time)
+            get_statistics(self.Audit)
+            # The second request does not count the audit entries again
+            self.assertEqual(mock_rollup.call_count, 1)
+            mock_rollup.assert_called_with(first_start_time=start_time)
+
+            # A request does not wait for another request, that is counting
+            LAST_ROLLUP["time"] = 0
+            with ROLLUP_LOCK:
+                get_statistics(self.Audit)
+            self.assertEqual(mock_rollup.call_count, 1)
+            get_statistics(self.Audit)
+            self.assertEqual(mock_rollup.call_count, 2)
+
+    def test_03_first_rollup(self):
+        # An old audit entry
+        self.Audit.log({"action": "POST /token/init", "serial": "old1"})
+        self.Audit.finalize_log()
+        self.Audit.session.query(LogEntry).update(
+            {"date": datetime.datetime(2017, 1, 1, 10)})
+        self.Audit.session.commit()
+        self.Audit.log({"action": "POST /token/init", "serial": "new1"})
+        self.Audit.finalize_log()
+
+        # The statistics only count the requested time range
+        LAST_ROLLUP["time"] = 0
+        stats = get_statistics(self.Audit,
+                               start_time=datetime.datetime(2017, 2, 1),
+                               end_time=datetime.datetime.now())
+        self.assertEqual(stats.get("serial_data"), [["new1", 1]])
+        counts = self.Audit.get_rollup_counts(["serial"])
+        self.assertEqual(counts, {("new1",): 1})
+
+        # The older entries are counted on request
+        self.assertEqual(self.Audit.rollup(
+            start_time=datetime.datetime(2017, 1, 1)), 2)
+        counts = self.Audit.get_rollup_counts(["serial"])
+        self.assertEqual(counts, {("old1",): 1, ("new1",): 1})
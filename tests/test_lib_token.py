@@ -19,7 +19,7 @@ from .base import MyTestCase
 from privacyidea.lib.user import (User)
 from privacyidea.lib.tokenclass import TokenClass
 from privacyidea.lib.tokens.totptoken import TotpTokenClass
-from privacyidea.models import (Token, Challenge, TokenRealm)
+from privacyidea.models import (Token, Challenge, TokenRealm, db)
 from privacyidea.lib.config import (set_privacyidea_config, get_token_types)
 from privacyidea.lib.policy import set_policy, SCOPE, ACTION, delete_policy
 import datetime
@@ -56,6 +56,10 @@ from privacyidea.lib.token import (create_tokenclass_object,
 
 from privacyidea.lib.error import (TokenAdminError, ParameterError,
                                    privacyIDEAError)
+from privacyidea.lib.resolvers.PasswdIdResolver import (
+    IdResolver as PasswdIdResolver)
+from sqlalchemy import event
+import mock
 
 
 class TokenTestCase(MyTestCase):
@@ -894,6 +898,31 @@ class TokenTestCase(MyTestCase):
         self.assertTrue(len(tokens.get("tokens")) == 1,
                         len(tokens.get("tokens")))
 
+        # The owners are looked up with one request per resolver
+        owners = set([(t.resolver, t.user_id) for t in Token.query.all()
+                      if t.resolver and t.user_id])
+        self.assertEqual(len(owners), 1)
+        with mock.patch.object(PasswdIdResolver, "getUsernames",
+                               autospec=True,
+                               side_effect=PasswdIdResolver.getUsernames
+                               ) as mock_usernames:
+            tokens = get_tokens_paginate(assigned=True, psize=100)
+            self.assertEqual(mock_usernames.call_count, 1)
+        for token in tokens.get("tokens"):
+            self.assertEqual(token.get("username"), "cornelius")
+            self.assertEqual(token.get("user_realm"), self.realm1)
+
+        # A token in another realm is shown in the realm of the owner
+        self.setUp_user_realm3()
+        serial = tokens.get("tokens")[0].get("serial")
+        set_realms(serial, [self.realm1, self.realm3])
+        tokens = get_tokens_paginate(serial=serial)
+        self.assertEqual(tokens.get("tokens")[0].get("username"),
+                         "cornelius")
+        self.assertEqual(tokens.get("tokens")[0].get("user_realm"),
+                         self.realm1)
+        set_realms(serial, [self.realm1])
+
     def test_42_sort_tokens(self):
         # return pagination
         tokendata = get_tokens_paginate(sortby=Token.serial, page=1, psize=5)
@@ -1095,6 +1124,72 @@ class TokenTestCase(MyTestCase):
         remove_token("CR2B")
         delete_policy("test48")
 
+    def test_49_eager_loading(self):
+        user = User("passthru", self.realm1)
+        for i in range(20):
+            init_token({"serial": "EAGER{0:02d}".format(i),
+                        "type": "totp",
+                        "otpkey": self.otpkey,
+                        "timeStep": 60}, user)
+
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        def read_tokens(eager):
+            tokens = get_tokens(user=user, eager=eager)
+            self.assertEqual(len(tokens), 20)
+            for token in tokens:
+                self.assertEqual(token.timestep, 60)
+                self.assertEqual(token.timewindow, 180)
+                self.assertEqual(token.timeshift, 0)
+                self.assertEqual(token.hashlib, "sha1")
+                self.assertEqual(token.token.get_realms(), [self.realm1])
+                self.assertEqual(token.get_as_dict().get("realms"),
+                                 [self.realm1])
+
+        engine = db.get_engine(self.app)
+        event.listen(engine, "before_cursor_execute", count_statements)
+        try:
+            read_tokens(eager=False)
+            lazy_statements = len(statements)
+            statements[:] = []
+            read_tokens(eager=True)
+            eager_statements = len(statements)
+            # A single token is read with one query by default
+            statements[:] = []
+            get_tokens(serial="EAGER00")
+            serial_statements = len(statements)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_statements)
+
+        # The tokens, the tokeninfo and the realms are read in three queries
+        self.assertEqual(eager_statements, 3)
+        self.assertTrue(lazy_statements > 40, lazy_statements)
+        self.assertEqual(serial_statements, 1)
+
+        # A written tokeninfo is read again
+        token = get_tokens(serial="EAGER00")[0]
+        self.assertEqual(token.timestep, 60)
+        token.add_tokeninfo("timeStep", 30)
+        self.assertEqual(token.timestep, 30)
+        token.del_tokeninfo("timeStep")
+        self.assertEqual(token.timestep, 30)
+        self.assertEqual(token.get_tokeninfo("timeStep"), None)
+
+        # eager loading also works with pagination
+        tokens = get_tokens_paginate(user=user, psize=5, eager=True)
+        self.assertEqual(tokens.get("count"), 20)
+        self.assertEqual(len(tokens.get("tokens")), 5)
+        self.assertEqual(tokens.get("tokens")[0].get("info").get(
+            "timeStep"), None)
+        self.assertEqual(tokens.get("tokens")[1].get("info").get(
+            "timeStep"), "60")
+
+        for i in range(20):
+            remove_token("EAGER{0:02d}".format(i))
+
 
 class TokenFailCounterTestCase(MyTestCase):
     """
@@ -11,6 +11,7 @@ from privacyidea.lib.realm import (set_realm)
 from privacyidea.lib.user import (User)
 from privacyidea.lib.tokenclass import DATE_FORMAT
 from privacyidea.lib.tokens.hotptoken import HotpTokenClass
+from privacyidea.lib.tokens.HMAC import HmacOtp
 from privacyidea.models import (Token,
                                  Config,
                                  Challenge)
@@ -19,6 +20,9 @@ from privacyidea.lib.policy import (PolicyClass, SCOPE, set_policy,
                                     delete_policy)
 import binascii
 import datetime
+import hashlib
+import hmac
+import mock
 
 
 class HOTPTokenTestCase(MyTestCase):
@@ -697,3 +701,61 @@ class HOTPTokenTestCase(MyTestCase):
         self.assertEqual(p.get("otplen"), "8")
         self.assertEqual(p.get("hashlib"), "sha256")
         delete_policy("pol1")
+
+    def test_28_generate_batch(self):
+        # The test vectors from RFC 4226
+        rfc_otps = ["755224", "287082", "359152", "969429", "338314",
+                    "254676", "287922", "162583", "399871", "520489"]
+        hmac_otp = HmacOtp(digits=6, hashfunc=hashlib.sha1)
+        key = binascii.unhexlify(self.otpkey)
+        otps = [otp for _c, otp in hmac_otp.generate_batch(0, 10, key=key)]
+        self.assertEqual(otps, rfc_otps)
+        # leading zeros are kept
+        hmac_otp = HmacOtp(digits=8, hashfunc=hashlib.sha256)
+        for counter, otp in hmac_otp.generate_batch(0, 50, key=key):
+            self.assertEqual(otp, hmac_otp.generate(counter, key=key))
+            self.assertEqual(len(otp), 8)
+
+        # find the otp value with the secret object of a token
+        db_token = Token("batch", tokentype="hotp")
+        db_token.save()
+        token = HotpTokenClass(db_token)
+        token.update({"otpkey": self.otpkey})
+        hmac_otp = HmacOtp(token.token.get_otpkey(), 0, 6, hashlib.sha1)
+        self.assertEqual(hmac_otp.find_otp("338314", 0, 10), 4)
+        self.assertEqual(hmac_otp.find_otp(u"338314", 5, 10), -1)
+        self.assertEqual(hmac_otp.find_otp("3383", 0, 10), -1)
+        self.assertEqual(hmac_otp.checkOtp("520489", 10), 9)
+        self.assertEqual(hmac_otp.checkOtp("520489", 9), -1)
+        token.delete_token()
+
+    def test_29_otp_window_key_setups(self):
+        db_token = Token("benchwindow", tokentype="hotp")
+        db_token.save()
+        token = HotpTokenClass(db_token)
+        token.update({"otpkey": self.otpkey})
+        secret = token.token.get_otpkey()
+
+        for window in [10, 100, 1000]:
+            hmac_otp = HmacOtp(secret, 0, 6, hashlib.sha1)
+            # the otp value of the last counter in the window
+            otp = hmac_otp.generate(window - 1, inc_counter=False)
+
+            # Generating each value sets up the HMAC key for each counter
+            with mock.patch.object(hmac, "new", wraps=hmac.new) as mock_new:
+                reference = -1
+                for c in range(0, window):
+                    if unicode(hmac_otp.generate(c)) == unicode(otp):
+                        reference = c
+                        break
+                self.assertEqual(mock_new.call_count, window)
+
+            # The batch sets up the key once for the whole window
+            with mock.patch.object(hmac, "new", wraps=hmac.new) as mock_new:
+                res = hmac_otp.find_otp(otp, 0, window)
+                self.assertEqual(mock_new.call_count, 1)
+
+            self.assertEqual(res, window - 1)
+            self.assertEqual(res, reference)
+
+        token.delete_token()
@@ -6,13 +6,20 @@ The lib.user.py only depends on the database model
 PWFILE = "tests/testdata/passwd"
 PWFILE2 = "tests/testdata/passwords"
 
+import mock
+import threading
+import time
+
 from .base import MyTestCase
+from privacyidea.lib.resolvers.PasswdIdResolver import IdResolver
 from privacyidea.lib.resolver import (save_resolver)
 from privacyidea.lib.realm import (set_realm, delete_realm)
 from privacyidea.lib.user import (User, create_user,
                                   get_username,
                                   get_user_info,
                                   get_user_list,
+                                  get_user_generator,
+                                  SearchPool,
                                   split_user,
                                   get_user_from_param)
 
@@ -338,3 +345,79 @@ class UserTestCase(MyTestCase):
         self.assertEqual(r[3], "resolver1")
 
         delete_realm("sort_realm")
+
+    def test_17_parallel_user_search(self):
+        save_resolver({"resolver": "slow_resolver",
+                       "type": "passwdresolver",
+                       "fileName": PWFILE2})
+        save_resolver({"resolver": "broken_resolver",
+                       "type": "passwdresolver",
+                       "fileName": "tests/testdata/no_such_file"})
+        (added, failed) = set_realm("parallel_realm",
+                                    [self.resolvername1, "slow_resolver",
+                                     "broken_resolver"])
+        self.assertTrue(len(failed) == 0)
+        self.assertTrue(len(added) == 3)
+
+        getUserList = IdResolver.getUserList
+
+        def slow_getUserList(resolver, searchDict=None):
+            if resolver.fileName == PWFILE2:
+                time.sleep(1)
+            return getUserList(resolver, searchDict)
+
+        with mock.patch.object(IdResolver, "getUserList", slow_getUserList):
+            failed_resolvers = {}
+            start = time.time()
+            users = get_user_generator({"realm": "parallel_realm"},
+                                       timeout=0.3,
+                                       failed_resolvers=failed_resolvers)
+            user = next(users)
+            self.assertEqual(user.get("resolver"), self.resolvername1)
+            # The failures are known, when all users are read
+            userlist = [user] + list(users)
+            self.assertTrue(time.time() - start < 1)
+            self.assertEqual(set(u.get("resolver") for u in userlist),
+                             {self.resolvername1})
+            self.assertEqual(failed_resolvers.get("slow_resolver"), "timeout")
+            self.assertTrue("broken_resolver" in failed_resolvers)
+
+            # With a longer timeout the slow resolver is contained
+            userlist = get_user_list({"realm": "parallel_realm"}, timeout=5)
+            self.assertEqual(set(u.get("resolver") for u in userlist),
+                             {self.resolvername1, "slow_resolver"})
+
+        # The searches are started, before the generator is read
+        started = threading.Event()
+
+        def started_getUserList(resolver, searchDict=None):
+            started.set()
+            return getUserList(resolver, searchDict)
+
+        with mock.patch.object(IdResolver, "getUserList",
+                               started_getUserList):
+            users = get_user_generator({"realm": "parallel_realm"})
+            self.assertTrue(started.wait(5))
+            self.assertTrue(len(list(users)) > 0)
+
+        # Missing resolvers are known, before the generator is read
+        failed_resolvers = {}
+        get_user_generator({"resolver": "no_such_resolver"},
+                           failed_resolvers=failed_resolvers)
+        self.assertTrue("no_such_resolver" in failed_resolvers)
+
+        # The hanging searches do not start more threads than the pool size
+        pool = SearchPool(size=2)
+        with mock.patch("privacyidea.lib.user.USER_SEARCH_POOL", pool):
+            with mock.patch.object(IdResolver, "getUserList",
+                                   slow_getUserList):
+                for _i in range(3):
+                    failed_resolvers = {}
+                    list(get_user_generator({"resolver": "slow_resolver"},
+                                            timeout=0.1,
+                                            failed_resolvers=failed_resolvers))
+                    self.assertEqual(failed_resolvers,
+                                     {"slow_resolver": "timeout"})
+        self.assertEqual(len(pool.threads), 2)
+
+        delete_realm("parallel_realm")
@@ -5,6 +5,8 @@ from .base import MyTestCase
 
 from privacyidea.lib.utils import (parse_timelimit, parse_timedelta,
                                    check_time_in_range, parse_proxy,
+                                   parse_time_range, check_time_in_bitset,
+                                   IPPrefixTree, get_proxy_tree,
                                    check_proxy, reduce_realms, is_true,
                                    parse_date, compare_condition,
                                    get_data_from_params)
@@ -90,6 +92,38 @@ class UtilsTestCase(MyTestCase):
         r = check_time_in_range("Mon-Wrong: asd-17:30", t)
         self.assertEqual(r, False)
 
+    def test_03a_parse_time_range(self):
+        # April 4th, 2016 is a Monday
+        monday = datetime(2016, 4, 4)
+        bitset = parse_time_range("Mon-Fri: 09:00-17:30, Sat: 10-12")
+        # Monday 09:00 is the minute 540 of the week
+        self.assertTrue((bitset >> 540) & 1)
+        self.assertFalse((bitset >> 539) & 1)
+        self.assertTrue(check_time_in_bitset(bitset, monday +
+                                             timedelta(hours=17,
+                                                       minutes=30)))
+        self.assertFalse(check_time_in_bitset(bitset, monday +
+                                              timedelta(hours=17,
+                                                        minutes=31)))
+        self.assertTrue(check_time_in_bitset(bitset, monday +
+                                             timedelta(days=5, hours=12)))
+        self.assertFalse(check_time_in_bitset(bitset, monday +
+                                              timedelta(days=6, hours=11)))
+        # Nonsense results in an empty bitset
+        self.assertEqual(parse_time_range("Mon-Wrong: asd-17:30"), 0)
+        self.assertEqual(parse_time_range("Tue: 17-9"), 0)
+
+        # The bitset gives the same results as the time range for each
+        # quarter of an hour of the week
+        bitset = parse_time_range("Sun: 22-23:59, Mon-Tue: 22-23:59, "
+                                  "Wed: 0:15-6:45")
+        for quarter in range(7 * 24 * 4):
+            t = monday + timedelta(minutes=quarter * 15)
+            self.assertEqual(check_time_in_bitset(bitset, t),
+                             (t.isoweekday() in [7, 1, 2] and t.hour >= 22) or
+                             (t.isoweekday() == 3 and
+                              (0, 15) <= (t.hour, t.minute) <= (6, 45)), t)
+
     def test_04_check_overrideclient(self):
         proxy_def = " 10.0.0.12, 1.2.3.4/16> 192.168.1.0/24, 172.16.0.1 " \
                     ">10.0.0.0/8   "
@@ -118,6 +152,34 @@ class UtilsTestCase(MyTestCase):
         self.assertRaises(AddrFormatError, parse_proxy, proxy_def)
         self.assertFalse(check_proxy("10.0.0.12", "1.2.3.4", proxy_def))
 
+    def test_04a_ip_prefix_tree(self):
+        tree = IPPrefixTree()
+        tree.insert("10.0.0.0/8", "net10")
+        tree.insert("10.1.0.0/16", "net10.1")
+        tree.insert("10.1.2.3", "host")
+        tree.insert("192.168.0.0/24", "net192")
+        tree.insert("0.0.0.0/0", "all4")
+        tree.insert("2001:db8::/32", "net6")
+        self.assertEqual(len(tree), 6)
+        self.assertEqual(tree.lookup("10.1.2.3"),
+                         ["all4", "net10", "net10.1", "host"])
+        self.assertEqual(tree.lookup("10.2.0.1"), ["all4", "net10"])
+        self.assertEqual(tree.lookup(IPAddress("192.168.0.17")),
+                         ["all4", "net192"])
+        self.assertEqual(tree.lookup("2001:db8::1"), ["net6"])
+        self.assertEqual(tree.lookup("2001:db9::1"), [])
+        # A network with host bits is stored as the network
+        tree.insert("172.16.1.17/24", "net172")
+        self.assertEqual(tree.lookup("172.16.1.200"), ["all4", "net172"])
+
+        # The proxy settings are only parsed once
+        proxy_def = "10.0.0.12, 1.2.3.4/16> 192.168.1.0/24"
+        proxy_tree = get_proxy_tree(proxy_def)
+        self.assertTrue(get_proxy_tree(proxy_def) is proxy_tree)
+        self.assertTrue(check_proxy("1.2.3.10", "192.168.1.12", proxy_def))
+        # An invalid client IP is only checked for allowed proxies
+        self.assertFalse(check_proxy("10.9.9.9", "unknown", proxy_def))
+
     def test_05_reduce_realms(self):
         realms = {'defrealm': {'default': False,
                                'option': '',